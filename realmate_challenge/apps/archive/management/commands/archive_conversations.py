@@ -0,0 +1,56 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from realmate_challenge.apps.archive.storage import archivable, archive_conversations, restore_conversation
+
+
+class Command(BaseCommand):
+    help = (
+        'Move as conversas CLOSED inativas há mais de --days dias (padrão: '
+        'ARCHIVE_AFTER_DAYS) para o arquivo comprimido, em lotes, tirando as '
+        'mensagens da tabela quente. Com --restore devolve conversas arquivadas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, help='Dias sem mensagens para arquivar (padrão: ARCHIVE_AFTER_DAYS).')
+        parser.add_argument('--batch-size', type=int, default=200, help='Conversas por transação.')
+        parser.add_argument('--limit', type=int, help='Arquiva no máximo N conversas nesta execução.')
+        parser.add_argument('--dry-run', action='store_true', help='Só conta as conversas que seriam arquivadas.')
+        parser.add_argument('--restore', nargs='+', metavar='ID', help='Devolve estas conversas às tabelas quentes.')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            for conversation_id in options['restore']:
+                if not restore_conversation(conversation_id):
+                    raise CommandError(f'Conversa {conversation_id} não está no arquivo.')
+                self.stdout.write(f'Conversa {conversation_id} restaurada.')
+            return
+
+        days = options['days'] if options['days'] is not None else settings.ARCHIVE_AFTER_DAYS
+        if days < 0 or options['batch_size'] < 1 or (options['limit'] is not None and options['limit'] < 1):
+            raise CommandError('--days não pode ser negativo; --batch-size e --limit devem ser positivos.')
+
+        if options['dry_run']:
+            count = archivable(timezone.now() - timedelta(days=days)).count()
+            self.stdout.write(f'{count} conversas seriam arquivadas.')
+            return
+
+        start = time.perf_counter()
+        conversations = messages = raw_bytes = stored_bytes = 0
+        for totals in archive_conversations(days, options['batch_size'], options['limit']):
+            conversations += totals.conversations
+            messages += totals.messages
+            raw_bytes += totals.raw_bytes
+            stored_bytes += totals.stored_bytes
+            self.stdout.write(f'{conversations} conversas / {messages} mensagens arquivadas...')
+        elapsed = time.perf_counter() - start
+
+        ratio = raw_bytes / stored_bytes if stored_bytes else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{conversations} conversas com {messages} mensagens arquivadas em {elapsed:.2f}s '
+            f'({raw_bytes / 1024:.0f} KiB de JSON em {stored_bytes / 1024:.0f} KiB, {ratio:.1f}x).'
+        ))
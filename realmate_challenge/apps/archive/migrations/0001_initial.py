@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedConversation',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('status', models.CharField(max_length=10)),
+                ('timestamp', models.DateTimeField()),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('last_message_id', models.UUIDField(blank=True, null=True)),
+                ('payload', models.BinaryField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['archived_at'], name='archive_archived_at_idx')],
+            },
+        ),
+    ]
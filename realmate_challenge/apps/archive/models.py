@@ -0,0 +1,27 @@
+from django.utils import timezone
+from django.db import models
+
+
+class ArchivedConversation(models.Model):
+    """
+    Conversa CLOSED retirada das tabelas quentes (ver archive/storage.py):
+    a conversa e todas as suas mensagens ficam em um único blob comprimido.
+    As colunas fora do blob bastam para os validadores de GET condicional.
+    """
+    id = models.UUIDField(primary_key=True)
+    status = models.CharField(max_length=10)
+    timestamp = models.DateTimeField()
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_id = models.UUIDField(null=True, blank=True)
+    # JSON comprimido com zlib: {"conversation": {...}, "messages": [[...], ...]}
+    payload = models.BinaryField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.id} (arquivada, {self.message_count} mensagens)"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['archived_at'], name='archive_archived_at_idx'),
+        ]
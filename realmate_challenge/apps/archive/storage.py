@@ -0,0 +1,196 @@
+"""
+Arquivamento de conversas CLOSED em blobs comprimidos.
+
+archive_conversations() move as conversas fechadas sem mensagens há mais de
+ARCHIVE_AFTER_DAYS dias para ArchivedConversation: a conversa e todas as
+suas mensagens viram um único JSON comprimido com zlib, e as linhas saem de
+conversation_conversation e message_message (e do índice de busca, pelos
+gatilhos do FTS5). As tabelas quentes ficam só com o que ainda recebe
+escritas ou aparece na caixa de entrada.
+
+O detalhe da conversa (API e páginas HTML) lê do arquivo quando a conversa
+não está mais nas tabelas quentes (ver load_archived). Conversas arquivadas
+não aparecem nas listagens, na busca nem nas exportações, e novas mensagens
+para elas são rejeitadas como para qualquer conversa inexistente;
+restore_conversation() as devolve às tabelas quentes.
+"""
+import json
+import zlib
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from realmate_challenge.apps.conversation.cache import invalidate_conversations
+from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.apps.message.models import Message
+from realmate_challenge.apps.message.partitions import (
+    forget_conversations,
+    merge,
+    partitioned_conversations,
+    sealed_messages,
+)
+from realmate_challenge.apps.message.serializers import MESSAGE_COLUMNS
+
+from .models import ArchivedConversation
+
+
+# mesma ordem das colunas do caminho rápido de leitura (ver message/serializers.py)
+ArchivedMessage = namedtuple("ArchivedMessage", MESSAGE_COLUMNS)
+
+CONVERSATION_FIELDS = [field.attname for field in Conversation._meta.concrete_fields]
+# colunas de cada mensagem dentro do blob (a conversa é a mesma para todas)
+PACKED_MESSAGE_FIELDS = ["id", "direction", "content", "timestamp"]
+
+Totals = namedtuple("Totals", ["conversations", "messages", "raw_bytes", "stored_bytes"])
+
+
+def _plain(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if value is None or isinstance(value, (int, str)):
+        return value
+    return str(value)
+
+
+def pack(conversation, messages):
+    """Comprime um dicionário da conversa e as tuplas (PACKED_MESSAGE_FIELDS) das mensagens."""
+    document = {
+        "conversation": {name: _plain(conversation[name]) for name in CONVERSATION_FIELDS},
+        "messages": [[_plain(value) for value in message] for message in messages],
+    }
+    raw = json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode()
+    level = getattr(settings, "ARCHIVE_COMPRESSION_LEVEL", 6)
+    return raw, zlib.compress(raw, level)
+
+
+def unpack(payload):
+    """Devolve (Conversation não salva, lista de ArchivedMessage em ordem cronológica)."""
+    document = json.loads(zlib.decompress(bytes(payload)))
+    # campos criados depois do arquivamento ficam com o valor padrão
+    conversation = Conversation(**{
+        field.attname: field.to_python(document["conversation"][field.attname])
+        for field in Conversation._meta.concrete_fields
+        if field.attname in document["conversation"]
+    })
+    to_uuid = Message._meta.get_field("id").to_python
+    to_datetime = Message._meta.get_field("timestamp").to_python
+    messages = [
+        ArchivedMessage(to_uuid(pk), direction, content, to_datetime(timestamp), conversation.id)
+        for pk, direction, content, timestamp in document["messages"]
+    ]
+    return conversation, messages
+
+
+def load_archived(conversation_id, using="default"):
+    """(conversa, mensagens) de uma conversa arquivada, ou None se ela não estiver no arquivo."""
+    payload = (
+        ArchivedConversation.objects.using(using)
+        .filter(pk=conversation_id)
+        .values_list("payload", flat=True)
+        .first()
+    )
+    return unpack(payload) if payload is not None else None
+
+
+def archivable(cutoff, using="default"):
+    """Ids das conversas CLOSED cuja última atividade é anterior a cutoff."""
+    return (
+        Conversation.objects.using(using)
+        .filter(status="CLOSED")
+        .filter(Q(last_message_at__lt=cutoff) | Q(last_message_at__isnull=True, timestamp__lt=cutoff))
+        .order_by()
+        .values_list("id", flat=True)
+    )
+
+
+def archive_batch(conversation_ids, using="default"):
+    """Arquiva as conversas (ainda CLOSED) em uma transação. Retorna Totals."""
+    with transaction.atomic(using=using):
+        conversations = list(
+            Conversation.objects.using(using)
+            .filter(id__in=conversation_ids, status="CLOSED")
+            .values(*CONVERSATION_FIELDS)
+        )
+        ids = [conversation["id"] for conversation in conversations]
+        by_conversation = defaultdict(list)
+        rows = (
+            Message.objects.using(using)
+            .filter(conversation_id__in=ids)
+            .order_by("conversation_id", "timestamp", "id")
+            .values_list("conversation_id", *PACKED_MESSAGE_FIELDS)
+        )
+        for conversation_id, *message in rows.iterator(chunk_size=2000):
+            by_conversation[conversation_id].append(message)
+        # mensagens de meses já selados (ver message/partitions.py) entram no blob
+        for conversation_id in partitioned_conversations(ids, using):
+            hot = [ArchivedMessage(*message, conversation_id) for message in by_conversation[conversation_id]]
+            by_conversation[conversation_id] = [
+                message[:len(PACKED_MESSAGE_FIELDS)]
+                for message in merge(hot, sealed_messages(conversation_id, using))
+            ]
+
+        archived, raw_bytes, stored_bytes = [], 0, 0
+        for conversation in conversations:
+            raw, payload = pack(conversation, by_conversation[conversation["id"]])
+            raw_bytes += len(raw)
+            stored_bytes += len(payload)
+            archived.append(ArchivedConversation(
+                id=conversation["id"],
+                status=conversation["status"],
+                timestamp=conversation["timestamp"],
+                last_message_at=conversation["last_message_at"],
+                message_count=conversation["message_count"],
+                last_message_id=conversation["last_message_id"],
+                payload=payload,
+            ))
+
+        ArchivedConversation.objects.using(using).bulk_create(archived)
+        messages, _ = Message.objects.using(using).filter(conversation_id__in=ids).delete()
+        Conversation.objects.using(using).filter(id__in=ids).delete()
+        forget_conversations(ids, using)
+        invalidate_conversations(ids)
+    return Totals(len(ids), messages, raw_bytes, stored_bytes)
+
+
+def archive_conversations(days=None, batch_size=200, limit=None, now=None, using="default"):
+    """
+    Arquiva, em lotes de batch_size conversas (uma transação por lote), as
+    conversas CLOSED inativas há mais de `days` dias (padrão:
+    ARCHIVE_AFTER_DAYS). Gera os Totals de cada lote.
+    """
+    if days is None:
+        days = settings.ARCHIVE_AFTER_DAYS
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        ids = list(archivable(cutoff, using)[:size])
+        if not ids:
+            return
+        totals = archive_batch(ids, using)
+        if not totals.conversations:
+            return
+        if remaining is not None:
+            remaining -= len(ids)
+        yield totals
+
+
+def restore_conversation(conversation_id, using="default"):
+    """Devolve uma conversa arquivada às tabelas quentes. Retorna False se ela não estiver no arquivo."""
+    with transaction.atomic(using=using):
+        archived = load_archived(conversation_id, using)
+        if archived is None:
+            return False
+        conversation, messages = archived
+        Conversation.objects.using(using).bulk_create([conversation])
+        Message.objects.using(using).bulk_create(
+            [Message(**message._asdict()) for message in messages],
+            batch_size=2000,
+        )
+        ArchivedConversation.objects.using(using).filter(pk=conversation.id).delete()
+        invalidate_conversations([conversation.id])
+    return True
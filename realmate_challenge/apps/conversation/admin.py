@@ -1,11 +1,96 @@
+from django.conf import settings
 from django.contrib import admin
+from django.db.models import Sum
+from django.forms.models import BaseInlineFormSet
+from django.utils.functional import cached_property
 
 from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.apps.message.models import Message, MessagePartition
+from realmate_challenge.paginators import EstimatedCountPaginator
+
+
+class MessagePageFormSet(BaseInlineFormSet):
+    """
+    Uma página das mensagens da conversa, das mais recentes para as mais
+    antigas. O número de páginas vem de Conversation.message_count menos as
+    seladas (MessagePartition, ver message/partitions.py), que não estão na
+    tabela quente: sem COUNT das mensagens.
+    """
+    requested_page = 1
+    per_page = settings.ADMIN_MESSAGE_INLINE_PER_PAGE
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            start = (self.page - 1) * self.per_page
+            self._queryset = self.queryset.order_by('-timestamp', '-id')[start:start + self.per_page]
+        return self._queryset
+
+    @cached_property
+    def sealed_count(self):
+        return (
+            MessagePartition.objects.filter(conversation_id=self.instance.pk)
+            .aggregate(total=Sum('message_count'))['total'] or 0
+        )
+
+    @property
+    def hot_count(self):
+        return max(self.instance.message_count - self.sealed_count, 0)
+
+    @property
+    def page_count(self):
+        return max(1, -(-self.hot_count // self.per_page))
+
+    @property
+    def page(self):
+        return min(self.requested_page, self.page_count)
+
+    @property
+    def previous_page(self):
+        return self.page - 1 if self.page > 1 else None
+
+    @property
+    def next_page(self):
+        return self.page + 1 if self.page < self.page_count else None
+
+
+class MessageInline(admin.TabularInline):
+    model = Message
+    formset = MessagePageFormSet
+    template = 'admin/conversation/message_inline.html'
+    fields = ('id', 'direction', 'content', 'timestamp')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    # parâmetro da query string com a página do inline
+    page_param = 'messages_page'
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        try:
+            page = max(1, int(request.GET.get(self.page_param, 1)))
+        except ValueError:
+            page = 1
+        return type(formset.__name__, (formset,), {'requested_page': page, 'page_param': self.page_param})
+
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
     list_display = ('id', 'status', 'timestamp', 'last_message_at')
     search_fields = ('id',)
     list_filter = ('status',)
+    # navegação por data sobre os índices que começam por last_message_at
+    date_hierarchy = 'last_message_at'
     readonly_fields = ('id', 'timestamp', 'last_message_at')
     ordering = ('-last_message_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    inlines = [MessageInline]
@@ -4,3 +4,16 @@ class ConversationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'realmate_challenge.apps.conversation'
     label= 'conversation'
+
+    def ready(self):
+        from django.core.checks import Tags, register
+        from django.db.backends.signals import connection_created
+
+        from realmate_challenge.database import configure_sqlite_connection
+        from realmate_challenge.metrics import install_query_recorder
+
+        from .checks import check_conversation_cache
+
+        connection_created.connect(configure_sqlite_connection, dispatch_uid="configure_sqlite_connection")
+        connection_created.connect(install_query_recorder, dispatch_uid="install_query_recorder")
+        register(check_conversation_cache, Tags.caches)
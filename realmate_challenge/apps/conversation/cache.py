@@ -0,0 +1,128 @@
+"""
+Cache das leituras de conversa (payload do retrieve e páginas HTML).
+
+As entradas ficam no cache do Django (CONVERSATION_CACHE_ALIAS, locmem por
+padrão) sob a chave "<conversa>:<variante>:<ETag>". A versão de cada
+conversa também fica no cache e é trocada a cada escrita (webhook,
+MessageViewSet, edição da conversa), depois do commit; as entradas antigas
+simplesmente deixam de ser lidas e expiram sozinhas.
+
+O ETag (ver conversation/conditional.py) sai das colunas da conversa no
+banco e da versão, e é lido antes de montar o valor: se uma escrita
+acontecer no meio de uma leitura, o resultado é guardado sob o ETag antigo
+e nunca é servido. Como as colunas vêm do banco, uma mensagem nova ou o
+encerramento mudam a chave mesmo que a troca de versão não chegue a este
+processo (cache locmem com vários workers: ver conversation/checks.py).
+
+Conversas CLOSED não mudam mais e ficam com TTL longo
+(CONVERSATION_CACHE_CLOSED_TTL); as abertas usam CONVERSATION_CACHE_TTL.
+"""
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+KEY_PREFIX = "conversation"
+
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, "CONVERSATION_CACHE_ALIAS", "default")]
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def cache_stats():
+    """Acertos, falhas e invalidações deste processo, e a taxa de acerto."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+def _version_key(conversation_id):
+    return f"{KEY_PREFIX}:{uuid.UUID(str(conversation_id))}:version"
+
+
+def _new_version():
+    # aleatória (e não um contador) para não repetir uma versão antiga se a
+    # chave de versão for descartada pelo cache
+    return uuid.uuid4().hex[:12]
+
+
+def conversation_version(conversation_id):
+    cache = _cache()
+    key = _version_key(conversation_id)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def cached_conversation(conversation_id, variant, etag, build):
+    """
+    Devolve o valor em cache para (conversa, variante, ETag) ou chama build(),
+    que retorna (valor, status da conversa), e guarda o resultado. Exceções
+    de build() (ex.: Http404) passam direto, sem guardar nada.
+    Retorna (valor, acerto).
+    """
+    cache = _cache()
+    key = f"{KEY_PREFIX}:{uuid.UUID(str(conversation_id))}:{variant}:{etag}"
+    value = cache.get(key)
+    if value is not None:
+        _count("hits")
+        return value, True
+
+    _count("misses")
+    value, status = build()
+    if status == "CLOSED":
+        timeout = getattr(settings, "CONVERSATION_CACHE_CLOSED_TTL", 7 * 24 * 3600)
+    else:
+        timeout = getattr(settings, "CONVERSATION_CACHE_TTL", 300)
+    cache.set(key, value, timeout)
+    return value, False
+
+
+def invalidate_conversations(conversation_ids):
+    """Troca a versão das conversas depois do commit da transação atual."""
+    versions = _new_versions(conversation_ids)
+    if not versions:
+        return
+
+    def invalidate():
+        _cache().set_many(versions, timeout=None)
+        _count("invalidations", len(versions))
+
+    transaction.on_commit(invalidate)
+
+
+def invalidate_conversation(conversation_id):
+    invalidate_conversations([conversation_id])
+
+
+async def ainvalidate_conversation(conversation_id):
+    """Versão para o ORM assíncrono (sempre em autocommit: invalida na hora)."""
+    versions = _new_versions([conversation_id])
+    await _cache().aset_many(versions, timeout=None)
+    _count("invalidations", len(versions))
+
+
+def _new_versions(conversation_ids):
+    return {_version_key(conversation_id): _new_version() for conversation_id in set(conversation_ids)}
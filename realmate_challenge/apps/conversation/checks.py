@@ -0,0 +1,34 @@
+"""
+Checks de configuração do cache de conversas.
+
+Com um channel layer fora da memória (Redis), o projeto roda em vários
+processos (workers daphne, process_webhook_inbox). Se o
+CONVERSATION_CACHE_ALIAS apontar para um LocMemCache, cada processo tem o
+seu cache e a troca de versão de uma escrita não chega aos outros: uma
+edição que não muda as colunas do ETag (ex.: pelo admin) seguiria servida
+pelos outros workers por até CONVERSATION_CACHE_TTL (ou
+CONVERSATION_CACHE_CLOSED_TTL, nas conversas fechadas).
+"""
+from django.conf import settings
+from django.core.checks import Warning
+
+from realmate_challenge.channel_layers import is_in_memory
+
+
+LOCMEM_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+
+
+def check_conversation_cache(app_configs, **kwargs):
+    alias = getattr(settings, "CONVERSATION_CACHE_ALIAS", "default")
+    backend = settings.CACHES.get(alias, {}).get("BACKEND")
+    layers = getattr(settings, "CHANNEL_LAYERS", None)
+    if backend != LOCMEM_BACKEND or not layers or is_in_memory(layers):
+        return []
+    return [
+        Warning(
+            f"O cache de conversas ({alias!r}) é um LocMemCache, por processo, mas o "
+            "channel layer indica vários workers: as invalidações não chegam aos outros processos.",
+            hint="Configure CACHE_REDIS_URL (ou aponte CONVERSATION_CACHE_ALIAS para um cache compartilhado).",
+            id="conversation.W001",
+        )
+    ]
@@ -0,0 +1,67 @@
+"""
+GET condicional (ETag) nas leituras de conversa.
+
+O validador sai de uma única consulta pela chave primária, que lê só as
+colunas desnormalizadas da conversa (status, last_message_at, contadores e
+id da última mensagem); nenhuma mensagem é carregada ou serializada para
+responder 304. Conversas arquivadas (ver apps/archive) têm as mesmas
+colunas fora do blob, então também respondem 304 (com uma segunda consulta
+pela chave primária) sem descomprimir nada.
+
+O ETag é fraco e inclui também a versão da conversa no cache (ver
+conversation/cache.py), trocada a cada escrita: assim escritas que não mudam
+as colunas acima (ex.: edições pelo admin) também geram um ETag novo.
+
+Não há Last-Modified: nenhuma coluna registra a última escrita (fechar a
+conversa ou uma mensagem retroativa não mudam last_message_at), e
+um If-Modified-Since conferido contra last_message_at devolveria 304 errados.
+"""
+import hashlib
+
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from realmate_challenge.apps.archive.models import ArchivedConversation
+
+from .cache import conversation_version
+from .models import Conversation
+
+
+ETAG_FIELDS = ["status", "last_message_at", "message_count", "last_message_id"]
+
+
+def conversation_etag(conversation_id, variant, using="default"):
+    """
+    ETag fraco da conversa para a variante (ex.: "api:json", "html:detail").
+    Levanta Http404 se ela não existir.
+    """
+    try:
+        status, last_message_at, message_count, last_message_id = (
+            Conversation.objects.using(using).values_list(*ETAG_FIELDS).get(pk=conversation_id)
+        )
+    except Conversation.DoesNotExist:
+        # conversas arquivadas guardam as mesmas colunas fora do blob
+        try:
+            status, last_message_at, message_count, last_message_id = (
+                ArchivedConversation.objects.using(using).values_list(*ETAG_FIELDS).get(pk=conversation_id)
+            )
+        except ArchivedConversation.DoesNotExist:
+            raise Http404("Conversa não encontrada.")
+
+    version = conversation_version(conversation_id)
+    digest = hashlib.md5(
+        f"{status}:{last_message_at}:{message_count}:{last_message_id}:{version}:{variant}".encode()
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def not_modified(request, etag):
+    """Resposta 304 se If-None-Match confere; senão None."""
+    return get_conditional_response(request, etag=etag)
+
+
+def set_etag(response, etag):
+    """Adiciona o ETag e pede revalidação a cada uso."""
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,253 @@
+"""
+Exportação em streaming de conversas e mensagens (NDJSON ou CSV).
+
+As linhas saem de `.values().iterator(chunk_size)` (ou `aiterator` sob ASGI)
+e são codificadas em blocos, então a memória usada não depende do tamanho
+do histórico.
+
+Exportação incremental: `last_message_after` (a "marca d'água") traz só
+as conversas com mensagens a partir daquele instante (ou, no modo
+mensagens, só as mensagens a partir dele). O limite é inclusivo, então as
+linhas exatamente na marca se repetem na exportação seguinte: deduplique
+pelo id.
+
+As mensagens seladas (ver message/partitions.py) entram intercaladas às da
+tabela quente na mesma ordem (timestamp, id), lidas em blocos dos arquivos
+dos meses.
+"""
+import csv
+import datetime
+import heapq
+import io
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+
+from django.utils.dateparse import parse_datetime
+
+from rest_framework.exceptions import ParseError
+
+from realmate_challenge.apps.message.models import Message, SealedMessageEntry
+from realmate_challenge.apps.message.partitions import sealed_chunks
+
+from .models import Conversation
+
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+CONVERSATION_FIELDS = [
+    "id",
+    "status",
+    "timestamp",
+    "last_message_at",
+    "message_count",
+    "unread_received_count",
+    "last_message_id",
+    "last_message_direction",
+    "last_message_preview",
+]
+
+MESSAGE_FIELDS = ["id", "conversation_id", "direction", "content", "timestamp"]
+
+# campo usado pela marca d'água de cada tipo de exportação
+WATERMARK_FIELDS = {
+    "conversations": "last_message_at",
+    "messages": "timestamp",
+}
+
+# linhas lidas do banco por vez e linhas codificadas por bloco enviado ao cliente
+CHUNK_SIZE = 2000
+ROWS_PER_CHUNK = 500
+
+
+def parse_export_params(query_params):
+    """
+    Lê os parâmetros da exportação (export_format, kind, status, since, until,
+    last_message_after). Levanta ParseError (400) se algum for inválido.
+    """
+    params = {
+        "export_format": query_params.get("export_format", "ndjson"),
+        "kind": query_params.get("kind", "conversations"),
+        "status": query_params.get("status") or None,
+    }
+    if params["export_format"] not in FORMATS:
+        raise ParseError("Parâmetro 'export_format' deve ser 'ndjson' ou 'csv'.")
+    if params["kind"] not in WATERMARK_FIELDS:
+        raise ParseError("Parâmetro 'kind' deve ser 'conversations' ou 'messages'.")
+    if params["status"] and params["status"] not in dict(Conversation.STATUS_CHOICES):
+        raise ParseError("Parâmetro 'status' deve ser 'OPEN' ou 'CLOSED'.")
+
+    for name in ("since", "until", "last_message_after"):
+        value = query_params.get(name)
+        params[name] = parse_datetime(value) if value else None
+        if value and params[name] is None:
+            raise ParseError(f"Parâmetro '{name}' inválido. Use ISO 8601.")
+    return params
+
+
+def export_queryset(kind="conversations", status=None, since=None, until=None,
+                    last_message_after=None, using="default"):
+    """
+    Queryset de dicionários a exportar, em ordem crescente da marca d'água.
+
+    - conversations: uma linha por conversa; since/until filtram a criação;
+    - messages: uma linha por mensagem; since/until filtram a mensagem e
+      status filtra a conversa a que ela pertence.
+    """
+    if kind == "messages":
+        queryset = Message.objects.using(using)
+        if status:
+            queryset = queryset.filter(conversation__status=status)
+        fields = MESSAGE_FIELDS
+    else:
+        queryset = Conversation.objects.using(using)
+        if status:
+            queryset = queryset.filter(status=status)
+        fields = CONVERSATION_FIELDS
+
+    if since:
+        queryset = queryset.filter(timestamp__gte=since)
+    if until:
+        queryset = queryset.filter(timestamp__lt=until)
+
+    watermark = WATERMARK_FIELDS[kind]
+    if last_message_after:
+        queryset = queryset.filter(**{f"{watermark}__gte": last_message_after})
+    return queryset.order_by(watermark, "id").values(*fields), fields
+
+
+def sealed_export_queryset(kind="conversations", status=None, since=None, until=None,
+                           last_message_after=None, using="default"):
+    """
+    SealedMessageEntry das mensagens seladas a exportar, com os filtros de
+    export_queryset e na mesma ordem; None na exportação de conversas.
+    """
+    if kind != "messages":
+        return None
+    entries = SealedMessageEntry.objects.using(using)
+    if status:
+        entries = entries.filter(
+            conversation_id__in=Conversation.objects.using(using).filter(status=status).values("id")
+        )
+    if since:
+        entries = entries.filter(timestamp__gte=since)
+    if until:
+        entries = entries.filter(timestamp__lt=until)
+    if last_message_after:
+        entries = entries.filter(timestamp__gte=last_message_after)
+    return entries.order_by("timestamp", "message_id")
+
+
+def _row_key(row):
+    return row["timestamp"], row["id"]
+
+
+def export_rows(rows, sealed=None):
+    """Iterador das linhas a exportar: as do queryset e, se houver, as seladas intercaladas."""
+    rows = rows.iterator(chunk_size=CHUNK_SIZE)
+    if sealed is None:
+        return rows
+    sealed_rows = (message._asdict() for chunk in sealed_chunks(sealed, CHUNK_SIZE) for message in chunk)
+    return heapq.merge(rows, sealed_rows, key=_row_key)
+
+
+async def aexport_rows(rows, sealed=None):
+    """Versão assíncrona de export_rows; os arquivos selados são lidos em thread, um bloco por vez."""
+    rows = rows.aiterator(chunk_size=CHUNK_SIZE)
+    if sealed is None:
+        async for row in rows:
+            yield row
+        return
+
+    chunks = sealed_chunks(sealed, CHUNK_SIZE)
+    next_chunk = sync_to_async(lambda: next(chunks, None))
+
+    async def sealed_rows():
+        while (chunk := await next_chunk()) is not None:
+            for message in chunk:
+                yield message._asdict()
+
+    sealed_rows = sealed_rows()
+    row, message = await anext(rows, None), await anext(sealed_rows, None)
+    while row is not None and message is not None:
+        if _row_key(message) < _row_key(row):
+            yield message
+            message = await anext(sealed_rows, None)
+        else:
+            yield row
+            row = await anext(rows, None)
+    while row is not None:
+        yield row
+        row = await anext(rows, None)
+    while message is not None:
+        yield message
+        message = await anext(sealed_rows, None)
+
+
+def _plain(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+class RowEncoder:
+    """Converte dicionários em linhas NDJSON ou CSV (com cabeçalho)."""
+
+    def __init__(self, export_format, fields):
+        self.export_format = export_format
+        self.fields = fields
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def header(self):
+        if self.export_format != "csv":
+            return ""
+        return self._csv_line(self.fields)
+
+    def encode(self, row):
+        if self.export_format == "csv":
+            return self._csv_line(_plain(row[field]) for field in self.fields)
+        return json.dumps({field: _plain(row[field]) for field in self.fields}, ensure_ascii=False) + "\n"
+
+    def _csv_line(self, values):
+        self._writer.writerow(values)
+        line = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return line
+
+
+def stream_rows(rows, encoder):
+    """
+    Gera o conteúdo em blocos de ROWS_PER_CHUNK linhas; `rows` deve ser um
+    iterador (ex.: queryset.iterator(chunk_size=...)).
+    """
+    lines = [encoder.header()]
+    for row in rows:
+        lines.append(encoder.encode(row))
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+async def astream_rows(rows, encoder):
+    """
+    Versão assíncrona de stream_rows (ex.: queryset.aiterator(chunk_size=...)),
+    para servir sob ASGI sem carregar tudo em memória.
+    """
+    lines = [encoder.header()]
+    async for row in rows:
+        lines.append(encoder.encode(row))
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
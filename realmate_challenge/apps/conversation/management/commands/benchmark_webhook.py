@@ -0,0 +1,134 @@
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from realmate_challenge.apps.conversation import write_queue
+from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.benchmarks import percentiles
+from realmate_challenge.database import temporary_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a latência (p50/p99) do webhook síncrono (webhook/), do assíncrono '
+        '(webhook/async/) e do inbox (webhook/inbox/, só a resposta 202) com eventos '
+        'NEW_MESSAGE concorrentes, em um banco temporário'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Eventos NEW_MESSAGE por modo.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Requisições simultâneas.')
+        parser.add_argument('--conversations', type=int, default=20, help='Conversas entre as quais as mensagens são distribuídas.')
+        parser.add_argument('--mode', choices=['sync', 'async', 'inbox', 'both'], default='both')
+        parser.add_argument(
+            '--write-shards', type=int, default=None,
+            help='Shards da fila de escrita (ver write_queue.py); 0 escreve na thread da requisição. '
+                 'Padrão: CONVERSATION_WRITE_SHARDS.',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['conversations'] < 1:
+            raise CommandError('--requests, --concurrency e --conversations devem ser positivos.')
+
+        modes = ['sync', 'async'] if options['mode'] == 'both' else [options['mode']]
+        shards = settings.CONVERSATION_WRITE_SHARDS if options['write_shards'] is None else options['write_shards']
+        if shards < 0:
+            raise CommandError('--write-shards não pode ser negativo.')
+        self.stdout.write(f'fila de escrita: {shards} shard(s)' if shards else 'fila de escrita: desligada')
+
+        errors = 0
+        with temporary_database('benchmark_webhook_'), override_settings(CONVERSATION_WRITE_SHARDS=shards):
+            for mode in modes:
+                events = self.build_events(options['requests'], options['conversations'])
+                if mode in ('sync', 'inbox'):
+                    url = reverse('webhook' if mode == 'sync' else 'webhook_inbox')
+                    elapsed, latencies, statuses = self.run_sync(url, events, options['concurrency'])
+                else:
+                    elapsed, latencies, statuses = asyncio.run(self.run_async(events, options['concurrency']))
+                errors += self.report(mode, elapsed, latencies, statuses)
+            write_queue.stop()
+
+        # requisições que falharam (ex.: "database is locked" sem o perfil
+        # production) saem rápido e distorcem a latência: a medição não vale
+        if errors:
+            raise CommandError(
+                f'{errors} requisição(ões) falharam; as latências acima não valem como resultado. '
+                'Rode com DATABASE_PROFILE=production (WAL, busy timeout e fila de escrita).'
+            )
+
+    def build_events(self, total, conversations):
+        """Cria as conversas e devolve os eventos NEW_MESSAGE a enviar."""
+        now = timezone.now()
+        conversation_ids = [uuid.uuid4() for _ in range(conversations)]
+        Conversation.objects.bulk_create(
+            Conversation(id=conv_id, status='OPEN', timestamp=now) for conv_id in conversation_ids
+        )
+        connections.close_all()
+
+        return [
+            {
+                "type": "NEW_MESSAGE",
+                "timestamp": (now + timedelta(milliseconds=index)).isoformat(),
+                "data": {
+                    "id": str(uuid.uuid4()),
+                    "direction": "RECEIVED" if index % 2 else "SENT",
+                    "content": f"Mensagem de benchmark {index}",
+                    "conversation_id": str(conversation_ids[index % conversations]),
+                },
+            }
+            for index in range(total)
+        ]
+
+    def run_sync(self, url, events, concurrency):
+        def post(event):
+            client = Client()
+            start = time.perf_counter()
+            response = client.post(url, event, content_type='application/json')
+            latency = time.perf_counter() - start
+            connections.close_all()
+            return latency, response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(post, events))
+        elapsed = time.perf_counter() - start
+        return elapsed, [latency for latency, _ in results], [code for _, code in results]
+
+    async def run_async(self, events, concurrency):
+        url = reverse('webhook_async')
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def post(event):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(url, event, content_type='application/json')
+                return time.perf_counter() - start, response.status_code
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(post(event) for event in events))
+        elapsed = time.perf_counter() - start
+        return elapsed, [latency for latency, _ in results], [code for _, code in results]
+
+    def report(self, mode, elapsed, latencies, statuses):
+        """Escreve a linha do modo e devolve o número de respostas de erro."""
+        p50, p99, worst = percentiles(latencies)
+        errors = sum(1 for code in statuses if code >= 400)
+        self.stdout.write(
+            f'{mode:>5}: {len(latencies)} req em {elapsed:.2f}s '
+            f'({len(latencies) / elapsed:.0f} req/s) | '
+            f'p50 {p50:.2f} ms | p99 {p99:.2f} ms | máx {worst:.2f} ms | erros {errors}'
+        )
+        if errors:
+            self.stdout.write(self.style.WARNING(f'       códigos: {sorted(set(statuses))}'))
+        return errors
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from realmate_challenge.apps.conversation.query_plans import explain, hot_queries, plan_problems
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa EXPLAIN QUERY PLAN (SQLite) nas consultas mais frequentes e falha '
+        'se alguma fizer varredura completa da tabela ou ordenação em B-tree temporária; '
+        'os mesmos planos são conferidos pelos testes de conversation/tests.py'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias do banco a verificar.')
+        parser.add_argument('--verbose-plans', action='store_true', help='Mostra o plano completo de cada consulta.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN só é suportado no SQLite.')
+
+        failures = []
+        for name, queryset in hot_queries():
+            plan = explain(connection, queryset)
+            problems = plan_problems(plan)
+
+            if problems:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'✗ {name}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✓ {name}'))
+
+            for step in plan if options['verbose_plans'] else problems:
+                self.stdout.write(f'    {step}')
+
+        if failures:
+            raise CommandError(f'{len(failures)} consulta(s) sem índice adequado: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('Todas as consultas usam índices.'))
@@ -0,0 +1,95 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from realmate_challenge.apps.conversation.export import (
+    CHUNK_SIZE,
+    FORMATS,
+    WATERMARK_FIELDS,
+    RowEncoder,
+    export_queryset,
+    stream_rows,
+)
+from realmate_challenge.database import read_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta conversas ou mensagens em NDJSON ou CSV, em streaming. Com '
+        '--watermark-file a exportação é incremental: só lê as linhas a partir '
+        'da marca d\'água da execução anterior e grava a nova marca no arquivo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', choices=list(FORMATS), default='ndjson')
+        parser.add_argument('--kind', choices=list(WATERMARK_FIELDS), default='conversations')
+        parser.add_argument('--status', choices=['OPEN', 'CLOSED'])
+        parser.add_argument('--since', help='Início da janela de tempo (ISO 8601).')
+        parser.add_argument('--until', help='Fim da janela de tempo, exclusivo (ISO 8601).')
+        parser.add_argument('--last-message-after', help='Marca d\'água (ISO 8601), inclusiva.')
+        parser.add_argument('--watermark-file', help='Arquivo com a marca d\'água, lido e atualizado a cada execução.')
+        parser.add_argument('--output', '-o', help='Arquivo de saída (padrão: stdout).')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Linhas lidas do banco por vez.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size deve ser positivo.')
+
+        params = {'kind': options['kind'], 'status': options['status']}
+        for name in ('since', 'until', 'last_message_after'):
+            params[name] = self.parse_timestamp(name, options[name])
+
+        watermark_file = options['watermark_file']
+        if watermark_file and params['last_message_after'] is None:
+            params['last_message_after'] = self.read_watermark(watermark_file)
+
+        rows, fields = export_queryset(**params, using=read_database())
+        watermark_field = WATERMARK_FIELDS[options['kind']]
+        state = {'rows': 0, 'watermark': params['last_message_after']}
+
+        def tracked():
+            # acompanha a maior marca d'água sem guardar as linhas
+            for row in rows.iterator(chunk_size=options['chunk_size']):
+                state['rows'] += 1
+                if row[watermark_field] is not None:
+                    state['watermark'] = row[watermark_field]
+                yield row
+
+        encoder = RowEncoder(options['export_format'], fields)
+
+        start = time.perf_counter()
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for chunk in stream_rows(tracked(), encoder):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        elapsed = time.perf_counter() - start
+
+        if watermark_file and state['watermark'] is not None:
+            with open(watermark_file, 'w', encoding='utf-8') as f:
+                f.write(state['watermark'].isoformat() + '\n')
+
+        watermark = state['watermark'].isoformat() if state['watermark'] else '-'
+        self.stderr.write(self.style.SUCCESS(
+            f'{state["rows"]} linhas exportadas em {elapsed:.2f}s (marca d\'água: {watermark}).'
+        ))
+
+    def parse_timestamp(self, name, value):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CommandError(f'--{name.replace("_", "-")} inválido. Use ISO 8601.')
+        return parsed
+
+    def read_watermark(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                value = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return self.parse_timestamp('watermark_file', value)
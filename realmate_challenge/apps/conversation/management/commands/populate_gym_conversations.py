@@ -1,146 +1,206 @@
+import json
+import random
+import time
 import uuid
-from datetime import datetime, timedelta
-from django.core.management.base import BaseCommand
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.utils import timezone
+
 from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.apps.conversation.stats import apply_messages
 from realmate_challenge.apps.message.models import Message
 
 
+# Diálogos sobre academia usados como conteúdo das mensagens geradas
+DIALOGUES = [
+    [
+        'Olá! Gostaria de saber sobre os planos da academia.',
+        'Olá! Temos 3 planos disponíveis: Básico (R$ 89/mês), Premium (R$ 129/mês) e VIP (R$ 179/mês).',
+        'Qual a diferença entre eles?',
+        'O Básico inclui musculação e cardio. O Premium adiciona aulas coletivas. O VIP tem personal trainer incluso.',
+        'O VIP inclui quantas sessões de personal?',
+        'São 8 sessões mensais de personal trainer, além de avaliação física completa.',
+        'Perfeito! Vou pensar e retorno. Obrigado!',
+        'Por nada! Estamos aqui quando precisar. Tenha um ótimo dia!',
+    ],
+    [
+        'Bom dia! Quais são os horários de funcionamento?',
+        'Bom dia! Funcionamos de segunda a sexta das 5h às 23h, sábados das 7h às 20h e domingos das 8h às 18h.',
+        'E as aulas coletivas? Têm horários específicos?',
+        'Sim! Temos aulas de spinning às 7h, 12h e 19h. Zumba às 18h. Pilates às 9h e 17h. Yoga às 8h e 20h.',
+        'Preciso agendar as aulas ou posso chegar na hora?',
+        'Para spinning e pilates é necessário agendamento pelo app. Zumba e yoga são por ordem de chegada.',
+    ],
+    [
+        'Oi! Vocês têm piscina e sauna?',
+        'Olá! Sim, temos piscina aquecida e sauna seca. Ambas estão incluídas nos planos Premium e VIP.',
+        'E área de musculação? É bem equipada?',
+        'Temos mais de 200 equipamentos! Área completa de musculação, cardio com TVs individuais e zona funcional.',
+        'Que legal! E vestiários?',
+        'Vestiários amplos com armários, chuveiros quentes e área de descanso. Também temos estacionamento gratuito.',
+    ],
+    [
+        'Vocês oferecem acompanhamento nutricional?',
+        'Sim! Temos nutricionista 3x por semana. Consultas incluídas no plano VIP, demais planos com desconto de 50%.',
+        'E avaliação física? Como funciona?',
+        'Fazemos bioimpedância, medidas corporais e teste de flexibilidade. Reavaliação a cada 3 meses.',
+        'Vocês têm lanchonete ou área de alimentação?',
+        'Temos uma lanchonete com opções saudáveis: sucos naturais, sanduíches integrais, saladas e suplementos.',
+    ],
+]
+
+
+def message_count(rng, distribution, minimum, maximum):
+    """Quantidade de mensagens de uma conversa segundo a distribuição escolhida."""
+    if distribution == 'fixed' or minimum == maximum:
+        return maximum
+    if distribution == 'zipf':
+        # cauda longa: a maioria das conversas é curta, poucas são enormes
+        size = int(minimum * rng.paretovariate(1.2))
+        return min(max(size, minimum), maximum)
+    return rng.randint(minimum, maximum)
+
+
 class Command(BaseCommand):
-    help = 'Popula o banco de dados com conversas e mensagens sobre academia'
+    help = (
+        'Gera conversas e mensagens sobre academia com bulk_create, sem perguntas, '
+        'e informa a taxa de linhas por segundo. Opcionalmente grava os mesmos dados '
+        'como eventos do webhook (NDJSON) para o replay_webhook_events'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversations', type=int, default=4, help='Quantidade de conversas.')
+        parser.add_argument('--min-messages', type=int, default=6, help='Mínimo de mensagens por conversa.')
+        parser.add_argument('--max-messages', type=int, default=8, help='Máximo de mensagens por conversa.')
+        parser.add_argument(
+            '--distribution', choices=['uniform', 'zipf', 'fixed'], default='uniform',
+            help='Distribuição das mensagens por conversa entre o mínimo e o máximo.',
+        )
+        parser.add_argument('--closed-ratio', type=float, default=0.25, help='Fração de conversas fechadas.')
+        parser.add_argument('--span-days', type=float, default=2, help='Período (até agora) em que as conversas começam.')
+        parser.add_argument('--seed', type=int, help='Semente do gerador (mesma semente, mesmos dados).')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Linhas por bulk_create.')
+        parser.add_argument('--clear', action='store_true', help='Apaga conversas e mensagens existentes antes.')
+        parser.add_argument('--events-file', help='Grava os dados também como eventos do webhook (NDJSON).')
+        parser.add_argument('--events-only', action='store_true', help='Só grava o arquivo de eventos, sem tocar no banco.')
 
     def handle(self, *args, **options):
-        self.stdout.write('Iniciando população do banco de dados...')
-        
-        # Limpar dados existentes se necessário
-        if self.confirm_clear():
+        self.validate(options)
+        rng = random.Random(options['seed'])
+
+        if options['clear'] and not options['events_only']:
             Message.objects.all().delete()
             Conversation.objects.all().delete()
             self.stdout.write(self.style.WARNING('Dados existentes removidos.'))
-        
-        # Criar conversas com mensagens sobre academia
-        self.create_gym_conversations()
-        
-        self.stdout.write(
-            self.style.SUCCESS('População do banco concluída com sucesso!')
-        )
-    
-    def confirm_clear(self):
-        """Pergunta se deve limpar dados existentes"""
-        if Conversation.objects.exists() or Message.objects.exists():
-            response = input('Existem dados no banco. Deseja limpar? (s/N): ')
-            return response.lower() in ['s', 'sim', 'y', 'yes']
-        return False
-    
-    def create_gym_conversations(self):
-        """Cria conversas sobre academia com mensagens realistas"""
-        
-        # Conversa 1: Informações sobre planos
-        conv1_id = uuid.uuid4()
-        conv1_time = timezone.now() - timedelta(days=2)
-        
-        conv1 = Conversation.objects.create(
-            id=conv1_id,
-            status='CLOSED',
-            timestamp=conv1_time
-        )
-        
-        messages_conv1 = [
-            ('RECEIVED', 'Olá! Gostaria de saber sobre os planos da academia.', 0),
-            ('SENT', 'Olá! Temos 3 planos disponíveis: Básico (R$ 89/mês), Premium (R$ 129/mês) e VIP (R$ 179/mês).', 2),
-            ('RECEIVED', 'Qual a diferença entre eles?', 5),
-            ('SENT', 'O Básico inclui musculação e cardio. O Premium adiciona aulas coletivas. O VIP tem personal trainer incluso.', 8),
-            ('RECEIVED', 'O VIP inclui quantas sessões de personal?', 12),
-            ('SENT', 'São 8 sessões mensais de personal trainer, além de avaliação física completa.', 15),
-            ('RECEIVED', 'Perfeito! Vou pensar e retorno. Obrigado!', 18),
-            ('SENT', 'Por nada! Estamos aqui quando precisar. Tenha um ótimo dia!', 20)
-        ]
-        
-        self.create_messages(conv1, messages_conv1, conv1_time)
-        
-        # Conversa 2: Horários de funcionamento
-        conv2_id = uuid.uuid4()
-        conv2_time = timezone.now() - timedelta(days=1, hours=8)
-        
-        conv2 = Conversation.objects.create(
-            id=conv2_id,
-            status='OPEN',
-            timestamp=conv2_time
-        )
-        
-        messages_conv2 = [
-            ('RECEIVED', 'Bom dia! Quais são os horários de funcionamento?', 0),
-            ('SENT', 'Bom dia! Funcionamos de segunda a sexta das 5h às 23h, sábados das 7h às 20h e domingos das 8h às 18h.', 3),
-            ('RECEIVED', 'E as aulas coletivas? Têm horários específicos?', 7),
-            ('SENT', 'Sim! Temos aulas de spinning às 7h, 12h e 19h. Zumba às 18h. Pilates às 9h e 17h. Yoga às 8h e 20h.', 10),
-            ('RECEIVED', 'Preciso agendar as aulas ou posso chegar na hora?', 15),
-            ('SENT', 'Para spinning e pilates é necessário agendamento pelo app. Zumba e yoga são por ordem de chegada.', 18)
-        ]
-        
-        self.create_messages(conv2, messages_conv2, conv2_time)
-        
-        # Conversa 3: Equipamentos e estrutura
-        conv3_id = uuid.uuid4()
-        conv3_time = timezone.now() - timedelta(hours=4)
-        
-        conv3 = Conversation.objects.create(
-            id=conv3_id,
-            status='OPEN',
-            timestamp=conv3_time
-        )
-        
-        messages_conv3 = [
-            ('RECEIVED', 'Oi! Vocês têm piscina e sauna?', 0),
-            ('SENT', 'Olá! Sim, temos piscina aquecida e sauna seca. Ambas estão incluídas nos planos Premium e VIP.', 2),
-            ('RECEIVED', 'E área de musculação? É bem equipada?', 5),
-            ('SENT', 'Temos mais de 200 equipamentos! Área completa de musculação, cardio com TVs individuais e zona funcional.', 8),
-            ('RECEIVED', 'Que legal! E vestiários?', 12),
-            ('SENT', 'Vestiários amplos com armários, chuveiros quentes e área de descanso. Também temos estacionamento gratuito.', 15)
-        ]
-        
-        self.create_messages(conv3, messages_conv3, conv3_time)
-        
-        # Conversa 4: Nutrição e acompanhamento
-        conv4_id = uuid.uuid4()
-        conv4_time = timezone.now() - timedelta(hours=1)
-        
-        conv4 = Conversation.objects.create(
-            id=conv4_id,
-            status='OPEN',
-            timestamp=conv4_time
-        )
-        
-        messages_conv4 = [
-            ('RECEIVED', 'Vocês oferecem acompanhamento nutricional?', 0),
-            ('SENT', 'Sim! Temos nutricionista 3x por semana. Consultas incluídas no plano VIP, demais planos com desconto de 50%.', 3),
-            ('RECEIVED', 'E avaliação física? Como funciona?', 8),
-            ('SENT', 'Fazemos bioimpedância, medidas corporais e teste de flexibilidade. Reavaliação a cada 3 meses.', 12),
-            ('RECEIVED', 'Vocês têm lanchonete ou área de alimentação?', 16),
-            ('SENT', 'Temos uma lanchonete com opções saudáveis: sucos naturais, sanduíches integrais, saladas e suplementos.', 20)
-        ]
-        
-        self.create_messages(conv4, messages_conv4, conv4_time)
-        
-        self.stdout.write(f'Criadas {Conversation.objects.count()} conversas com {Message.objects.count()} mensagens.')
-    
-    def create_messages(self, conversation, messages_data, base_time):
-        """Cria mensagens para uma conversa"""
-        last_message_time = base_time
-        
-        for direction, content, minutes_offset in messages_data:
-            message_time = base_time + timedelta(minutes=minutes_offset)
-            
-            Message.objects.create(
-                id=uuid.uuid4(),
-                conversation=conversation,
-                direction=direction,
-                content=content,
-                timestamp=message_time
+
+        events_file = open(options['events_file'], 'w', encoding='utf-8') if options['events_file'] else None
+        totals = {'conversations': 0, 'messages': 0}
+        conversations, messages = [], []
+
+        start = time.perf_counter()
+        try:
+            for conversation, conversation_messages in self.generate(rng, options):
+                if events_file:
+                    self.write_events(events_file, conversation, conversation_messages)
+                if options['events_only']:
+                    totals['conversations'] += 1
+                    totals['messages'] += len(conversation_messages)
+                    continue
+
+                conversations.append(conversation)
+                messages.extend(conversation_messages)
+                if len(conversations) + len(messages) >= options['batch_size']:
+                    self.flush(conversations, messages, options['batch_size'], totals)
+                    conversations, messages = [], []
+            self.flush(conversations, messages, options['batch_size'], totals)
+        finally:
+            if events_file:
+                events_file.close()
+        elapsed = time.perf_counter() - start
+
+        rows = totals['conversations'] + totals['messages']
+        self.stdout.write(self.style.SUCCESS(
+            f'Criadas {totals["conversations"]} conversas com {totals["messages"]} mensagens '
+            f'em {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} linhas/s).'
+        ))
+
+    def validate(self, options):
+        if options['conversations'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--conversations e --batch-size devem ser positivos.')
+        if not 1 <= options['min_messages'] <= options['max_messages']:
+            raise CommandError('Use 1 <= --min-messages <= --max-messages.')
+        if not 0 <= options['closed_ratio'] <= 1:
+            raise CommandError('--closed-ratio deve estar entre 0 e 1.')
+        if options['span_days'] <= 0:
+            raise CommandError('--span-days deve ser positivo.')
+        if options['events_only'] and not options['events_file']:
+            raise CommandError('--events-only exige --events-file.')
+
+    def generate(self, rng, options):
+        """Gera (conversa, mensagens) com contadores e snapshot já preenchidos."""
+        now = timezone.now()
+        span = timedelta(days=options['span_days'])
+
+        for _ in range(options['conversations']):
+            started_at = now - span * rng.random()
+            conversation = Conversation(
+                id=uuid.UUID(int=rng.getrandbits(128), version=4),
+                status='CLOSED' if rng.random() < options['closed_ratio'] else 'OPEN',
+                timestamp=started_at,
             )
-            
-            if message_time > last_message_time:
-                last_message_time = message_time
-        
-        # Atualizar última mensagem da conversa
-        conversation.last_message_at = last_message_time
-        conversation.save(update_fields=['last_message_at'])
\ No newline at end of file
+
+            dialogue = rng.choice(DIALOGUES)
+            count = message_count(rng, options['distribution'], options['min_messages'], options['max_messages'])
+            timestamp = started_at
+            conversation_messages = []
+            for index in range(count):
+                # as mensagens nunca passam de "agora"
+                timestamp = min(timestamp + timedelta(seconds=rng.randint(5, 300)), now)
+                conversation_messages.append(Message(
+                    id=uuid.UUID(int=rng.getrandbits(128), version=4),
+                    conversation=conversation,
+                    direction='RECEIVED' if index % 2 == 0 else 'SENT',
+                    content=dialogue[index % len(dialogue)],
+                    timestamp=timestamp,
+                ))
+
+            apply_messages(conversation, conversation_messages, created=True)
+            yield conversation, conversation_messages
+
+    def flush(self, conversations, messages, batch_size, totals):
+        if not conversations and not messages:
+            return
+        with transaction.atomic():
+            Conversation.objects.bulk_create(conversations, batch_size=batch_size)
+            Message.objects.bulk_create(messages, batch_size=batch_size)
+        totals['conversations'] += len(conversations)
+        totals['messages'] += len(messages)
+
+    def write_events(self, events_file, conversation, messages):
+        """Mesmos dados no formato do webhook, na ordem em que o provedor enviaria."""
+        events = [{
+            'type': 'NEW_CONVERSATION',
+            'timestamp': conversation.timestamp.isoformat(),
+            'data': {'id': str(conversation.id)},
+        }]
+        events.extend({
+            'type': 'NEW_MESSAGE',
+            'timestamp': message.timestamp.isoformat(),
+            'data': {
+                'id': str(message.id),
+                'direction': message.direction,
+                'content': message.content,
+                'conversation_id': str(conversation.id),
+            },
+        } for message in messages)
+        if conversation.status == 'CLOSED':
+            last = messages[-1].timestamp if messages else conversation.timestamp
+            events.append({
+                'type': 'CLOSE_CONVERSATION',
+                'timestamp': (last + timedelta(seconds=1)).isoformat(),
+                'data': {'id': str(conversation.id)},
+            })
+        for event in events:
+            events_file.write(json.dumps(event, ensure_ascii=False) + '\n')
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from realmate_challenge.apps.conversation.cache import invalidate_conversations
+from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.apps.conversation.stats import recompute_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula a partir das mensagens os contadores (message_count, '
+        'unread_received_count) e o snapshot da última mensagem das conversas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Conversas atualizadas por transação.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size deve ser positivo.')
+
+        start = time.perf_counter()
+        ids = Conversation.objects.order_by('id').values_list('id', flat=True)
+        updated = 0
+        batch = []
+        for conv_id in ids.iterator(chunk_size=batch_size):
+            batch.append(conv_id)
+            if len(batch) == batch_size:
+                updated += self.recompute(batch)
+                batch = []
+        if batch:
+            updated += self.recompute(batch)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'{updated} conversas recalculadas em {elapsed:.2f}s.'
+        ))
+
+    def recompute(self, ids):
+        with transaction.atomic():
+            invalidate_conversations(ids)
+            return recompute_stats(Conversation.objects.filter(id__in=ids))
@@ -0,0 +1,136 @@
+import json
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from realmate_challenge.benchmarks import percentiles
+from realmate_challenge.database import temporary_database
+
+
+def conversation_key(event):
+    data = event.get('data') or {}
+    return data.get('conversation_id') or data.get('id')
+
+
+class Command(BaseCommand):
+    help = (
+        'Reenvia ao webhook os eventos gerados por populate_gym_conversations '
+        '--events-file, com concorrência configurável, e informa a vazão e a '
+        'latência (p50/p99). Sem --url roda em processo, em um banco temporário'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('events_file', help='Arquivo NDJSON com um evento por linha.')
+        parser.add_argument('--url', help='Endpoint de um servidor em execução (ex.: http://127.0.0.1:8000/webhook/).')
+        parser.add_argument('--concurrency', type=int, default=16, help='Conversas enviadas em paralelo.')
+        parser.add_argument('--batch', type=int, default=1, help='Eventos por requisição (modo lote do webhook).')
+        parser.add_argument('--limit', type=int, help='Envia só os primeiros N eventos.')
+        parser.add_argument('--timeout', type=float, default=30, help='Timeout de cada requisição com --url, em segundos.')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['batch'] < 1:
+            raise CommandError('--concurrency e --batch devem ser positivos.')
+
+        streams = self.load(options['events_file'], options['limit'], options['batch'])
+        if options['url']:
+            self.run(streams, options, self.http_sender(options['url'], options['timeout']))
+        else:
+            with temporary_database('replay_webhook_'):
+                self.run(streams, options, self.client_sender())
+
+    def load(self, path, limit, batch):
+        """
+        Agrupa os eventos por conversa, na ordem do arquivo: cada conversa é
+        enviada em sequência (como faria o provedor) e as conversas em paralelo.
+        """
+        by_conversation = {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                for count, line in enumerate(f):
+                    if limit is not None and count >= limit:
+                        break
+                    if line.strip():
+                        event = json.loads(line)
+                        by_conversation.setdefault(conversation_key(event), []).append(event)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Não foi possível ler {path}: {e}')
+
+        if batch == 1:
+            return list(by_conversation.values())
+        return [
+            [events[i:i + batch] for i in range(0, len(events), batch)]
+            for events in by_conversation.values()
+        ]
+
+    def http_sender(self, url, timeout):
+        def send(payload):
+            request = urllib.request.Request(
+                url,
+                data=json.dumps(payload).encode(),
+                headers={'Content-Type': 'application/json'},
+                method='POST',
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=timeout) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+            except (urllib.error.URLError, TimeoutError):
+                return 0
+        return send
+
+    def client_sender(self):
+        url = reverse('webhook')
+
+        def send(payload):
+            return Client().post(url, payload, content_type='application/json').status_code
+        return send
+
+    def run(self, streams, options, send):
+        def replay(payloads):
+            results = []
+            for payload in payloads:
+                start = time.perf_counter()
+                status = send(payload)
+                results.append((time.perf_counter() - start, status, len(payload) if isinstance(payload, list) else 1))
+            if not options['url']:
+                connections.close_all()
+            return results
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = [result for stream in executor.map(replay, streams) for result in stream]
+        elapsed = time.perf_counter() - start
+
+        if not results:
+            raise CommandError('Nenhum evento para enviar.')
+
+        latencies = [latency for latency, _, _ in results]
+        statuses = Counter(status for _, status, _ in results)
+        events = sum(size for _, _, size in results)
+        p50, p99, worst = percentiles(latencies)
+
+        self.stdout.write(
+            f'{len(results)} req ({events} eventos, {len(streams)} conversas) em {elapsed:.2f}s | '
+            f'{len(results) / elapsed:.0f} req/s | {events / elapsed:.0f} eventos/s'
+        )
+        self.stdout.write(f'latência: p50 {p50:.2f} ms | p99 {p99:.2f} ms | máx {worst:.2f} ms')
+        self.stdout.write('códigos: ' + ', '.join(f'{code}: {total}' for code, total in sorted(statuses.items())))
+
+        # os eventos do arquivo são válidos: qualquer 4xx/5xx ou falha de conexão
+        # (código 0) vem da carga (ex.: "database is locked" sem o perfil
+        # production) e a vazão/latência medidas não valem como resultado
+        errors = sum(total for code, total in statuses.items() if code == 0 or code >= 400)
+        if errors:
+            raise CommandError(
+                f'{errors} requisição(ões) falharam; a vazão e as latências acima não valem como resultado. '
+                'Rode com DATABASE_PROFILE=production (WAL, busy timeout e fila de escrita).'
+            )
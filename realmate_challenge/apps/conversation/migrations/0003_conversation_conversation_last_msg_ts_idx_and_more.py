@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversation', '0002_alter_conversation_options_remove_conversation_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['last_message_at', 'timestamp'], name='conversation_last_msg_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['last_message_at', 'id'], name='conversation_last_msg_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(condition=models.Q(('status', 'OPEN')), fields=['last_message_at', 'id'], name='conversation_open_last_msg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['timestamp'], name='conversation_timestamp_idx'),
+        ),
+    ]
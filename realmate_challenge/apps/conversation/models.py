@@ -3,6 +3,9 @@ import uuid
 from django.utils import timezone
 from django.db import models
 
+# tamanho do trecho da última mensagem guardado na conversa
+PREVIEW_LENGTH = 100
+
 # conversa pode ter um timestamp de criação maior que o timestamp das mensagens e isso não gera conflito (validar regra de negócios)
 class Conversation(models.Model):
     STATUS_CHOICES = (
@@ -15,8 +18,27 @@ class Conversation(models.Model):
     timestamp = models.DateTimeField(default=timezone.now)
     last_message_at = models.DateTimeField(null=True, blank=True)
 
+    # desnormalizados para a caixa de entrada (ver conversation/stats.py)
+    message_count = models.PositiveIntegerField(default=0)
+    unread_received_count = models.PositiveIntegerField(default=0)
+    last_message_id = models.UUIDField(null=True, blank=True)
+    last_message_direction = models.CharField(max_length=10, blank=True, default='')
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default='')
+
     def __str__(self):
         return f"{self.id} ({self.status})"
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # listagem HTML (-last_message_at, -timestamp) e paginação da API (-last_message_at, -id)
+            models.Index(fields=['last_message_at', 'timestamp'], name='conversation_last_msg_ts_idx'),
+            models.Index(fields=['last_message_at', 'id'], name='conversation_last_msg_id_idx'),
+            # caixa de entrada com apenas conversas abertas
+            models.Index(
+                fields=['last_message_at', 'id'],
+                condition=models.Q(status='OPEN'),
+                name='conversation_open_last_msg_idx',
+            ),
+            models.Index(fields=['timestamp'], name='conversation_timestamp_idx'),
+        ]
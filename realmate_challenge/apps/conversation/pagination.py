@@ -0,0 +1,275 @@
+import base64
+import uuid
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+from realmate_challenge.apps.message.partitions import merge
+
+
+def encode_cursor(timestamp, pk):
+    """Codifica o par (timestamp, id) em um cursor opaco e seguro para URL."""
+    raw = f"{timestamp.isoformat() if timestamp else ''}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Decodifica um cursor gerado por encode_cursor. Levanta NotFound se inválido."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp_str, pk_str = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        timestamp = parse_datetime(timestamp_str) if timestamp_str else None
+        if timestamp_str and timestamp is None:
+            raise ValueError(timestamp_str)
+        return timestamp, uuid.UUID(pk_str)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise NotFound("Cursor inválido.")
+
+
+def _page_size(request, default, maximum, param):
+    try:
+        size = int(request.query_params[param])
+    except (KeyError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+class ConversationCursorPagination(BasePagination):
+    """
+    Paginação por keyset em (last_message_at, id), da conversa mais recente
+    para a mais antiga. Conversas sem mensagens (last_message_at nulo) vêm
+    por último, como no ORDER BY DESC do SQLite.
+    """
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    ordering = ("-last_message_at", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = _page_size(request, self.page_size, self.max_page_size, self.page_size_query_param)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            last_message_at, pk = decode_cursor(cursor)
+            if last_message_at is None:
+                queryset = queryset.filter(last_message_at__isnull=True, id__lt=pk)
+            else:
+                queryset = queryset.filter(
+                    Q(last_message_at__lt=last_message_at)
+                    | Q(last_message_at=last_message_at, id__lt=pk)
+                    | Q(last_message_at__isnull=True)
+                )
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        cursor = encode_cursor(self.last.last_message_at, self.last.id)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Cursor retornado no campo `next` da página anterior.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Quantidade de conversas por página (máximo {self.max_page_size}).",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class MessageWindowPagination:
+    """
+    Janela limitada de mensagens de uma conversa, navegável por cursores
+    em (timestamp, id).
+
+    - sem cursor: as `limit` mensagens mais recentes;
+    - `before`: mensagens anteriores ao cursor;
+    - `after`: mensagens posteriores ao cursor.
+
+    As mensagens são sempre devolvidas em ordem cronológica.
+    """
+    limit = 50
+    max_limit = 200
+    limit_query_param = "messages_limit"
+    before_query_param = "before"
+    after_query_param = "after"
+
+    def __init__(self, request):
+        self.request = request
+        self.limit = _page_size(request, self.limit, self.max_limit, self.limit_query_param)
+        before = request.query_params.get(self.before_query_param)
+        after = request.query_params.get(self.after_query_param)
+        self.before = decode_cursor(before) if before else None
+        self.after = decode_cursor(after) if after and not before else None
+
+    def get_queryset(self, queryset):
+        """Aplica o cursor e o limite (+1 para detectar se há mais mensagens)."""
+        if self.after:
+            timestamp, pk = self.after
+            queryset = queryset.filter(
+                Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk)
+            ).order_by("timestamp", "id")
+        else:
+            if self.before:
+                timestamp, pk = self.before
+                queryset = queryset.filter(
+                    Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk)
+                )
+            queryset = queryset.order_by("-timestamp", "-id")
+        return queryset[:self.limit + 1]
+
+    def select(self, messages):
+        """
+        Como get_queryset, para mensagens já em memória em ordem cronológica
+        (ex.: uma conversa arquivada): mesmo cursor, ordem e limite.
+        """
+        if self.after:
+            return [m for m in messages if (m.timestamp, m.id) > self.after][:self.limit + 1]
+        if self.before:
+            messages = [m for m in messages if (m.timestamp, m.id) < self.before]
+        return messages[::-1][:self.limit + 1]
+
+    def merge(self, *windows):
+        """
+        Junta janelas de fontes diferentes (ex.: tabela quente e partições
+        seladas, ver message/partitions.py) na ordem e limite de get_queryset.
+        """
+        messages = merge(*windows)
+        if not self.after:
+            messages.reverse()
+        return messages[:self.limit + 1]
+
+    def paginate(self, messages):
+        """
+        Recebe o resultado de get_queryset e devolve (mensagens, janela),
+        com as mensagens em ordem cronológica e os cursores/links da janela.
+        """
+        messages = list(messages)
+        has_more = len(messages) > self.limit
+        messages = messages[:self.limit]
+
+        if self.after:
+            has_older = True
+        else:
+            messages.reverse()
+            has_older = has_more
+
+        first = messages[0] if messages else None
+        last = messages[-1] if messages else None
+
+        if last:
+            after = encode_cursor(last.timestamp, last.id)
+        elif self.after:
+            after = encode_cursor(*self.after)
+        else:
+            after = None
+
+        before = encode_cursor(first.timestamp, first.id) if first and has_older else None
+        return messages, {
+            "before": before,
+            "after": after,
+            "previous": self._get_link(self.before_query_param, before),
+            "next": self._get_link(self.after_query_param, after),
+        }
+
+    def _get_link(self, param, cursor):
+        if not cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.before_query_param)
+        url = remove_query_param(url, self.after_query_param)
+        return replace_query_param(url, param, cursor)
+
+
+def encode_rank_cursor(rank, pk):
+    """Codifica o par (relevância, id) de um resultado de busca."""
+    raw = f"{rank!r}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_rank_cursor(cursor):
+    """Decodifica um cursor gerado por encode_rank_cursor. Levanta NotFound se inválido."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rank_str, pk_str = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return float(rank_str), uuid.UUID(pk_str)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise NotFound("Cursor inválido.")
+
+
+class MessageSearchPagination:
+    """
+    Paginação por keyset dos resultados da busca, em (relevância, id).
+    Mesmo formato de resposta da listagem de conversas: {"next", "results"}.
+    """
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+
+    def __init__(self, request):
+        self.request = request
+        self.page_size = _page_size(request, self.page_size, self.max_page_size, self.page_size_query_param)
+        cursor = request.query_params.get(self.cursor_query_param)
+        self.after = decode_rank_cursor(cursor) if cursor else None
+
+    def paginate(self, hits):
+        """Recebe page_size + 1 resultados e devolve a página."""
+        hits = list(hits)
+        self.has_next = len(hits) > self.page_size
+        page = hits[:self.page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        cursor = encode_rank_cursor(self.last.rank, self.last.id)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("results", data),
+        ]))
@@ -0,0 +1,154 @@
+"""
+Planos (EXPLAIN QUERY PLAN, SQLite) das consultas dos caminhos quentes.
+
+Cada função abaixo monta uma consulta no mesmo formato em que as views a
+executam, com valores quaisquer nos filtros (o plano não depende deles).
+plan_problems() aponta os passos que indicam varredura completa da tabela
+ou ordenação em B-tree temporária. Os testes em conversation/tests.py
+conferem uma consulta por teste; o comando check_query_plans lista todas
+contra um banco qualquer.
+"""
+import uuid
+
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from realmate_challenge.apps.eventlog.models import LoggedEvent
+from realmate_challenge.apps.message.models import Message, MessagePartition, SealedMessageEntry
+
+from .export import export_queryset
+from .models import Conversation
+from .pagination import ConversationCursorPagination
+
+
+PAGE_ORDERING = ConversationCursorPagination.ordering
+
+
+def conversation_first_page():
+    return Conversation.objects.order_by(*PAGE_ORDERING)[:51]
+
+
+def conversation_next_page():
+    now, conversation_id = timezone.now(), uuid.uuid4()
+    cursor = (
+        Q(last_message_at__lt=now)
+        | Q(last_message_at=now, id__lt=conversation_id)
+        | Q(last_message_at__isnull=True)
+    )
+    return Conversation.objects.filter(cursor).order_by(*PAGE_ORDERING)[:51]
+
+
+def open_conversations():
+    return Conversation.objects.filter(status='OPEN').order_by(*PAGE_ORDERING)[:51]
+
+
+def conversation_by_id():
+    return Conversation.objects.filter(id=uuid.uuid4())
+
+
+def latest_message_window():
+    return Message.objects.filter(conversation_id=uuid.uuid4()).order_by('-timestamp', '-id')[:51]
+
+
+def message_window_before():
+    now = timezone.now()
+    cursor = Q(timestamp__lt=now) | Q(timestamp=now, id__lt=uuid.uuid4())
+    return Message.objects.filter(cursor, conversation_id=uuid.uuid4()).order_by('-timestamp', '-id')[:51]
+
+
+def message_window_after():
+    return (
+        Message.objects.filter(conversation_id=uuid.uuid4(), timestamp__gt=timezone.now())
+        .order_by('timestamp', 'id')[:51]
+    )
+
+
+def message_list():
+    return Message.objects.order_by('timestamp', 'id')
+
+
+def sealed_message_list():
+    return SealedMessageEntry.objects.order_by('timestamp', 'message_id')
+
+
+def conversation_export():
+    return export_queryset(last_message_after=timezone.now())[0]
+
+
+def message_export():
+    return export_queryset(kind='messages', last_message_after=timezone.now())[0]
+
+
+def conversation_partitions():
+    return (
+        MessagePartition.objects.filter(conversation_id=uuid.uuid4())
+        .order_by('bucket').values_list('bucket', flat=True)
+    )
+
+
+def month_to_seal():
+    now = timezone.now()
+    return Message.objects.filter(timestamp__gte=now, timestamp__lt=now).order_by('timestamp', 'id')
+
+
+def existing_message_ids():
+    return Message.objects.filter(id__in=[uuid.uuid4()]).order_by().values_list('id', flat=True)
+
+
+def sealed_message_ids():
+    return SealedMessageEntry.objects.filter(message_id__in=[uuid.uuid4()]).values_list('message_id', flat=True)
+
+
+def sealed_messages_after():
+    now = timezone.now()
+    after = Q(timestamp__gt=now) | Q(timestamp=now, message_id__gt=uuid.uuid4())
+    return (
+        SealedMessageEntry.objects.filter(after, conversation_id=uuid.uuid4())
+        .order_by('timestamp', 'message_id')[:200]
+    )
+
+
+def inbox_snapshot():
+    position = LoggedEvent.objects.filter(conversation_id=OuterRef('id')).order_by('-seq').values('seq')[:1]
+    return Conversation.objects.filter(id__in=[uuid.uuid4()]).annotate(position=Subquery(position))
+
+
+def hot_queries():
+    """Consultas dos caminhos quentes: (nome, queryset)."""
+    return [
+        ("ConversationViewSet.list e conversation_list_view (primeira página)", conversation_first_page()),
+        ("ConversationViewSet.list e conversation_list_view (com cursor)", conversation_next_page()),
+        ("conversas abertas", open_conversations()),
+        ("conversa por id", conversation_by_id()),
+        ("ConversationViewSet.retrieve e páginas HTML (janela mais recente)", latest_message_window()),
+        ("ConversationViewSet.retrieve e páginas HTML (before)", message_window_before()),
+        ("ConversationViewSet.retrieve (after)", message_window_after()),
+        ("MessageViewSet.list", message_list()),
+        ("MessageViewSet.list (seladas)", sealed_message_list()),
+        ("exportação incremental de conversas", conversation_export()),
+        ("exportação incremental de mensagens", message_export()),
+        ("partições seladas da conversa", conversation_partitions()),
+        ("selagem de um mês", month_to_seal()),
+        ("webhook: mensagens já existentes", existing_message_ids()),
+        ("webhook: mensagens já seladas", sealed_message_ids()),
+        ("ChatConsumer.resume (seladas)", sealed_messages_after()),
+        ("InboxConsumer (snapshot)", inbox_snapshot()),
+    ]
+
+
+def explain(connection, queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(plan):
+    """Retorna os passos do plano que indicam varredura completa ou ordenação em B-tree temporária."""
+    problems = []
+    for step in plan:
+        if "USE TEMP B-TREE" in step:
+            problems.append(step)
+        elif step.startswith("SCAN ") and "USING" not in step:
+            problems.append(step)
+    return problems
@@ -1,13 +1,24 @@
 from rest_framework import serializers
 
-from realmate_challenge.apps.message.serializers import MessageSerializer
+from realmate_challenge.apps.message.serializers import MessageRowsField
 
 from .models import Conversation
 
 class ConversationSerializer(serializers.ModelSerializer):
-    messages = MessageSerializer(many=True, read_only=True)
-
     class Meta:
         model = Conversation
         fields = '__all__'
-        read_only_fields = ['last_message_at']
+        read_only_fields = [
+            'last_message_at',
+            'message_count',
+            'unread_received_count',
+            'last_message_id',
+            'last_message_direction',
+            'last_message_preview',
+        ]
+
+
+class ConversationDetailSerializer(ConversationSerializer):
+    # janela de mensagens lida pela view como tuplas (ver MessageWindowPagination)
+    messages = MessageRowsField(source='message_window')
+    messages_window = serializers.DictField(read_only=True)
@@ -0,0 +1,194 @@
+"""
+Contadores desnormalizados e snapshot da última mensagem de cada conversa.
+
+- message_count: total de mensagens;
+- unread_received_count: mensagens RECEIVED desde a última SENT
+  (responder a conversa zera o contador);
+- last_message_id / last_message_direction / last_message_preview:
+  cópia da mensagem mais recente, para a caixa de entrada não precisar
+  consultar a tabela de mensagens.
+"""
+from django.db import models
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Substr
+
+from realmate_challenge.apps.message.models import Message, MessagePartition
+from realmate_challenge.apps.message.partitions import merge, sealed_messages
+
+from .models import Conversation, PREVIEW_LENGTH
+
+
+def newest_message_update(message_id, direction, content, timestamp):
+    """
+    Expressões do snapshot da última mensagem que só trocam os valores se a
+    mensagem for a mais recente: a comparação é feita pelo banco, contra o
+    last_message_at gravado, então eventos fora de ordem (ou uma escrita
+    concorrente) não fazem a conversa "voltar no tempo".
+    """
+    is_newest = Q(last_message_at__isnull=True) | Q(last_message_at__lte=timestamp)
+
+    def if_newest(value, field, output_field):
+        return Case(
+            When(is_newest, then=Value(value, output_field=output_field)),
+            default=F(field),
+        )
+
+    return {
+        "last_message_at": if_newest(timestamp, "last_message_at", models.DateTimeField()),
+        "last_message_id": if_newest(message_id, "last_message_id", models.UUIDField()),
+        "last_message_direction": if_newest(direction, "last_message_direction", models.CharField()),
+        "last_message_preview": if_newest(content[:PREVIEW_LENGTH], "last_message_preview", models.CharField()),
+    }
+
+
+def message_stats_update(message_id, direction, content, timestamp):
+    """
+    Argumentos de QuerySet.update()/aupdate() que registram uma nova mensagem
+    na conversa em um único UPDATE atômico.
+    """
+    if direction == "RECEIVED":
+        unread = F("unread_received_count") + 1
+    else:
+        unread = Value(0)
+
+    return {
+        "message_count": F("message_count") + 1,
+        "unread_received_count": unread,
+        **newest_message_update(message_id, direction, content, timestamp),
+    }
+
+
+def apply_messages(conversation, messages, created=False):
+    """
+    Atualiza em memória os campos de uma conversa carregada com uma lista de
+    mensagens novas, na ordem em que foram aplicadas (usado pelo processamento
+    em lote e pelo replay do log de eventos, que gravam tudo depois com
+    bulk_create/bulk_update). O contador de não lidas segue essa ordem; o
+    snapshot fica com a mensagem de maior timestamp.
+
+    Para conversas já existentes os contadores viram expressões F() e o
+    snapshot as expressões de newest_message_update, então o incremento e a
+    comparação com a última mensagem gravada acontecem no próprio UPDATE.
+    Com created=True os valores em memória são tomados como os atuais (conversa
+    nova, zerada para recálculo ou de uma projeção que é a única a escrever
+    nela) e tudo é calculado em Python.
+    """
+    if not messages:
+        return
+
+    received_since_sent = 0
+    sent_in_batch = False
+    for message in messages:
+        if message.direction == "SENT":
+            sent_in_batch = True
+            received_since_sent = 0
+        else:
+            received_since_sent += 1
+
+    if created:
+        conversation.message_count += len(messages)
+        if sent_in_batch:
+            conversation.unread_received_count = received_since_sent
+        else:
+            conversation.unread_received_count += received_since_sent
+    else:
+        conversation.message_count = F("message_count") + len(messages)
+        if sent_in_batch:
+            conversation.unread_received_count = received_since_sent
+        else:
+            conversation.unread_received_count = F("unread_received_count") + received_since_sent
+
+    last = _newest(messages)
+    if not created:
+        for field, expression in newest_message_update(last.id, last.direction, last.content, last.timestamp).items():
+            setattr(conversation, field, expression)
+    elif conversation.last_message_at is None or conversation.last_message_at <= last.timestamp:
+        conversation.last_message_at = last.timestamp
+        conversation.last_message_id = last.id
+        conversation.last_message_direction = last.direction
+        conversation.last_message_preview = last.content[:PREVIEW_LENGTH]
+
+
+def _newest(messages):
+    """
+    A mensagem de maior timestamp; no empate, a que veio depois, como em
+    newest_message_update. Timestamps sem timezone são comparados como UTC.
+    """
+    def instant(message):
+        timestamp = message.timestamp
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.replace(tzinfo=None) - timestamp.utcoffset()
+        return timestamp
+
+    return max(reversed(messages), key=instant)
+
+
+STATS_FIELDS = [
+    "message_count",
+    "unread_received_count",
+    "last_message_at",
+    "last_message_id",
+    "last_message_direction",
+    "last_message_preview",
+]
+
+
+def recompute_stats(queryset=None):
+    """
+    Recalcula os contadores e o snapshot a partir da tabela de mensagens,
+    com um único UPDATE (subconsultas correlacionadas) para o queryset dado,
+    e depois refaz as conversas com mensagens em partições seladas.
+    Retorna o número de conversas atualizadas.
+    """
+    if queryset is None:
+        queryset = Conversation.objects.all()
+
+    messages = Message.objects.filter(conversation=OuterRef("pk")).order_by()
+    latest = messages.order_by("-timestamp", "-id")
+    sent = Message.objects.filter(conversation=OuterRef(OuterRef("pk")), direction="SENT")
+    last_sent = sent.order_by("-timestamp").values("timestamp")[:1]
+
+    def count(subquery):
+        return Coalesce(
+            Subquery(subquery.values("conversation").annotate(total=Count("id")).values("total")),
+            0,
+        )
+
+    updated = queryset.order_by().update(
+        message_count=count(messages),
+        unread_received_count=count(
+            messages.filter(
+                Q(timestamp__gt=Subquery(last_sent)) | ~Exists(sent),
+                direction="RECEIVED",
+            )
+        ),
+        last_message_at=Subquery(latest.values("timestamp")[:1]),
+        last_message_id=Subquery(latest.values("id")[:1]),
+        last_message_direction=Coalesce(Subquery(latest.values("direction")[:1]), Value("")),
+        last_message_preview=Coalesce(
+            Subquery(latest.annotate(preview=Substr("content", 1, PREVIEW_LENGTH)).values("preview")[:1]),
+            Value(""),
+        ),
+    )
+    _recompute_partitioned(queryset)
+    return updated
+
+
+def _recompute_partitioned(queryset):
+    """
+    O UPDATE de recompute_stats só enxerga a tabela quente: as conversas com
+    mensagens seladas (ver message/partitions.py) são refeitas em Python,
+    com apply_messages sobre todas as mensagens.
+    """
+    using = queryset.db
+    conversations = []
+    partitioned = queryset.filter(id__in=MessagePartition.objects.using(using).values("conversation_id"))
+    for conversation in partitioned.order_by().iterator():
+        hot = Message.objects.using(using).filter(conversation_id=conversation.id).order_by("timestamp", "id")
+        messages = merge(hot, sealed_messages(conversation.id, using))
+        conversation.message_count = conversation.unread_received_count = 0
+        conversation.last_message_at = conversation.last_message_id = None
+        conversation.last_message_direction = conversation.last_message_preview = ""
+        apply_messages(conversation, messages, created=True)
+        conversations.append(conversation)
+    Conversation.objects.using(using).bulk_update(conversations, STATS_FIELDS, batch_size=500)
@@ -0,0 +1,119 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from realmate_challenge.channel_layers import channel_layers
+
+from . import query_plans
+from .cache import cached_conversation
+from .checks import check_conversation_cache
+from .conditional import conversation_etag
+from .models import Conversation
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN só é suportado no SQLite.')
+class QueryPlanTests(TestCase):
+    """
+    As consultas dos caminhos quentes usam índices: nenhuma varredura
+    completa da tabela nem ordenação em B-tree temporária (ver query_plans.py).
+    """
+
+    def assertUsesIndexes(self, queryset):
+        plan = query_plans.explain(connection, queryset)
+        self.assertEqual(query_plans.plan_problems(plan), [], '\n'.join(plan))
+
+    def test_conversation_first_page(self):
+        self.assertUsesIndexes(query_plans.conversation_first_page())
+
+    def test_conversation_next_page(self):
+        self.assertUsesIndexes(query_plans.conversation_next_page())
+
+    def test_open_conversations(self):
+        self.assertUsesIndexes(query_plans.open_conversations())
+
+    def test_conversation_by_id(self):
+        self.assertUsesIndexes(query_plans.conversation_by_id())
+
+    def test_latest_message_window(self):
+        self.assertUsesIndexes(query_plans.latest_message_window())
+
+    def test_message_window_before(self):
+        self.assertUsesIndexes(query_plans.message_window_before())
+
+    def test_message_window_after(self):
+        self.assertUsesIndexes(query_plans.message_window_after())
+
+    def test_message_list(self):
+        self.assertUsesIndexes(query_plans.message_list())
+
+    def test_sealed_message_list(self):
+        self.assertUsesIndexes(query_plans.sealed_message_list())
+
+    def test_conversation_export(self):
+        self.assertUsesIndexes(query_plans.conversation_export())
+
+    def test_message_export(self):
+        self.assertUsesIndexes(query_plans.message_export())
+
+    def test_conversation_partitions(self):
+        self.assertUsesIndexes(query_plans.conversation_partitions())
+
+    def test_month_to_seal(self):
+        self.assertUsesIndexes(query_plans.month_to_seal())
+
+    def test_existing_message_ids(self):
+        self.assertUsesIndexes(query_plans.existing_message_ids())
+
+    def test_sealed_message_ids(self):
+        self.assertUsesIndexes(query_plans.sealed_message_ids())
+
+    def test_sealed_messages_after(self):
+        self.assertUsesIndexes(query_plans.sealed_messages_after())
+
+    def test_inbox_snapshot(self):
+        self.assertUsesIndexes(query_plans.inbox_snapshot())
+
+    def test_plan_problems(self):
+        self.assertEqual(query_plans.plan_problems(['SCAN message_message']), ['SCAN message_message'])
+        self.assertEqual(query_plans.plan_problems(['USE TEMP B-TREE FOR ORDER BY']), ['USE TEMP B-TREE FOR ORDER BY'])
+        self.assertEqual(query_plans.plan_problems(['SCAN c USING INDEX conv_last_msg_idx']), [])
+
+
+class ConversationCacheTests(TestCase):
+    def test_column_change_misses_without_invalidation(self):
+        """
+        Uma escrita feita em outro processo (sem trocar a versão deste cache)
+        muda as colunas do ETag e, com ele, a chave do payload.
+        """
+        conversation = Conversation.objects.create(status='OPEN', timestamp=timezone.now())
+
+        def build():
+            conversation.refresh_from_db()
+            return conversation.message_count, conversation.status
+
+        etag = conversation_etag(conversation.id, 'test')
+        self.assertEqual(cached_conversation(conversation.id, 'test', etag, build), (0, False))
+        self.assertEqual(cached_conversation(conversation.id, 'test', etag, build), (0, True))
+
+        Conversation.objects.filter(pk=conversation.id).update(message_count=1)
+        etag = conversation_etag(conversation.id, 'test')
+        self.assertEqual(cached_conversation(conversation.id, 'test', etag, build), (1, False))
+
+
+class ConversationCacheCheckTests(SimpleTestCase):
+    locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1'}}
+
+    def test_locmem_with_in_memory_layer(self):
+        with override_settings(CACHES=self.locmem, CHANNEL_LAYERS=channel_layers()):
+            self.assertEqual(check_conversation_cache(None), [])
+
+    def test_locmem_with_redis_layer(self):
+        with override_settings(CACHES=self.locmem, CHANNEL_LAYERS=channel_layers(['redis://127.0.0.1'])):
+            self.assertEqual([error.id for error in check_conversation_cache(None)], ['conversation.W001'])
+
+    def test_shared_cache_with_redis_layer(self):
+        with override_settings(CACHES=self.redis, CHANNEL_LAYERS=channel_layers(['redis://127.0.0.1'])):
+            self.assertEqual(check_conversation_cache(None), [])
@@ -1,48 +1,286 @@
-from drf_spectacular.utils import extend_schema
+import hashlib
+import uuid
 
-from django.shortcuts import render, get_object_or_404
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.shortcuts import render
 
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from realmate_challenge.apps.archive.storage import load_archived
+from realmate_challenge.apps.eventlog import log
+from realmate_challenge.apps.message.models import Message
+from realmate_challenge.apps.message.partitions import sealed_window
+from realmate_challenge.apps.message.serializers import MESSAGE_COLUMNS, MessageSearchSerializer
+from realmate_challenge.apps.message.views import SEARCH_PARAMETERS, search_response
+from realmate_challenge.database import read_database
 
+from .cache import cache_stats, cached_conversation, invalidate_conversation
+from .conditional import conversation_etag, not_modified, set_etag
+from .export import (
+    FORMATS,
+    RowEncoder,
+    aexport_rows,
+    astream_rows,
+    export_queryset,
+    export_rows,
+    parse_export_params,
+    sealed_export_queryset,
+    stream_rows,
+)
 from .models import Conversation
-from .serializers import ConversationSerializer
+from .pagination import ConversationCursorPagination, MessageWindowPagination
+from .serializers import ConversationSerializer, ConversationDetailSerializer
 
 
 @extend_schema(
     summary="Gerenciar conversas",
     description=(
         "Endpoint para listar, criar e acessar conversas pelo ID. "
-        "Cada conversa possui status OPEN ou CLOSED e registra a última mensagem recebida."
+        "Cada conversa possui status OPEN ou CLOSED e registra a última mensagem recebida. "
+        "A listagem é paginada por cursor e o detalhe traz apenas uma janela de mensagens. "
+        "A única alteração aceita é encerrar a conversa (status CLOSED), registrada no log "
+        "de eventos como CLOSE_CONVERSATION; conversas não são removidas pela API."
     ),
     tags=["Conversas"]
 )
 class ConversationViewSet(viewsets.ModelViewSet):
+    # sem DELETE: a remoção não é um evento do log e voltaria numa reconstrução
+    http_method_names = ["get", "post", "put", "patch", "head", "options"]
     queryset = Conversation.objects.all()
     serializer_class = ConversationSerializer
+    pagination_class = ConversationCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method in ("GET", "HEAD", "OPTIONS"):
+            queryset = queryset.using(read_database())
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "retrieve":
+            return ConversationDetailSerializer
+        return super().get_serializer_class()
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("before", str, description="Cursor: mensagens anteriores a esta posição."),
+            OpenApiParameter("after", str, description="Cursor: mensagens posteriores a esta posição."),
+            OpenApiParameter("messages_limit", int, description="Tamanho da janela de mensagens (máximo 200)."),
+        ]
+    )
+    def retrieve(self, request, *args, **kwargs):
+        self.message_window = MessageWindowPagination(request)
+
+        try:
+            conversation_id = uuid.UUID(str(kwargs[self.lookup_field]))
+        except ValueError:
+            raise Http404("Conversa não encontrada.")
+
+        def build():
+            try:
+                instance = self.get_object()
+            except Http404:
+                instance, messages = _archived_or_404(conversation_id)
+                window = self.message_window.select(messages)
+            else:
+                # uma única consulta extra traz só a janela pedida, como tuplas
+                window = _message_window(instance.id, self.message_window)
+            instance.message_window, instance.messages_window = self.message_window.paginate(window)
+            return self.get_serializer(instance).data, instance.status
+
+        # só as colunas da conversa: um 304 não carrega nenhuma mensagem
+        etag = conversation_etag(
+            conversation_id, "api:" + request.accepted_renderer.format, using=read_database()
+        )
+        response = not_modified(request, etag)
+        if response is None:
+            # os links da janela são absolutos: a variante inclui a URL completa
+            variant = "api:" + hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+            data, hit = cached_conversation(conversation_id, variant, etag, build)
+            response = Response(data)
+            response["X-Cache"] = "HIT" if hit else "MISS"
+        return set_etag(response, etag)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            conversation = serializer.save()
+            events = [log.conversation_created(conversation.id, conversation.timestamp)]
+            if conversation.status == "CLOSED":
+                events.append(log.conversation_closed(conversation.id, conversation.timestamp))
+            log.append(*events)
+
+    def perform_update(self, serializer):
+        # só o encerramento tem evento no log (CLOSE_CONVERSATION); outras
+        # alterações sumiriam em um replay_event_log --from-scratch
+        instance = serializer.instance
+        changed = {
+            field for field, value in serializer.validated_data.items() if getattr(instance, field) != value
+        }
+        if changed - {"status"} or (changed and instance.status != "OPEN"):
+            raise ValidationError({"detail": "Só é possível encerrar a conversa (status CLOSED)."})
+
+        with transaction.atomic():
+            conversation = serializer.save()
+            if changed:
+                log.append(log.conversation_closed(conversation.id, timezone.now()))
+        invalidate_conversation(conversation.id)
+
+    @extend_schema(
+        summary="Métricas do cache de conversas",
+        description="Acertos, falhas e invalidações do cache de leituras de conversa neste processo.",
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=False, methods=["get"], url_path="cache-stats")
+    def cache_stats(self, request):
+        return Response(cache_stats())
 
-# Lista todas as conversas
+    @extend_schema(
+        summary="Exportar conversas ou mensagens",
+        description=(
+            "Exporta em streaming (NDJSON ou CSV), com memória constante, todas as conversas "
+            "(ou mensagens) que passam nos filtros, em ordem crescente de `last_message_at` "
+            "(ou `timestamp` das mensagens). Para exportações incrementais, envie em "
+            "`last_message_after` o maior valor da exportação anterior (limite inclusivo: "
+            "deduplique pelo id)."
+        ),
+        parameters=[
+            OpenApiParameter("export_format", str, enum=list(FORMATS), description="Formato (padrão ndjson)."),
+            OpenApiParameter("kind", str, enum=["conversations", "messages"], description="Uma linha por conversa (padrão) ou por mensagem."),
+            OpenApiParameter("status", str, enum=["OPEN", "CLOSED"], description="Status da conversa."),
+            OpenApiParameter("since", str, description="Criadas a partir deste instante (ISO 8601)."),
+            OpenApiParameter("until", str, description="Criadas antes deste instante (ISO 8601)."),
+            OpenApiParameter("last_message_after", str, description="Marca d'água da exportação anterior (ISO 8601)."),
+        ],
+        responses={200: OpenApiTypes.STR},
+    )
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        params = parse_export_params(request.query_params)
+        export_format = params.pop("export_format")
+        using = read_database()
+        rows, fields = export_queryset(**params, using=using)
+        sealed = sealed_export_queryset(**params, using=using)
+        encoder = RowEncoder(export_format, fields)
+
+        # sob ASGI um iterador síncrono seria consumido inteiro antes do envio
+        if isinstance(request._request, ASGIRequest):
+            content = astream_rows(aexport_rows(rows, sealed), encoder)
+        else:
+            content = stream_rows(export_rows(rows, sealed), encoder)
+
+        response = StreamingHttpResponse(content, content_type=FORMATS[export_format])
+        filename = f"{params['kind']}-{timezone.now():%Y%m%d%H%M%S}.{export_format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    @extend_schema(
+        summary="Buscar mensagens da conversa",
+        description="Busca textual nas mensagens desta conversa, ordenada por relevância.",
+        parameters=SEARCH_PARAMETERS,
+        responses=MessageSearchSerializer(many=True),
+    )
+    @action(detail=True, methods=["get"])
+    def search(self, request, pk=None):
+        conversation = self.get_object()
+        return search_response(request, conversation_id=conversation.id)
+
+def _fragment(request):
+    """?fragment=1: só o trecho da próxima página, pedido pela rolagem infinita."""
+    return request.GET.get("fragment") == "1"
+
+# Lista as conversas, uma página por vez (as seguintes chegam como fragmentos)
 def conversation_list_view(request):
-    conversations = Conversation.objects.all().order_by('-last_message_at', '-timestamp')
-    return render(request, "realmate_challenge/conversations.html", {
-        "conversations": conversations
+    pagination = ConversationCursorPagination()
+    try:
+        conversations = pagination.paginate_queryset(
+            Conversation.objects.using(read_database()), Request(request)
+        )
+    except NotFound:
+        raise Http404("Cursor inválido.")
+    template = "_conversation_rows.html" if _fragment(request) else "conversations.html"
+    return render(request, f"realmate_challenge/{template}", {
+        "conversations": conversations,
+        "next": pagination.get_next_link(),
     })
 
-# Detalha uma conversa e suas mensagens
+def _archived_or_404(pk):
+    """Conversa e mensagens de uma conversa arquivada (ver apps/archive), ou 404."""
+    archived = load_archived(pk, using=read_database())
+    if archived is None:
+        raise Http404("Conversa não encontrada.")
+    return archived
+
+def _message_window(conversation_id, window):
+    """Janela de mensagens (tuplas) de uma conversa das tabelas quentes e das partições seladas."""
+    messages = window.get_queryset(
+        Message.objects.using(read_database())
+        .filter(conversation_id=conversation_id)
+        .values_list(*MESSAGE_COLUMNS, named=True)
+    )
+    sealed = sealed_window(conversation_id, window, using=read_database())
+    return window.merge(messages, sealed) if sealed else messages
+
+def _conversation_window(request, pk):
+    """
+    Conversa (das tabelas quentes ou do arquivo) e a janela de mensagens
+    pedida: as mais recentes, ou as anteriores ao cursor ?before=.
+    """
+    try:
+        window = MessageWindowPagination(Request(request))
+    except NotFound:
+        raise Http404("Cursor inválido.")
+    conversation = Conversation.objects.using(read_database()).filter(pk=pk).first()
+    if conversation is None:
+        conversation, messages = _archived_or_404(pk)
+        messages = window.select(messages)
+    else:
+        messages = _message_window(conversation.id, window)
+    messages, links = window.paginate(messages)
+    return conversation, messages, links["previous"]
+
+def _cached_page(request, pk, variant, build):
+    """
+    Serve a página renderizada do cache de conversas (ver conversation/cache.py),
+    ou 304 se o navegador já tem a versão atual (ver conversation/conditional.py).
+    Cada URL (cursor, tamanho da janela, fragmento) é uma variante própria.
+    """
+    variant = f"{variant}:{hashlib.md5(request.build_absolute_uri().encode()).hexdigest()}"
+    etag = conversation_etag(pk, variant, using=read_database())
+    response = not_modified(request, etag)
+    if response is None:
+        content, hit = cached_conversation(pk, variant, etag, build)
+        response = HttpResponse(content)
+        response["X-Cache"] = "HIT" if hit else "MISS"
+    return set_etag(response, etag)
+
+def _render_window(request, pk, variant, page_template, items_template):
+    def build():
+        conversation, messages, previous = _conversation_window(request, pk)
+        template = items_template if _fragment(request) else page_template
+        return render(request, f"realmate_challenge/{template}", {
+            "conversation": conversation,
+            "messages": messages,
+            "previous": previous,
+        }).content, conversation.status
+
+    return _cached_page(request, pk, variant, build)
+
+# Detalha uma conversa: as mensagens mais recentes e, ao rolar para cima, as anteriores
 def conversation_detail_view(request, pk):
-    conversation = get_object_or_404(Conversation, pk=pk)
-    messages = conversation.messages.all().order_by('timestamp')
-    return render(request, "realmate_challenge/conversation_detail.html", {
-        "conversation": conversation,
-        "messages": messages
-    })
+    return _render_window(request, pk, "html:detail", "conversation_detail.html", "_message_items.html")
 
 #  chat ao vivo
 
 def live_conversation_view(request, pk):
-    conversation = get_object_or_404(Conversation, pk=pk)
-    messages = conversation.messages.order_by("timestamp")
-    return render(request, "realmate_challenge/chat.html", {
-        "conversation_id": conversation.id,
-        "messages": messages
-    })
+    return _render_window(request, pk, "html:live", "chat.html", "_chat_items.html")
 
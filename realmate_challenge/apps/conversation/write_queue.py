@@ -0,0 +1,175 @@
+"""
+Fila de escrita ordenada por conversa, com commit em grupo.
+
+Todas as escritas de uma conversa (webhook síncrono e assíncrono,
+MessageViewSet.create) passam por run()/arun() com o id da conversa. Com
+CONVERSATION_WRITE_SHARDS > 0, cada conversa cai sempre no mesmo shard
+(id % shards): uma thread por shard aplica as escritas na ordem de chegada,
+então duas escritas da mesma conversa nunca concorrem entre si, e escritas
+de conversas diferentes seguem em paralelo nos outros shards.
+
+Cada thread junta até CONVERSATION_WRITE_GROUP_SIZE escritas já enfileiradas
+(esperando no máximo CONVERSATION_WRITE_GROUP_WAIT_MS pelas seguintes) em
+uma única transação: um BEGIN/COMMIT (e um fsync) por grupo em vez de um
+por evento. Cada escrita roda em um savepoint próprio, então a falha de
+uma (ex.: ID duplicado) não desfaz as outras do grupo; o resultado (ou a
+exceção) só é entregue a quem chamou depois do commit.
+
+Com o SQLite as escritas continuam serializadas pelo lock do banco, e um
+único shard já tira a disputa por ele (sem "database is locked" nem as
+esperas longas do busy timeout); mais shards valem para bancos com
+escritas concorrentes. Com CONVERSATION_WRITE_SHARDS = 0 a escrita roda na
+própria thread de quem chamou, em uma transação, com o mesmo contrato.
+"""
+import asyncio
+import atexit
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+
+_STOP = object()
+
+
+class WriteQueue:
+    """Shards com uma fila e uma thread cada; use run()/arun() do módulo."""
+
+    def __init__(self, shards, group_size=32, group_wait=0.0, max_pending=1000):
+        self.group_size = group_size
+        self.group_wait = group_wait
+        self.queues = [queue.Queue(maxsize=max_pending) for _ in range(shards)]
+        self.threads = [
+            threading.Thread(target=self._worker, args=(shard_queue,), name=f"conversation-writes-{index}", daemon=True)
+            for index, shard_queue in enumerate(self.queues)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, conversation_id, work):
+        """Enfileira work() no shard da conversa e devolve um Future com o resultado."""
+        future = Future()
+        # o contexto de quem chamou acompanha a escrita (ex.: métricas da requisição)
+        context = contextvars.copy_context()
+        self.queues[conversation_id.int % len(self.queues)].put((context, work, future))
+        return future
+
+    def stop(self):
+        """Processa o que já está na fila e encerra as threads."""
+        for shard_queue in self.queues:
+            shard_queue.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+
+    def _next_group(self, shard_queue):
+        first = shard_queue.get()
+        if first is _STOP:
+            return [], True
+        group = [first]
+        deadline = time.monotonic() + self.group_wait
+        while len(group) < self.group_size:
+            try:
+                remaining = deadline - time.monotonic()
+                item = shard_queue.get(timeout=remaining) if remaining > 0 else shard_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return group, True
+            group.append(item)
+        return group, False
+
+    def _worker(self, shard_queue):
+        stopping = False
+        try:
+            while not stopping:
+                group, stopping = self._next_group(shard_queue)
+                if group:
+                    close_old_connections()
+                    commit_group(group)
+        finally:
+            connections.close_all()
+
+
+def commit_group(group):
+    """Aplica as escritas (context, work, future) em uma transação, cada uma em um savepoint."""
+    outcomes = []
+    try:
+        with transaction.atomic():
+            for context, work, future in group:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with transaction.atomic():
+                        outcomes.append((future, context.run(work), None))
+                except Exception as error:
+                    outcomes.append((future, None, error))
+    except Exception as error:
+        # o commit falhou: nenhuma escrita do grupo foi gravada
+        for _, _, future in group:
+            if not future.done():
+                future.set_exception(error)
+        return
+
+    for future, result, error in outcomes:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def _write_queue():
+    """Fila do processo, criada na primeira escrita (None se desligada)."""
+    global _queue
+    shards = getattr(settings, "CONVERSATION_WRITE_SHARDS", 0)
+    if not shards:
+        return None
+    with _queue_lock:
+        if _queue is None:
+            _queue = WriteQueue(
+                shards,
+                group_size=getattr(settings, "CONVERSATION_WRITE_GROUP_SIZE", 32),
+                group_wait=getattr(settings, "CONVERSATION_WRITE_GROUP_WAIT_MS", 0) / 1000,
+                max_pending=getattr(settings, "CONVERSATION_WRITE_QUEUE_SIZE", 1000),
+            )
+            atexit.register(stop)
+        return _queue
+
+
+def stop():
+    """Esvazia e encerra a fila do processo (a próxima escrita cria outra)."""
+    global _queue
+    with _queue_lock:
+        if _queue is not None:
+            _queue.stop()
+            _queue = None
+            atexit.unregister(stop)
+
+
+def run(conversation_id, work):
+    """
+    Executa work() (sem argumentos) como escrita da conversa e devolve o
+    resultado depois do commit; exceções de work() são repassadas.
+    """
+    write_queue = _write_queue()
+    if write_queue is None:
+        with transaction.atomic():
+            return work()
+    return write_queue.submit(conversation_id, work).result()
+
+
+async def arun(conversation_id, work):
+    """Versão assíncrona de run()."""
+    write_queue = _write_queue()
+    if write_queue is None:
+        return await sync_to_async(run)(conversation_id, work)
+    future = await sync_to_async(write_queue.submit, thread_sensitive=False)(conversation_id, work)
+    return await asyncio.wrap_future(future)
@@ -0,0 +1,78 @@
+"""
+Log de eventos das conversas, só de inserts.
+
+Todo evento aceito (NEW_CONVERSATION, NEW_MESSAGE e CLOSE_CONVERSATION do
+webhook, avulso, em lote ou pelo inbox, e as conversas e mensagens criadas
+ou encerradas pela API) é gravado em LoggedEvent na mesma transação que altera as
+tabelas, na ordem em que foi aplicado. Reentregas e eventos recusados não entram. Cada linha
+guarda só o que a projeção precisa, sem o JSON cru: tipo em um inteiro, ids,
+timestamp e, para mensagens, direção e conteúdo.
+
+O log é a história completa a partir da sua criação: o comando
+replay_event_log reconstrói Conversation e Message (ou outra projeção, ver
+projections.py) lendo-o em blocos, com checkpoints. Por isso a API só
+altera uma conversa para encerrá-la e não edita nem remove mensagens;
+edições e remoções feitas pelo admin não são eventos e não entram no log.
+"""
+from collections import namedtuple
+
+from .models import LoggedEvent
+
+
+NEW_CONVERSATION = LoggedEvent.NEW_CONVERSATION
+NEW_MESSAGE = LoggedEvent.NEW_MESSAGE
+CLOSE_CONVERSATION = LoggedEvent.CLOSE_CONVERSATION
+
+# colunas lidas pelo replay, na ordem das tuplas de stream()
+COLUMNS = ("seq", "kind", "conversation_id", "timestamp", "message_id", "direction", "content")
+Entry = namedtuple("Entry", COLUMNS)
+
+
+def conversation_created(conversation_id, timestamp):
+    return LoggedEvent(kind=NEW_CONVERSATION, conversation_id=conversation_id, timestamp=timestamp)
+
+
+def message_created(message_id, conversation_id, direction, content, timestamp):
+    return LoggedEvent(
+        kind=NEW_MESSAGE,
+        conversation_id=conversation_id,
+        timestamp=timestamp,
+        message_id=message_id,
+        direction=direction,
+        content=content,
+    )
+
+
+def conversation_closed(conversation_id, timestamp):
+    return LoggedEvent(kind=CLOSE_CONVERSATION, conversation_id=conversation_id, timestamp=timestamp)
+
+
+def append(*events, using="default"):
+    """
+    Grava os eventos no log; chamar dentro da transação que os aplicou.
+    Retorna os eventos com o seq (a posição no log) preenchido.
+    """
+    return LoggedEvent.objects.using(using).bulk_create(events, batch_size=2000)
+
+
+def stream(after=0, batch_size=5000, until=None, using="default"):
+    """Gera listas de Entry com seq > after (até until), em ordem, batch_size por vez."""
+    position = after
+    while True:
+        rows = LoggedEvent.objects.using(using).filter(seq__gt=position)
+        if until is not None:
+            rows = rows.filter(seq__lte=until)
+        batch = [Entry(*row) for row in rows.order_by("seq").values_list(*COLUMNS)[:batch_size]]
+        if not batch:
+            return
+        yield batch
+        position = batch[-1].seq
+
+
+def last_position(using="default"):
+    return LoggedEvent.objects.using(using).order_by("-seq").values_list("seq", flat=True).first() or 0
+
+
+def history(conversation_id, using="default"):
+    """Eventos de uma conversa, em ordem (auditoria)."""
+    return LoggedEvent.objects.using(using).filter(conversation_id=conversation_id).order_by("seq")
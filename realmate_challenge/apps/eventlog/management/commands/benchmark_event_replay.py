@@ -0,0 +1,106 @@
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.apps.eventlog import log
+from realmate_challenge.apps.eventlog.projections import TablesProjection, replay
+from realmate_challenge.apps.message.models import Message
+from realmate_challenge.database import temporary_database
+from realmate_challenge.webhooks.messages.batch import process_batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o replay do log de eventos em um banco temporário: gera eventos pelo '
+        'webhook em lote (com mensagens fora de ordem e conversas fechadas), '
+        'reconstrói Conversation e Message do zero e confere que o resultado é '
+        'idêntico ao original'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversations', type=int, default=1000)
+        parser.add_argument('--messages', type=int, default=100_000)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Eventos por transação no replay.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        for name in ('conversations', 'messages', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} deve ser positivo.')
+
+        with temporary_database('benchmark_replay_'):
+            self.populate(options)
+            expected = self.snapshot()
+
+            projection = TablesProjection()
+            start = time.perf_counter()
+            events = sum(progress.events for progress in replay(projection, True, options['batch_size']))
+            elapsed = time.perf_counter() - start
+
+            self.stdout.write(
+                f'replay: {events} eventos em {elapsed:.2f}s ({events / elapsed:.0f} eventos/s, '
+                f'blocos de {options["batch_size"]})'
+            )
+            differences = self.compare(expected, self.snapshot())
+            if differences:
+                raise CommandError(f'O replay divergiu das tabelas originais: {differences}')
+            self.stdout.write(self.style.SUCCESS('Tabelas reconstruídas idênticas às originais.'))
+
+    def populate(self, options):
+        """Envia os eventos ao processamento em lote, que os grava no log."""
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        conversation_ids = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(options['conversations'])]
+        events = [
+            {"type": "NEW_CONVERSATION", "timestamp": now.isoformat(), "data": {"id": str(conv_id)}}
+            for conv_id in conversation_ids
+        ]
+        for index in range(options['messages']):
+            # parte das mensagens chega atrasada em relação às vizinhas
+            offset = index - rng.randrange(50) if rng.random() < 0.1 else index
+            events.append({
+                "type": "NEW_MESSAGE",
+                "timestamp": (now + timedelta(seconds=1, milliseconds=offset)).isoformat(),
+                "data": {
+                    "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                    "direction": rng.choice(("SENT", "RECEIVED", "RECEIVED")),
+                    "content": f"Mensagem de benchmark {index}",
+                    "conversation_id": str(rng.choice(conversation_ids)),
+                },
+            })
+        closing = now + timedelta(seconds=1, milliseconds=options['messages'])
+        events.extend(
+            {"type": "CLOSE_CONVERSATION", "timestamp": closing.isoformat(), "data": {"id": str(conv_id)}}
+            for conv_id in conversation_ids[::4]
+        )
+
+        start = time.perf_counter()
+        for offset in range(0, len(events), 1000):
+            process_batch(events[offset:offset + 1000])
+        self.stdout.write(
+            f'{log.last_position()} eventos gravados no log em {time.perf_counter() - start:.2f}s '
+            f'({Conversation.objects.count()} conversas, {Message.objects.count()} mensagens).'
+        )
+
+    def snapshot(self):
+        fields = [field.attname for field in Conversation._meta.concrete_fields]
+        return (
+            list(Conversation.objects.order_by('id').values_list(*fields)),
+            list(Message.objects.order_by('id').values_list('id', 'conversation_id', 'direction', 'content', 'timestamp')),
+        )
+
+    def compare(self, expected, actual):
+        differences = []
+        for label, before, after in zip(('conversas', 'mensagens'), expected, actual):
+            if len(before) != len(after):
+                differences.append(f'{label}: {len(before)} antes, {len(after)} depois')
+            else:
+                changed = sum(1 for old, new in zip(before, after) if old != new)
+                if changed:
+                    differences.append(f'{label}: {changed} linhas diferentes')
+        return '; '.join(differences)
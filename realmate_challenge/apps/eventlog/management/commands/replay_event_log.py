@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from realmate_challenge.apps.eventlog import log
+from realmate_challenge.apps.eventlog.projections import PROJECTIONS, checkpoint, replay
+
+
+class Command(BaseCommand):
+    help = (
+        'Aplica o log de eventos a uma projeção (padrão: as tabelas Conversation e '
+        'Message) a partir do último checkpoint, em blocos; com --from-scratch '
+        'apaga a projeção e a reconstrói do início do log (o único modo aceito '
+        'pelas tabelas, atualizadas ao vivo)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--projection', choices=sorted(PROJECTIONS), default='tables')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Eventos aplicados por transação.')
+        parser.add_argument('--until', type=int, help='Para na posição (seq) informada.')
+        parser.add_argument(
+            '--from-scratch', action='store_true',
+            help='Apaga a projeção (para "tables": conversas, mensagens, partições e arquivo) e zera o checkpoint.',
+        )
+        parser.add_argument('--no-input', action='store_true', help='Não pede confirmação para --from-scratch.')
+        parser.add_argument('--status', action='store_true', help='Só mostra o checkpoint e o fim do log.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size deve ser positivo.')
+
+        projection = PROJECTIONS[options['projection']]()
+        position, last = checkpoint(projection.name), log.last_position()
+        if options['status']:
+            self.stdout.write(f'{projection.name}: posição {position} de {last} ({last - position} eventos pendentes).')
+            return
+
+        if projection.live and not options['from_scratch']:
+            raise CommandError(
+                f'A projeção "{projection.name}" já é atualizada pelo webhook e pela API a cada '
+                'evento; um replay incremental aplicaria eventos de novo. Use --from-scratch.'
+            )
+        if options['from_scratch'] and not options['no_input']:
+            answer = input(f'Isto apaga a projeção "{projection.name}" e a refaz a partir do log. Continuar? [s/N] ')
+            if answer.strip().lower() not in ('s', 'sim', 'y', 'yes'):
+                raise CommandError('Cancelado.')
+
+        start = time.perf_counter()
+        events = skipped = 0
+        for progress in replay(projection, options['from_scratch'], options['batch_size'], options['until']):
+            events += progress.events
+            skipped += progress.skipped
+            position = progress.position
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  posição {position}: {events} eventos')
+
+        elapsed = time.perf_counter() - start
+        rate = events / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{events} eventos aplicados a "{projection.name}" em {elapsed:.2f}s ({rate:.0f} eventos/s); '
+            f'checkpoint na posição {position}.'
+        ))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f'{skipped} eventos ignorados (conversa desconhecida ou já existente na projeção).'
+            ))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplayCheckpoint',
+            fields=[
+                ('projection', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('position', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LoggedEvent',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'NEW_CONVERSATION'), (2, 'NEW_MESSAGE'), (3, 'CLOSE_CONVERSATION')])),
+                ('conversation_id', models.UUIDField()),
+                ('timestamp', models.DateTimeField()),
+                ('message_id', models.UUIDField(blank=True, null=True)),
+                ('direction', models.CharField(blank=True, default='', max_length=10)),
+                ('content', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['conversation_id', 'seq'], name='eventlog_conv_seq_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.utils import timezone
+from django.db import models
+
+
+class LoggedEvent(models.Model):
+    """
+    Evento aceito (webhook ou API), na ordem em que foi aplicado (ver
+    eventlog/log.py). Só recebe inserts: o seq é a posição no log.
+    """
+    NEW_CONVERSATION = 1
+    NEW_MESSAGE = 2
+    CLOSE_CONVERSATION = 3
+    KIND_CHOICES = (
+        (NEW_CONVERSATION, 'NEW_CONVERSATION'),
+        (NEW_MESSAGE, 'NEW_MESSAGE'),
+        (CLOSE_CONVERSATION, 'CLOSE_CONVERSATION'),
+    )
+
+    seq = models.BigAutoField(primary_key=True)
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    conversation_id = models.UUIDField()
+    timestamp = models.DateTimeField()
+    # só em NEW_MESSAGE
+    message_id = models.UUIDField(null=True, blank=True)
+    direction = models.CharField(max_length=10, blank=True, default='')
+    content = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        return f"#{self.seq} {self.get_kind_display()} {self.conversation_id}"
+
+    class Meta:
+        indexes = [
+            # histórico de uma conversa (auditoria)
+            models.Index(fields=['conversation_id', 'seq'], name='eventlog_conv_seq_idx'),
+        ]
+
+
+class ReplayCheckpoint(models.Model):
+    """Última posição do log aplicada a uma projeção (ver eventlog/projections.py)."""
+    projection = models.CharField(max_length=50, primary_key=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.projection} @ {self.position}"
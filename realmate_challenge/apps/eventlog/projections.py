@@ -0,0 +1,188 @@
+"""
+Projeções reconstruídas a partir do log de eventos (ver log.py).
+
+Uma projeção tem um nome (a chave do checkpoint), reset() para começar do
+zero e apply(entries) para aplicar um bloco de Entry em ordem. replay()
+lê o log a partir do checkpoint da projeção em blocos e aplica cada bloco
+na mesma transação que avança o checkpoint: se o replay for interrompido,
+a próxima execução continua do último bloco confirmado, sem aplicar nada
+duas vezes.
+
+A exceção é uma projeção live, como a das tabelas: os writers do webhook e
+da API já a atualizam a cada evento, sem mover o checkpoint, então um
+replay incremental aplicaria de novo eventos já presentes. Ela só pode ser
+refeita do zero (from_scratch); um replay do zero interrompido é refeito
+do zero também.
+
+Para uma nova projeção, basta uma subclasse de Projection registrada em
+PROJECTIONS.
+"""
+from collections import defaultdict, namedtuple
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from realmate_challenge.apps.archive.models import ArchivedConversation
+from realmate_challenge.apps.conversation.cache import invalidate_conversations
+from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.apps.conversation.stats import STATS_FIELDS, apply_messages
+from realmate_challenge.apps.message.models import Message
+from realmate_challenge.apps.message.partitions import clear_partitions, sealed_ids
+
+from . import log
+from .models import ReplayCheckpoint
+
+
+Progress = namedtuple("Progress", ["position", "events", "skipped"])
+
+
+class Projection:
+    name = None
+    # atualizada também pelos writers ao vivo: só aceita replay do zero
+    live = False
+
+    def __init__(self, using="default"):
+        self.using = using
+
+    def reset(self):
+        """Apaga o estado da projeção (o checkpoint é zerado por replay())."""
+        raise NotImplementedError
+
+    def apply(self, entries):
+        """Aplica um bloco de Entry, em ordem. Retorna quantos eventos foram ignorados."""
+        raise NotImplementedError
+
+
+class TablesProjection(Projection):
+    """
+    Conversation e Message, com os contadores e o snapshot da última mensagem
+    calculados como no webhook em lote (apply_messages). O reset também
+    apaga as partições seladas e o arquivo: tudo volta às tabelas quentes.
+
+    São as tabelas servidas pela aplicação: durante o replay o tráfego
+    continua gravando nelas, então conversas e mensagens que já existirem
+    são ignoradas (foram aplicadas pelo writer, com os contadores).
+    """
+    name = "tables"
+    live = True
+
+    def reset(self):
+        with transaction.atomic(using=self.using):
+            Message.objects.using(self.using).all().delete()
+            Conversation.objects.using(self.using).all().delete()
+            ArchivedConversation.objects.using(self.using).all().delete()
+        clear_partitions(self.using)
+
+    def apply(self, entries):
+        conversations = Conversation.objects.using(self.using).order_by().in_bulk(
+            {entry.conversation_id for entry in entries}
+        )
+        created = {}
+        closed = {}
+        messages = defaultdict(list)
+        skipped = 0
+        message_ids = {entry.message_id for entry in entries if entry.message_id}
+        # já seladas, ou gravadas pelo writer ao vivo depois do reset
+        existing = sealed_ids(message_ids, self.using) | set(
+            Message.objects.using(self.using).filter(id__in=message_ids).values_list("id", flat=True)
+        )
+
+        for entry in entries:
+            conversation = conversations.get(entry.conversation_id)
+            if entry.kind == log.NEW_CONVERSATION:
+                if conversation is None:
+                    conversation = Conversation(id=entry.conversation_id, status="OPEN", timestamp=entry.timestamp)
+                    conversations[entry.conversation_id] = created[entry.conversation_id] = conversation
+                else:
+                    skipped += 1
+            elif conversation is None:
+                # conversa criada antes do log existir
+                skipped += 1
+            elif entry.kind == log.NEW_MESSAGE:
+                if entry.message_id in existing:
+                    skipped += 1
+                    continue
+                messages[entry.conversation_id].append(Message(
+                    id=entry.message_id,
+                    conversation_id=entry.conversation_id,
+                    direction=entry.direction,
+                    content=entry.content,
+                    timestamp=entry.timestamp,
+                ))
+            else:
+                conversation.status = "CLOSED"
+                closed[entry.conversation_id] = conversation
+
+        # as conversas foram lidas nesta transação, e no SQLite nenhum outro
+        # writer confirma até ela terminar: os valores carregados continuam os
+        # atuais e os contadores saem prontos, sem as expressões do UPDATE
+        for conversation_id, conversation_messages in messages.items():
+            apply_messages(conversations[conversation_id], conversation_messages, created=True)
+
+        Conversation.objects.using(self.using).bulk_create(created.values())
+        Message.objects.using(self.using).bulk_create(
+            [message for conversation_messages in messages.values() for message in conversation_messages],
+            batch_size=2000,
+        )
+        changed = (messages.keys() | closed.keys()) - created.keys()
+        self._update([conversations[conversation_id] for conversation_id in changed], ["status", *STATS_FIELDS])
+        invalidate_conversations({entry.conversation_id for entry in entries})
+        return skipped
+
+    def _update(self, conversations, fields):
+        """
+        UPDATE por id com executemany: um só comando preparado, em vez do CASE
+        por linha e por campo que o bulk_update monta (caro de gerar e de
+        executar com milhares de conversas por bloco).
+        """
+        if not conversations:
+            return
+        connection = connections[self.using]
+        quote = connection.ops.quote_name
+        meta = Conversation._meta
+        columns = [meta.get_field(field) for field in fields]
+        sql = "UPDATE {} SET {} WHERE {} = %s".format(
+            quote(meta.db_table),
+            ", ".join(f"{quote(column.column)} = %s" for column in columns),
+            quote(meta.pk.column),
+        )
+        params = [
+            [column.get_db_prep_save(getattr(conversation, column.attname), connection) for column in columns]
+            + [meta.pk.get_db_prep_value(conversation.pk, connection)]
+            for conversation in conversations
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+
+PROJECTIONS = {projection.name: projection for projection in [TablesProjection]}
+
+
+def checkpoint(name, using="default"):
+    return (
+        ReplayCheckpoint.objects.using(using).filter(projection=name).values_list("position", flat=True).first() or 0
+    )
+
+
+def replay(projection, from_scratch=False, batch_size=5000, until=None):
+    """
+    Aplica à projeção os eventos posteriores ao seu checkpoint (até until),
+    um bloco por transação. Gera um Progress por bloco.
+    """
+    using = projection.using
+    if projection.live and not from_scratch:
+        raise ValueError(
+            f'A projeção "{projection.name}" é atualizada ao vivo: só pode ser refeita do zero (from_scratch).'
+        )
+    if from_scratch:
+        projection.reset()
+        ReplayCheckpoint.objects.using(using).filter(projection=projection.name).delete()
+
+    for entries in log.stream(checkpoint(projection.name, using), batch_size, until, using):
+        with transaction.atomic(using=using):
+            skipped = projection.apply(entries)
+            ReplayCheckpoint.objects.using(using).update_or_create(
+                projection=projection.name,
+                defaults={"position": entries[-1].seq, "updated_at": timezone.now()},
+            )
+        yield Progress(entries[-1].seq, len(entries), skipped)
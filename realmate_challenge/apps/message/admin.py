@@ -1,11 +1,19 @@
 from django.contrib import admin
 
 from realmate_challenge.apps.message.models import Message
+from realmate_challenge.paginators import EstimatedCountPaginator
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ('id', 'conversation', 'direction', 'timestamp')
+    # a conversa de cada linha vem no mesmo SELECT da página
+    list_select_related = ('conversation',)
     search_fields = ('content',)
     list_filter = ('direction', 'timestamp')
+    # navegação por data sobre o índice (timestamp, id)
+    date_hierarchy = 'timestamp'
     ordering = ('-timestamp',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ('conversation',)
     readonly_fields = ('id', 'conversation', 'direction', 'content', 'timestamp')
@@ -0,0 +1,138 @@
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.apps.message.models import Message
+from realmate_challenge.apps.message.search import build_match_query, optimize_index, search_messages
+from realmate_challenge.benchmarks import percentiles
+from realmate_challenge.database import temporary_database
+
+
+WORDS = (
+    "olá bom dia boa tarde noite obrigado obrigada por favor pedido entrega "
+    "pagamento boleto cartão pix reembolso troca produto tamanho cor prazo "
+    "endereço frete atraso cancelamento nota fiscal suporte atendimento "
+    "problema resolvido aguardando confirmação código rastreio transportadora "
+    "desconto cupom promoção estoque disponível garantia defeito assistência"
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a busca textual (FTS5) contra icontains em um banco temporário '
+        'com muitas mensagens (padrão: 1 milhão)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1_000_000)
+        parser.add_argument('--conversations', type=int, default=1000)
+        parser.add_argument('--queries', type=int, default=50, help='Repetições de cada consulta.')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--skip-icontains', action='store_true',
+            help='Não mede o icontains (lento em tabelas grandes).',
+        )
+
+    def handle(self, *args, **options):
+        for name in ('messages', 'conversations', 'queries', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} deve ser positivo.')
+
+        with temporary_database('benchmark_search_'):
+            conversation_ids, protocol = self.populate(options)
+            self.run_queries(options, conversation_ids, protocol)
+
+    def populate(self, options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        conversation_ids = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(options['conversations'])]
+        Conversation.objects.bulk_create(
+            Conversation(id=conv_id, status='CLOSED' if index % 4 == 0 else 'OPEN', timestamp=now)
+            for index, conv_id in enumerate(conversation_ids)
+        )
+
+        # distribuição de Zipf aproximada: poucas palavras muito comuns, muitas raras
+        weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+        total = options['messages']
+        batch_size = options['batch_size']
+
+        def content():
+            words = rng.choices(WORDS, weights, k=rng.randint(3, 20))
+            # 10% das mensagens citam um protocolo: termos realmente raros
+            if rng.random() < 0.1:
+                words += ['protocolo', str(rng.randrange(10**6, 10**7))]
+            return ' '.join(words)
+
+        protocol = None
+        start = time.perf_counter()
+        for offset in range(0, total, batch_size):
+            messages = [
+                Message(
+                    id=uuid.UUID(int=rng.getrandbits(128)),
+                    conversation_id=conversation_ids[index % len(conversation_ids)],
+                    direction='RECEIVED' if rng.random() < 0.5 else 'SENT',
+                    content=content(),
+                    timestamp=now - timedelta(seconds=total - index),
+                )
+                for index in range(offset, min(offset + batch_size, total))
+            ]
+            Message.objects.bulk_create(messages)
+            if protocol is None:
+                protocol = next((m.content.split()[-1] for m in messages if 'protocolo' in m.content), None)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{total} mensagens inseridas (com índice) em {elapsed:.1f}s '
+            f'({total / elapsed:.0f} linhas/s)'
+        )
+
+        start = time.perf_counter()
+        optimize_index()
+        self.stdout.write(f'optimize do índice: {time.perf_counter() - start:.1f}s')
+        return conversation_ids, protocol or 'protocolo'
+
+    def run_queries(self, options, conversation_ids, protocol):
+        now = timezone.now()
+        cases = [
+            ('termo comum', 'pedido', {}),
+            ('termo raro', protocol, {}),
+            ('dois termos', 'entrega atraso', {}),
+            ('prefixo', 'rastr*', {}),
+            ('por conversa', 'pedido', {'conversation_id': conversation_ids[0]}),
+            ('status + direção', 'reembolso', {'status': 'CLOSED', 'direction': 'RECEIVED'}),
+            ('última hora', 'cupom', {'since': now - timedelta(hours=1)}),
+        ]
+
+        for label, text, filters in cases:
+            match = build_match_query(text)
+            latencies = []
+            for _ in range(options['queries']):
+                start = time.perf_counter()
+                hits = search_messages(match, limit=51, **filters)
+                latencies.append(time.perf_counter() - start)
+            p50, p99, worst = percentiles(latencies)
+            self.stdout.write(
+                f'   fts5 | {label:<17} | {len(hits):>3} hits | '
+                f'p50 {p50:.2f} ms | p99 {p99:.2f} ms | máx {worst:.2f} ms'
+            )
+
+        if options['skip_icontains']:
+            return
+
+        # o icontains percorre a tabela inteira; poucas repetições bastam
+        for label, text in (('termo comum', 'pedido'), ('termo raro', protocol)):
+            latencies = []
+            for _ in range(min(options['queries'], 5)):
+                start = time.perf_counter()
+                hits = list(Message.objects.filter(content__icontains=text).order_by('-timestamp')[:51])
+                latencies.append(time.perf_counter() - start)
+            p50, p99, worst = percentiles(latencies)
+            self.stdout.write(
+                f'icontains | {label:<17} | {len(hits):>3} hits | '
+                f'p50 {p50:.2f} ms | p99 {p99:.2f} ms | máx {worst:.2f} ms'
+            )
@@ -0,0 +1,93 @@
+import random
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from rest_framework.renderers import JSONRenderer
+
+from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.apps.message.models import Message
+from realmate_challenge.apps.message.serializers import MESSAGE_COLUMNS, MessageSerializer, message_rows
+from realmate_challenge.benchmarks import best_of
+from realmate_challenge.database import temporary_database
+from realmate_challenge.renderers import FastJSONRenderer
+
+
+CONTENTS = [
+    'Olá! Gostaria de saber sobre os planos da academia.',
+    'O VIP inclui quantas sessões de personal? São 8 sessões mensais.',
+    'Funcionamos de segunda a sexta das 5h às 23h.',
+    'Obrigado! 😀',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara, em um banco temporário, a listagem de mensagens pelo '
+        'MessageSerializer (modelos + campos do DRF + JSONRenderer) com o caminho '
+        'rápido (values_list + message_rows + FastJSONRenderer), por etapa, '
+        'e confere que o JSON gerado é idêntico'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=5, help='Repetições de cada medição (vale a melhor).')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['messages'] < 1 or options['repeat'] < 1:
+            raise CommandError('--messages e --repeat devem ser positivos.')
+
+        with temporary_database('benchmark_serialization_'):
+            self.populate(options)
+            self.compare(options)
+
+    def populate(self, options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        conversations = [Conversation(id=uuid.UUID(int=rng.getrandbits(128)), status='OPEN') for _ in range(50)]
+        Conversation.objects.bulk_create(conversations)
+        total = options['messages']
+        Message.objects.bulk_create(
+            (
+                Message(
+                    id=uuid.UUID(int=rng.getrandbits(128)),
+                    conversation=conversations[index % len(conversations)],
+                    direction='RECEIVED' if index % 2 == 0 else 'SENT',
+                    content=rng.choice(CONTENTS),
+                    timestamp=now - timedelta(seconds=total - index, microseconds=rng.randrange(10**6)),
+                )
+                for index in range(total)
+            ),
+            batch_size=5000,
+        )
+
+    def compare(self, options):
+        repeat = options['repeat']
+        queryset = Message.objects.all()
+
+        model_fetch, instances = best_of(repeat, lambda: list(queryset.all()))
+        model_serialize, data = best_of(repeat, lambda: MessageSerializer(instances, many=True).data)
+        model_render, expected = best_of(repeat, lambda: JSONRenderer().render(data))
+
+        fast_fetch, rows = best_of(repeat, lambda: list(queryset.values_list(*MESSAGE_COLUMNS)))
+        fast_serialize, fast_data = best_of(repeat, lambda: message_rows(rows))
+        # um renderer por execução, como o DRF faz a cada requisição
+        fast_render, output = best_of(repeat, lambda: FastJSONRenderer().render(fast_data))
+
+        if output != expected:
+            raise CommandError('O caminho rápido gerou um JSON diferente do MessageSerializer.')
+
+        scale = 10_000 / options['messages'] * 1000
+        self.stdout.write(f'{options["messages"]} mensagens, JSON idêntico ({len(output)} bytes); ms por 10 mil mensagens:')
+        self.stdout.write(f'{"etapa":<12} | {"serializer":>10} | {"rápido":>8} | ganho')
+        stages = [
+            ('leitura', model_fetch, fast_fetch),
+            ('serialização', model_serialize, fast_serialize),
+            ('renderização', model_render, fast_render),
+            ('total', model_fetch + model_serialize + model_render, fast_fetch + fast_serialize + fast_render),
+        ]
+        for label, model, fast in stages:
+            self.stdout.write(f'{label:<12} | {model * scale:>10.1f} | {fast * scale:>8.1f} | {model / fast:.1f}x')
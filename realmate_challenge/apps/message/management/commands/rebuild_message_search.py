@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from realmate_challenge.apps.message.search import optimize_index, rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstrói o índice de busca (FTS5) das mensagens a partir da tabela '
+        'de mensagens (ex.: depois de um VACUUM ou de uma carga sem triggers)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--optimize-only', action='store_true',
+            help='Só funde os segmentos do índice, sem reconstruí-lo.',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if not options['optimize_only']:
+            rebuild_index(options['database'])
+        optimize_index(options['database'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Índice de busca atualizado em {elapsed:.2f}s.'))
@@ -0,0 +1,65 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from realmate_challenge.apps.message.partitions import index_bucket, seal_month, sealable_buckets, sealed_totals
+
+
+class Command(BaseCommand):
+    help = (
+        'Sela os meses encerrados: move as mensagens de cada mês anterior aos '
+        '--keep-months mais recentes para um arquivo SQLite por mês '
+        '(MESSAGE_PARTITION_DIR), deixando na tabela quente só a atividade recente'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months', type=int, default=settings.MESSAGE_PARTITION_KEEP_MONTHS,
+            help='Meses (incluindo o atual) que ficam na tabela quente.',
+        )
+        parser.add_argument('--month', action='append', help='Sela só este mês (AAAA-MM); pode repetir.')
+        parser.add_argument('--dry-run', action='store_true', help='Só lista os meses que seriam selados.')
+        parser.add_argument('--list', action='store_true', help='Lista as partições já seladas.')
+        parser.add_argument(
+            '--reindex', action='store_true',
+            help='Indexa no banco quente (ids e busca) os meses selados antes do índice existir.',
+        )
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for bucket, (messages, first_at, last_at) in sealed_totals().items():
+                self.stdout.write(f'{bucket}: {messages} mensagens ({first_at:%Y-%m-%d} a {last_at:%Y-%m-%d})')
+            return
+
+        if options['reindex']:
+            for bucket in sealed_totals():
+                added = index_bucket(bucket)
+                self.stdout.write(self.style.SUCCESS(f'{bucket}: {added} mensagens indexadas.'))
+            return
+
+        if options['keep_months'] < 1:
+            raise CommandError('--keep-months deve ser pelo menos 1 (o mês atual nunca é selado).')
+        buckets = sealable_buckets(options['keep_months'])
+        if options['month']:
+            invalid = set(options['month']) - set(buckets)
+            if invalid:
+                raise CommandError(
+                    f'Sem mensagens seláveis em: {", ".join(sorted(invalid))} '
+                    f'(seláveis: {", ".join(buckets) or "nenhum"}).'
+                )
+            buckets = sorted(options['month'])
+
+        if options['dry_run'] or not buckets:
+            self.stdout.write(f'Meses a selar: {", ".join(buckets) or "nenhum"}.')
+            return
+
+        for bucket in buckets:
+            start = time.perf_counter()
+            totals = seal_month(bucket)
+            size = os.path.getsize(totals.path) / 1024 if os.path.exists(totals.path) else 0
+            self.stdout.write(self.style.SUCCESS(
+                f'{bucket}: {totals.messages} mensagens de {totals.conversations} conversas seladas em '
+                f'{time.perf_counter() - start:.2f}s ({totals.path}, {size:.0f} KiB).'
+            ))
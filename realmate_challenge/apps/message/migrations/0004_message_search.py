@@ -0,0 +1,61 @@
+from django.db import migrations
+
+
+# Índice FTS5 com conteúdo externo (a própria tabela de mensagens) e os
+# triggers que o mantêm em sincronia; ver message/search.py
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE message_search USING fts5(
+        content,
+        content='message_message',
+        content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER message_search_insert AFTER INSERT ON message_message BEGIN
+        INSERT INTO message_search(rowid, content) VALUES (new.rowid, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER message_search_delete AFTER DELETE ON message_message BEGIN
+        INSERT INTO message_search(message_search, rowid, content) VALUES ('delete', old.rowid, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER message_search_update AFTER UPDATE OF content ON message_message BEGIN
+        INSERT INTO message_search(message_search, rowid, content) VALUES ('delete', old.rowid, old.content);
+        INSERT INTO message_search(rowid, content) VALUES (new.rowid, new.content);
+    END
+    """,
+    # indexa as mensagens que já existem
+    "INSERT INTO message_search(message_search) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS message_search_update",
+    "DROP TRIGGER IF EXISTS message_search_delete",
+    "DROP TRIGGER IF EXISTS message_search_insert",
+    "DROP TABLE IF EXISTS message_search",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # FTS5 só existe no SQLite
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('message', '0003_alter_message_conversation_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
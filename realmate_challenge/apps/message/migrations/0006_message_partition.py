@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('message', '0005_message_timestamp_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessagePartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('conversation_id', models.UUIDField()),
+                ('bucket', models.CharField(max_length=7)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('first_at', models.DateTimeField()),
+                ('last_at', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('conversation_id', 'bucket'), name='message_partition_conv_bucket_uniq')],
+            },
+        ),
+    ]
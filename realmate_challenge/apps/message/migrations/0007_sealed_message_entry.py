@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+# Índice FTS5 sem conteúdo (content='') das mensagens seladas: guarda só os
+# tokens, com rowid = SealedMessageEntry.id; o texto fica nos arquivos dos
+# meses (ver message/partitions.py e message/search.py)
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE message_search_sealed USING fts5(
+        content,
+        content='',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+]
+
+DROP_SQL = [
+    "DROP TABLE IF EXISTS message_search_sealed",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # FTS5 só existe no SQLite
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('message', '0006_message_partition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SealedMessageEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('message_id', models.UUIDField(unique=True)),
+                ('conversation_id', models.UUIDField()),
+                ('direction', models.CharField(choices=[('SENT', 'Sent'), ('RECEIVED', 'Received')], max_length=10)),
+                ('timestamp', models.DateTimeField()),
+                ('bucket', models.CharField(max_length=7)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['conversation_id', 'timestamp', 'message_id'], name='sealed_conv_ts_id_idx'), models.Index(fields=['timestamp', 'message_id'], name='sealed_timestamp_id_idx')],
+            },
+        ),
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
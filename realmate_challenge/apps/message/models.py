@@ -14,7 +14,8 @@ class Message(models.Model):
     )
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    conversation = models.ForeignKey(Conversation, related_name='messages', on_delete=models.PROTECT)
+    # o índice composto (conversation, timestamp, id) já cobre buscas por conversa
+    conversation = models.ForeignKey(Conversation, related_name='messages', on_delete=models.PROTECT, db_index=False)
     direction = models.CharField(max_length=10, choices=DIRECTION_CHOICES)
     content = models.TextField()
     timestamp = models.DateTimeField(default=timezone.now)
@@ -23,4 +24,65 @@ class Message(models.Model):
         return f"{self.direction} - {self.content[:30]}"
     
     class Meta:
-        ordering = ['timestamp']
\ No newline at end of file
+        ordering = ['timestamp']
+        indexes = [
+            # mensagens de uma conversa em ordem cronológica e janelas por cursor (timestamp, id)
+            models.Index(fields=['conversation', 'timestamp', 'id'], name='message_conv_ts_id_idx'),
+            # listagem geral de mensagens (ordering padrão) e exportação por keyset (timestamp, id)
+            models.Index(fields=['timestamp', 'id'], name='message_timestamp_id_idx'),
+        ]
+
+class MessagePartition(models.Model):
+    """
+    Mensagens de uma conversa seladas em uma partição mensal (ver
+    message/partitions.py): quantas são e o intervalo de tempo delas, para
+    que as leituras abram só os meses em que a conversa tem mensagens.
+    """
+    # sem ForeignKey: a conversa pode ser arquivada (ver apps/archive)
+    conversation_id = models.UUIDField()
+    # mês da partição, "AAAA-MM" (UTC)
+    bucket = models.CharField(max_length=7)
+    message_count = models.PositiveIntegerField(default=0)
+    first_at = models.DateTimeField()
+    last_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.conversation_id} @ {self.bucket} ({self.message_count})"
+
+    class Meta:
+        constraints = [
+            # também serve de índice para as partições de uma conversa
+            models.UniqueConstraint(fields=['conversation_id', 'bucket'], name='message_partition_conv_bucket_uniq'),
+        ]
+
+
+class SealedMessageEntry(models.Model):
+    """
+    Índice enxuto, na tabela quente, de uma mensagem selada (ver
+    message/partitions.py): os metadados sem o conteúdo, que fica no arquivo
+    do mês. Barra a reinserção de ids selados, resolve a leitura por id e
+    permite às listagens, à exportação e à retomada do WebSocket juntar as
+    mensagens seladas às quentes. O id é o rowid do índice de busca
+    message_search_sealed.
+    """
+    # AUTOINCREMENT no SQLite: ids apagados não são reaproveitados, então um
+    # token que sobrou no índice de busca nunca aponta para outra mensagem
+    id = models.BigAutoField(primary_key=True)
+    message_id = models.UUIDField(unique=True)
+    # sem ForeignKey: a conversa pode ser arquivada (ver apps/archive)
+    conversation_id = models.UUIDField()
+    direction = models.CharField(max_length=10, choices=Message.DIRECTION_CHOICES)
+    timestamp = models.DateTimeField()
+    # mês da partição, "AAAA-MM" (UTC)
+    bucket = models.CharField(max_length=7)
+
+    def __str__(self):
+        return f"{self.message_id} @ {self.bucket}"
+
+    class Meta:
+        indexes = [
+            # retomada do WebSocket: mensagens da conversa depois de um cursor
+            models.Index(fields=['conversation_id', 'timestamp', 'message_id'], name='sealed_conv_ts_id_idx'),
+            # listagem geral e exportação por keyset (timestamp, id)
+            models.Index(fields=['timestamp', 'message_id'], name='sealed_timestamp_id_idx'),
+        ]
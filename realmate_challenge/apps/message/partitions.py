@@ -0,0 +1,494 @@
+"""
+Partições mensais das mensagens antigas.
+
+A tabela message_message é a partição corrente: todas as escritas (webhook,
+lote, MessageViewSet) continuam indo para ela. seal_month() copia as
+mensagens de um mês já encerrado para um arquivo SQLite próprio
+(MESSAGE_PARTITION_DIR/messages_AAAA_MM.sqlite3) e as apaga da tabela
+quente, na mesma transação. Os arquivos selados não recebem mais escritas,
+então o VACUUM, os índices e o custo de escrita da tabela quente acompanham
+só a atividade recente, e não o histórico inteiro.
+
+MessagePartition registra, por conversa e mês, quantas mensagens foram
+seladas e o intervalo de tempo delas. As leituras de uma conversa consultam
+só os meses em que ela tem mensagens (com cursor, só os que cruzam o
+intervalo pedido) e juntam o resultado à tabela quente. Mensagens que
+chegam atrasadas para um mês já selado ficam na tabela quente até a
+próxima selagem daquele mês.
+
+Cada mensagem selada deixa na tabela quente uma SealedMessageEntry (id,
+conversa, direção, instante e mês, sem o conteúdo) e os seus tokens no
+índice FTS5 sem conteúdo message_search_sealed. Com elas:
+
+- os webhooks e o replay recusam um id já selado como recusam um id
+  repetido (ver sealed_ids);
+- o detalhe de uma mensagem, a listagem geral, a exportação e a retomada do
+  WebSocket juntam as seladas às quentes, lendo o conteúdo só dos meses e
+  ids necessários (ver sealed_rows);
+- a busca textual ordena quentes e seladas na mesma consulta e lê o texto e
+  o trecho destacado das seladas no índice FTS5 do próprio arquivo do mês.
+
+Partições seladas antes da existência do índice entram nele com
+`seal_message_partitions --reindex`.
+"""
+import datetime
+import heapq
+import os
+import sqlite3
+import uuid
+from collections import namedtuple
+from contextlib import closing
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max, Min, Sum
+from django.utils.dateparse import parse_datetime
+
+from .models import Message, MessagePartition, SealedMessageEntry
+from .search import SEALED_SEARCH_TABLE
+from .serializers import MESSAGE_COLUMNS
+
+
+# mesma ordem das colunas do caminho rápido de leitura (ver message/serializers.py)
+SealedMessage = namedtuple("SealedMessage", MESSAGE_COLUMNS)
+
+SealTotals = namedtuple("SealTotals", ["bucket", "messages", "conversations", "path"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS message (
+    id TEXT PRIMARY KEY,
+    conversation_id TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS message_conv_ts_id_idx ON message (conversation_id, timestamp, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5(
+    content,
+    content='message',
+    content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+# linhas copiadas da tabela quente (e ids apagados) por vez
+SEAL_CHUNK_SIZE = 500
+
+
+def bucket_for(timestamp):
+    """Mês (UTC) da partição de um instante, "AAAA-MM"."""
+    return timestamp.astimezone(datetime.timezone.utc).strftime("%Y-%m")
+
+
+def bucket_range(bucket):
+    """Início (inclusivo) e fim (exclusivo) do mês, em UTC."""
+    year, month = map(int, bucket.split("-"))
+    start = datetime.datetime(year, month, 1, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime(year + month // 12, month % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+    return start, end
+
+
+def partition_path(bucket):
+    return os.path.join(settings.MESSAGE_PARTITION_DIR, f"messages_{bucket.replace('-', '_')}.sqlite3")
+
+
+def _connect(bucket):
+    """Conexão somente leitura com o arquivo selado do mês."""
+    return closing(sqlite3.connect(f"file:{partition_path(bucket)}?mode=ro", uri=True))
+
+
+def _to_message(row):
+    pk, direction, content, timestamp, conversation_id = row
+    value = parse_datetime(timestamp)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return SealedMessage(uuid.UUID(pk), direction, content, value, uuid.UUID(conversation_id))
+
+
+def _read(bucket, conversation_id, cursor=None, forward=True, limit=None):
+    """Mensagens da conversa no arquivo do mês, após (ou antes de) cursor, na ordem pedida."""
+    ops = connections["default"].ops
+    sql = "SELECT id, direction, content, timestamp, conversation_id FROM message WHERE conversation_id = ?"
+    params = [conversation_id.hex]
+    if cursor is not None:
+        timestamp, pk = cursor
+        sql += f" AND (timestamp, id) {'>' if forward else '<'} (?, ?)"
+        params += [ops.adapt_datetimefield_value(timestamp), pk.hex]
+    order = "ASC" if forward else "DESC"
+    sql += f" ORDER BY timestamp {order}, id {order}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    with _connect(bucket) as partition:
+        return [_to_message(row) for row in partition.execute(sql, params)]
+
+
+def _partitions(conversation_id, using="default"):
+    return MessagePartition.objects.using(using).filter(conversation_id=conversation_id)
+
+
+def sealed_messages(conversation_id, using="default"):
+    """Todas as mensagens seladas da conversa, em ordem cronológica."""
+    messages = []
+    for bucket in _partitions(conversation_id, using).order_by("bucket").values_list("bucket", flat=True):
+        messages.extend(_read(bucket, conversation_id))
+    return messages
+
+
+def sealed_window(conversation_id, window, using="default"):
+    """
+    Mensagens seladas da conversa para uma MessageWindowPagination, com o
+    mesmo cursor, ordem e limite de window.get_queryset: abre só os meses
+    que cruzam o cursor e para assim que a janela estiver completa.
+    """
+    limit = window.limit + 1
+    partitions = _partitions(conversation_id, using)
+    if window.after:
+        forward, cursor = True, window.after
+        partitions = partitions.filter(last_at__gte=cursor[0]).order_by("bucket")
+    else:
+        forward, cursor = False, window.before
+        if cursor:
+            partitions = partitions.filter(first_at__lte=cursor[0])
+        partitions = partitions.order_by("-bucket")
+
+    messages = []
+    for bucket in partitions.values_list("bucket", flat=True):
+        messages.extend(_read(bucket, conversation_id, cursor, forward, limit - len(messages)))
+        if len(messages) >= limit:
+            break
+    return messages
+
+
+def sealable_buckets(keep_months=1, now=None, using="default"):
+    """Meses com mensagens na tabela quente anteriores aos keep_months mais recentes."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    boundary = bucket_range(bucket_for(now))[0]
+    for _ in range(keep_months - 1):
+        boundary = bucket_range(bucket_for(boundary - datetime.timedelta(days=1)))[0]
+
+    buckets = []
+    oldest = Message.objects.using(using).filter(timestamp__lt=boundary).aggregate(oldest=Min("timestamp"))["oldest"]
+    while oldest is not None:
+        bucket = bucket_for(oldest)
+        buckets.append(bucket)
+        oldest = (
+            Message.objects.using(using)
+            .filter(timestamp__gte=bucket_range(bucket)[1], timestamp__lt=boundary)
+            .aggregate(oldest=Min("timestamp"))["oldest"]
+        )
+    return buckets
+
+
+def seal_month(bucket, using="default"):
+    """
+    Move as mensagens do mês da tabela quente para o arquivo selado (criado
+    ou completado). O arquivo novo é escrito ao lado e trocado com
+    os.replace; as linhas só saem da tabela quente se a troca der certo, e
+    saem pelos ids copiados, então nada que chegue no meio se perde.
+    """
+    start, end = bucket_range(bucket)
+    path = partition_path(bucket)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + ".tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+
+    rows = (
+        Message.objects.using(using)
+        .filter(timestamp__gte=start, timestamp__lt=end)
+        .order_by("timestamp", "id")
+        .values_list("id", "conversation_id", "direction", "content", "timestamp")
+    )
+    ops = connections[using].ops
+    with transaction.atomic(using=using):
+        copied, stats = [], {}
+        entries = []
+        with closing(sqlite3.connect(temporary)) as partition:
+            if os.path.exists(path):
+                with closing(sqlite3.connect(path)) as current:
+                    current.backup(partition)
+            partition.executescript(SCHEMA)
+            batch = []
+            for pk, conversation_id, direction, content, timestamp in rows.iterator(chunk_size=SEAL_CHUNK_SIZE):
+                copied.append(pk)
+                entries.append(SealedMessageEntry(
+                    message_id=pk, conversation_id=conversation_id, direction=direction,
+                    timestamp=timestamp, bucket=bucket,
+                ))
+                batch.append((pk.hex, conversation_id.hex, direction, content, ops.adapt_datetimefield_value(timestamp)))
+                count, first_at, last_at = stats.get(conversation_id, (0, timestamp, timestamp))
+                stats[conversation_id] = (count + 1, min(first_at, timestamp), max(last_at, timestamp))
+                if len(batch) >= SEAL_CHUNK_SIZE:
+                    partition.executemany("INSERT OR IGNORE INTO message VALUES (?, ?, ?, ?, ?)", batch)
+                    batch = []
+            partition.executemany("INSERT OR IGNORE INTO message VALUES (?, ?, ?, ?, ?)", batch)
+            partition.execute("INSERT INTO message_search(message_search) VALUES ('rebuild')")
+            partition.commit()
+        if not copied:
+            os.remove(temporary)
+            return SealTotals(bucket, 0, 0, path)
+
+        _record(bucket, stats, using)
+        for offset in range(0, len(copied), SEAL_CHUNK_SIZE):
+            chunk = copied[offset:offset + SEAL_CHUNK_SIZE]
+            SealedMessageEntry.objects.using(using).bulk_create(entries[offset:offset + SEAL_CHUNK_SIZE])
+            # os tokens saem do conteúdo ainda na tabela quente, antes do DELETE
+            _index_sealed(chunk, using)
+            Message.objects.using(using).filter(id__in=chunk).delete()
+        # troca antes do commit: se o commit falhar, as linhas ficam nos dois
+        # lugares e as leituras (que deduplicam pelo id) usam a da tabela quente
+        os.replace(temporary, path)
+    return SealTotals(bucket, len(copied), len(stats), path)
+
+
+def _index_sealed(message_ids, using):
+    """Indexa na busca das seladas o conteúdo quente das mensagens (já com SealedMessageEntry)."""
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    pk = Message._meta.pk
+    params = [pk.get_db_prep_value(message_id, connection) for message_id in message_ids]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {SEALED_SEARCH_TABLE}(rowid, content) "
+            f"SELECT e.id, m.content FROM {quote(SealedMessageEntry._meta.db_table)} e "
+            f"JOIN {quote(Message._meta.db_table)} m ON m.id = e.message_id "
+            f"WHERE e.message_id IN ({', '.join(['%s'] * len(params))})",
+            params,
+        )
+
+
+def _record(bucket, stats, using):
+    """Soma as mensagens seladas agora às já registradas em MessagePartition."""
+    existing = {
+        partition.conversation_id: partition
+        for partition in MessagePartition.objects.using(using).filter(bucket=bucket, conversation_id__in=list(stats))
+    }
+    created, updated = [], []
+    for conversation_id, (count, first_at, last_at) in stats.items():
+        partition = existing.get(conversation_id)
+        if partition is None:
+            created.append(MessagePartition(
+                conversation_id=conversation_id, bucket=bucket,
+                message_count=count, first_at=first_at, last_at=last_at,
+            ))
+        else:
+            partition.message_count += count
+            partition.first_at = min(partition.first_at, first_at)
+            partition.last_at = max(partition.last_at, last_at)
+            updated.append(partition)
+    MessagePartition.objects.using(using).bulk_create(created, batch_size=SEAL_CHUNK_SIZE)
+    MessagePartition.objects.using(using).bulk_update(
+        updated, ["message_count", "first_at", "last_at"], batch_size=SEAL_CHUNK_SIZE
+    )
+
+
+def merge(*sources):
+    """
+    Junta mensagens da tabela quente e das partições em ordem cronológica,
+    sem repetir ids (vale a primeira fonte em que o id aparece).
+    """
+    unique = {}
+    for messages in sources:
+        for message in messages:
+            unique.setdefault(message.id, message)
+    return sorted(unique.values(), key=lambda message: (message.timestamp, message.id))
+
+
+def forget_conversations(conversation_ids, using="default"):
+    """
+    Esquece as mensagens seladas das conversas (ex.: depois de arquivadas).
+    As linhas continuam nos arquivos e os tokens no índice de busca, mas
+    nenhuma leitura chega mais a elas: a busca só devolve tokens com uma
+    SealedMessageEntry, cujos ids não são reaproveitados.
+    """
+    conversation_ids = list(conversation_ids)
+    SealedMessageEntry.objects.using(using).filter(conversation_id__in=conversation_ids).delete()
+    return MessagePartition.objects.using(using).filter(conversation_id__in=conversation_ids).delete()[0]
+
+
+def clear_partitions(using="default"):
+    """Apaga todas as partições: registros, índice das seladas e arquivos."""
+    buckets = set(MessagePartition.objects.using(using).order_by().values_list("bucket", flat=True).distinct())
+    with transaction.atomic(using=using):
+        MessagePartition.objects.using(using).all().delete()
+        SealedMessageEntry.objects.using(using).all().delete()
+        if connections[using].vendor == "sqlite":
+            with connections[using].cursor() as cursor:
+                cursor.execute(f"INSERT INTO {SEALED_SEARCH_TABLE}({SEALED_SEARCH_TABLE}) VALUES ('delete-all')")
+    for bucket in buckets:
+        if os.path.exists(partition_path(bucket)):
+            os.remove(partition_path(bucket))
+
+
+def sealed_ids(message_ids, using="default"):
+    """Ids, dentre os informados, de mensagens já seladas."""
+    return set(
+        SealedMessageEntry.objects.using(using)
+        .filter(message_id__in=list(message_ids))
+        .values_list("message_id", flat=True)
+    )
+
+
+def _load(bucket, message_ids):
+    """Mensagens do arquivo do mês pelos ids: {id: SealedMessage}."""
+    found = {}
+    ids = [message_id.hex for message_id in message_ids]
+    with _connect(bucket) as partition:
+        for offset in range(0, len(ids), SEAL_CHUNK_SIZE):
+            chunk = ids[offset:offset + SEAL_CHUNK_SIZE]
+            rows = partition.execute(
+                "SELECT id, direction, content, timestamp, conversation_id FROM message "
+                f"WHERE id IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            for row in rows:
+                message = _to_message(row)
+                found[message.id] = message
+    return found
+
+
+def load_sealed(pairs):
+    """
+    Mensagens seladas a partir de pares (id, mês), na ordem recebida: um
+    SELECT por mês presente, só com os ids pedidos.
+    """
+    pairs = list(pairs)
+    by_bucket = {}
+    for message_id, bucket in pairs:
+        by_bucket.setdefault(bucket, []).append(message_id)
+    found = {}
+    for bucket, message_ids in by_bucket.items():
+        found.update(_load(bucket, message_ids))
+    return [found[message_id] for message_id, _ in pairs if message_id in found]
+
+
+def sealed_chunks(entries, chunk_size=SEAL_CHUNK_SIZE):
+    """
+    Lê um queryset ordenado de SealedMessageEntry em blocos e gera, por bloco,
+    a lista das mensagens seladas (com o conteúdo) na mesma ordem.
+    """
+    pairs = []
+    for pair in entries.values_list("message_id", "bucket").iterator(chunk_size=chunk_size):
+        pairs.append(pair)
+        if len(pairs) >= chunk_size:
+            yield load_sealed(pairs)
+            pairs = []
+    if pairs:
+        yield load_sealed(pairs)
+
+
+def sealed_rows(entries, chunk_size=SEAL_CHUNK_SIZE):
+    """Como sealed_chunks, mas uma mensagem por vez."""
+    for chunk in sealed_chunks(entries, chunk_size):
+        yield from chunk
+
+
+def sealed_message(message_id, using="default"):
+    """A mensagem selada com o id, ou None."""
+    pair = SealedMessageEntry.objects.using(using).filter(message_id=message_id).values_list("message_id", "bucket").first()
+    messages = load_sealed([pair]) if pair else []
+    return messages[0] if messages else None
+
+
+def merge_rows(*streams):
+    """
+    Junta fluxos de tuplas na ordem de MESSAGE_COLUMNS (quentes de
+    values_list, seladas de sealed_rows), cada um já em ordem (timestamp, id),
+    sem carregá-los inteiros.
+    """
+    return heapq.merge(*streams, key=lambda row: (row[3], row[0]))
+
+
+def sealed_search_hits(hits, match, start, end, tokens):
+    """
+    Completa os resultados da busca que vieram de mensagens seladas (atributo
+    `bucket` preenchido) com o conteúdo e o trecho destacado, lidos do índice
+    FTS5 do arquivo de cada mês.
+    """
+    by_bucket = {}
+    for hit in hits:
+        if hit.bucket:
+            by_bucket.setdefault(hit.bucket, {})[hit.id.hex] = hit
+    for bucket, bucket_hits in by_bucket.items():
+        with _connect(bucket) as partition:
+            rows = partition.execute(
+                f"SELECT m.id, m.content, snippet(message_search, 0, ?, ?, '…', ?) "
+                f"FROM message_search JOIN message m ON m.rowid = message_search.rowid "
+                f"WHERE message_search MATCH ? AND m.id IN ({', '.join('?' * len(bucket_hits))})",
+                [start, end, tokens, match, *bucket_hits],
+            )
+            for pk, content, snippet in rows:
+                bucket_hits[pk].content = content
+                bucket_hits[pk].snippet = snippet
+    return hits
+
+
+def index_bucket(bucket, using="default"):
+    """
+    Inclui no índice das seladas (SealedMessageEntry e busca) as mensagens de
+    um arquivo selado antes dele existir, e cria a busca do próprio arquivo.
+    Ids já indexados são mantidos. Retorna quantas mensagens entraram.
+    """
+    path = partition_path(bucket)
+    with closing(sqlite3.connect(path)) as partition:
+        partition.executescript(SCHEMA)
+        partition.execute("INSERT INTO message_search(message_search) VALUES ('rebuild')")
+        partition.commit()
+        rows = [
+            _to_message(row)
+            for row in partition.execute("SELECT id, direction, content, timestamp, conversation_id FROM message")
+        ]
+
+    # conversas esquecidas (arquivadas) continuam no arquivo, mas não voltam
+    live = set(
+        MessagePartition.objects.using(using).filter(bucket=bucket).values_list("conversation_id", flat=True)
+    )
+    rows = [message for message in rows if message.conversation_id in live]
+
+    connection = connections[using]
+    added = 0
+    with transaction.atomic(using=using):
+        for offset in range(0, len(rows), SEAL_CHUNK_SIZE):
+            chunk = rows[offset:offset + SEAL_CHUNK_SIZE]
+            known = sealed_ids([message.id for message in chunk], using)
+            chunk = [message for message in chunk if message.id not in known]
+            SealedMessageEntry.objects.using(using).bulk_create([
+                SealedMessageEntry(
+                    message_id=message.id, conversation_id=message.conversation_id,
+                    direction=message.direction, timestamp=message.timestamp, bucket=bucket,
+                )
+                for message in chunk
+            ])
+            rowids = dict(
+                SealedMessageEntry.objects.using(using)
+                .filter(message_id__in=[message.id for message in chunk])
+                .values_list("message_id", "id")
+            )
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {SEALED_SEARCH_TABLE}(rowid, content) VALUES (%s, %s)",
+                    [(rowids[message.id], message.content) for message in chunk],
+                )
+            added += len(chunk)
+    return added
+
+
+def partitioned_conversations(conversation_ids, using="default"):
+    """Conversas, dentre as informadas, que têm mensagens seladas."""
+    return set(
+        MessagePartition.objects.using(using)
+        .filter(conversation_id__in=list(conversation_ids))
+        .values_list("conversation_id", flat=True)
+    )
+
+
+def sealed_totals(using="default"):
+    """Mensagens seladas por mês: {bucket: (mensagens, primeira, última)}."""
+    return {
+        row["bucket"]: (row["messages"], row["first_at"], row["last_at"])
+        for row in MessagePartition.objects.using(using)
+        .values("bucket")
+        .annotate(messages=Sum("message_count"), first_at=Min("first_at"), last_at=Max("last_at"))
+        .order_by("bucket")
+    }
@@ -0,0 +1,179 @@
+"""
+Busca textual no conteúdo das mensagens com um índice FTS5 do SQLite.
+
+A tabela virtual `message_search` usa a própria tabela de mensagens como
+conteúdo externo (content_rowid = rowid) e é mantida em sincronia por
+triggers de INSERT, UPDATE e DELETE (ver migração 0004_message_search).
+Depois de um VACUUM os rowids podem mudar: rode `rebuild_message_search`.
+Migrações que recriam a tabela de mensagens (ALTER no SQLite) apagam os
+triggers, que precisam ser recriados na mesma migração.
+
+Mensagens seladas (ver message/partitions.py) têm os tokens no índice sem
+conteúdo `message_search_sealed`, com rowid = SealedMessageEntry.id. A
+busca ordena as duas fontes na mesma consulta (UNION ALL por bm25) e, só
+para os resultados da página que vieram das seladas, lê o texto e o trecho
+destacado no índice do arquivo do mês. O bm25 de cada índice usa as
+estatísticas dele, então a relevância entre quentes e seladas é aproximada.
+
+O tokenizador unicode61 com remove_diacritics faz "ola" encontrar "olá".
+"""
+import html
+import re
+
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+
+from rest_framework.exceptions import ParseError
+
+from realmate_challenge.apps.conversation.models import Conversation
+
+from .models import Message, SealedMessageEntry
+
+
+SEARCH_TABLE = "message_search"
+SEALED_SEARCH_TABLE = "message_search_sealed"
+
+# delimitadores do snippet(); trocados por <mark> depois de escapar o HTML
+_HIGHLIGHT_START = "\x02"
+_HIGHLIGHT_END = "\x03"
+SNIPPET_TOKENS = 12
+
+_TERM_RE = re.compile(r"\w+\*?")
+
+
+def build_match_query(text):
+    """
+    Converte o texto digitado em uma expressão MATCH segura: cada palavra
+    vira um termo entre aspas (todas obrigatórias) e "palavra*" busca por
+    prefixo. Retorna None se não houver nenhuma palavra.
+    """
+    terms = []
+    for term in _TERM_RE.findall(text or ""):
+        if term.endswith("*"):
+            terms.append(f'"{term[:-1]}"*')
+        else:
+            terms.append(f'"{term}"')
+    return " ".join(terms) or None
+
+
+def highlight(snippet):
+    """Escapa o trecho encontrado e marca os termos com <mark>."""
+    escaped = html.escape(snippet or "")
+    return escaped.replace(_HIGHLIGHT_START, "<mark>").replace(_HIGHLIGHT_END, "</mark>")
+
+
+def parse_search_params(query_params):
+    """
+    Lê os filtros da busca da query string (q, conversation, direction,
+    status, since, until). Levanta ParseError (400) se algum for inválido.
+    """
+    match = build_match_query(query_params.get("q"))
+    if match is None:
+        raise ParseError("Parâmetro 'q' obrigatório.")
+
+    params = {"match": match}
+
+    conversation_id = query_params.get("conversation")
+    if conversation_id:
+        try:
+            params["conversation_id"] = Message._meta.pk.to_python(conversation_id)
+        except Exception:
+            raise ParseError("Parâmetro 'conversation' deve ser um UUID.")
+
+    direction = query_params.get("direction")
+    if direction:
+        if direction not in dict(Message.DIRECTION_CHOICES):
+            raise ParseError("Parâmetro 'direction' deve ser 'SENT' ou 'RECEIVED'.")
+        params["direction"] = direction
+
+    status = query_params.get("status")
+    if status:
+        if status not in dict(Conversation.STATUS_CHOICES):
+            raise ParseError("Parâmetro 'status' deve ser 'OPEN' ou 'CLOSED'.")
+        params["status"] = status
+
+    for name in ("since", "until"):
+        value = query_params.get(name)
+        if value:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ParseError(f"Parâmetro '{name}' inválido. Use ISO 8601.")
+            params[name] = parsed
+
+    return params
+
+
+def search_messages(match, conversation_id=None, direction=None, status=None,
+                    since=None, until=None, after=None, limit=50, using="default"):
+    """
+    Mensagens que casam com a expressão MATCH, da mais relevante para a menos
+    relevante (bm25, menor é melhor), desempatando pelo id.
+
+    `after` é o cursor (rank, id) do último resultado da página anterior.
+    Cada mensagem devolvida traz os atributos extras `rank` e `snippet`.
+    """
+    # partitions importa serializers, que importa este módulo
+    from .partitions import sealed_search_hits
+
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    conversation_table = quote(Conversation._meta.db_table)
+    pk = Message._meta.pk
+    timestamp_field = Message._meta.get_field("timestamp")
+
+    def select(table, source, alias, rowid, id_column, content, snippet, bucket):
+        """SELECT de uma das fontes, com os mesmos filtros e cursor."""
+        joins = [f"JOIN {source} {alias} ON {alias}.{rowid} = {table}.rowid"]
+        where = [f"{table} MATCH %s"]
+        params = [match]
+        if conversation_id is not None:
+            where.append(f"{alias}.conversation_id = %s")
+            params.append(pk.get_db_prep_value(conversation_id, connection))
+        if direction is not None:
+            where.append(f"{alias}.direction = %s")
+            params.append(direction)
+        if status is not None:
+            joins.append(f"JOIN {conversation_table} c ON c.id = {alias}.conversation_id")
+            where.append("c.status = %s")
+            params.append(status)
+        if since is not None:
+            where.append(f"{alias}.timestamp >= %s")
+            params.append(timestamp_field.get_db_prep_value(since, connection))
+        if until is not None:
+            where.append(f"{alias}.timestamp < %s")
+            params.append(timestamp_field.get_db_prep_value(until, connection))
+        if after is not None:
+            rank, message_id = after
+            where.append(f"(bm25({table}) > %s OR (bm25({table}) = %s AND {alias}.{id_column} > %s))")
+            params.extend([rank, rank, pk.get_db_prep_value(message_id, connection)])
+        sql = (
+            f"SELECT {alias}.{id_column} AS id, {alias}.conversation_id, {alias}.direction, {content} AS content, "
+            f"{alias}.timestamp, bm25({table}) AS rank, {snippet} AS snippet, {bucket} AS bucket "
+            f"FROM {table} {' '.join(joins)} "
+            f"WHERE {' AND '.join(where)}"
+        )
+        return sql, params
+
+    hot_sql, hot_params = select(
+        SEARCH_TABLE, quote(Message._meta.db_table), "m", "rowid", "id", "m.content",
+        f"snippet({SEARCH_TABLE}, 0, '{_HIGHLIGHT_START}', '{_HIGHLIGHT_END}', '…', {SNIPPET_TOKENS})", "NULL",
+    )
+    # conteúdo e trecho das seladas vêm depois, do arquivo do mês
+    sealed_sql, sealed_params = select(
+        SEALED_SEARCH_TABLE, quote(SealedMessageEntry._meta.db_table), "s", "id", "message_id", "NULL", "NULL", "s.bucket",
+    )
+    sql = f"{hot_sql} UNION ALL {sealed_sql} ORDER BY rank, id LIMIT %s"
+    hits = list(Message.objects.db_manager(using).raw(sql, [*hot_params, *sealed_params, limit]))
+    return sealed_search_hits(hits, match, _HIGHLIGHT_START, _HIGHLIGHT_END, SNIPPET_TOKENS)
+
+
+def rebuild_index(using="default"):
+    """Reconstrói o índice inteiro a partir da tabela de mensagens."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+
+
+def optimize_index(using="default"):
+    """Funde os segmentos do índice (buscas mais rápidas depois de muitas escritas)."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
@@ -1,8 +1,80 @@
-from rest_framework import serializers
+from django.conf import settings
+from django.utils import timezone
+
+from drf_spectacular.utils import extend_schema_field
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 
 from .models import Message
+from .search import highlight
 
 class MessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Message
         fields = '__all__'
+
+
+class MessageSearchSerializer(MessageSerializer):
+    """Resultado da busca: a mensagem, a relevância (bm25) e o trecho destacado."""
+    rank = serializers.FloatField(read_only=True)
+    snippet = serializers.SerializerMethodField()
+
+    class Meta(MessageSerializer.Meta):
+        fields = ['id', 'conversation', 'direction', 'content', 'timestamp', 'rank', 'snippet']
+
+    def get_snippet(self, obj) -> str:
+        return highlight(obj.snippet)
+
+
+# Caminho rápido de leitura: tuplas de values_list(*MESSAGE_COLUMNS) viram
+# dicionários com o mesmo JSON de MessageSerializer, sem instanciar modelos
+# nem campos do DRF (que dominam o tempo ao listar milhares de mensagens).
+MESSAGE_COLUMNS = ('id', 'direction', 'content', 'timestamp', 'conversation_id')
+
+
+def datetime_representation():
+    """
+    Função equivalente a DateTimeField().to_representation do DRF para o fuso
+    ativo agora (ISO 8601, 'Z' no lugar de +00:00). Monte uma por resposta.
+    """
+    field = serializers.DateTimeField()
+    if not settings.USE_TZ or str(api_settings.DATETIME_FORMAT).lower() != ISO_8601:
+        return field.to_representation
+    tz = timezone.get_current_timezone()
+
+    def represent(value):
+        if not value:
+            return None
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        text = value.astimezone(tz).isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return represent
+
+
+def message_rows(rows):
+    """Serializa tuplas de values_list(*MESSAGE_COLUMNS) como MessageSerializer(many=True)."""
+    timestamp = datetime_representation()
+    return [
+        {
+            'id': str(pk),
+            'direction': direction,
+            'content': content,
+            'timestamp': timestamp(created_at),
+            'conversation': str(conversation_id),
+        }
+        for pk, direction, content, created_at, conversation_id in rows
+    ]
+
+
+@extend_schema_field(MessageSerializer(many=True))
+class MessageRowsField(serializers.Field):
+    """Campo somente leitura para uma lista de tuplas de values_list(*MESSAGE_COLUMNS)."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, rows):
+        return message_rows(rows)
@@ -1,21 +1,89 @@
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 
-from django.utils import timezone
+from django.core.exceptions import ValidationError
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from realmate_challenge.apps.conversation import write_queue
+from realmate_challenge.apps.conversation.cache import invalidate_conversation
 from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.apps.conversation.pagination import MessageSearchPagination
+from realmate_challenge.apps.conversation.stats import message_stats_update
+from realmate_challenge.apps.eventlog import log
+from realmate_challenge.database import read_database
 
-from .serializers import MessageSerializer
-from .models import Message
+from .serializers import MESSAGE_COLUMNS, MessageSerializer, MessageSearchSerializer, message_rows
+from .models import Message, SealedMessageEntry
+from .partitions import merge_rows, sealed_message, sealed_rows
+from .search import parse_search_params, search_messages
+
+
+# linhas lidas do banco por vez na listagem de mensagens
+LIST_CHUNK_SIZE = 2000
+
+SEARCH_PARAMETERS = [
+    OpenApiParameter("q", str, required=True, description="Palavras buscadas (todas obrigatórias); 'palavra*' busca por prefixo."),
+    OpenApiParameter("direction", str, enum=["SENT", "RECEIVED"]),
+    OpenApiParameter("status", str, enum=["OPEN", "CLOSED"], description="Status da conversa."),
+    OpenApiParameter("since", str, description="Mensagens a partir deste instante (ISO 8601)."),
+    OpenApiParameter("until", str, description="Mensagens anteriores a este instante (ISO 8601)."),
+    OpenApiParameter("cursor", str, description="Cursor retornado no campo `next` da página anterior."),
+    OpenApiParameter("page_size", int, description="Resultados por página (máximo 200)."),
+]
+
+
+def search_response(request, **filters):
+    """Executa a busca com os filtros da query string e devolve a página de resultados."""
+    params = parse_search_params(request.query_params)
+    params.update(filters)
+    paginator = MessageSearchPagination(request)
+    hits = search_messages(
+        **params,
+        after=paginator.after,
+        limit=paginator.page_size + 1,
+        using=read_database(),
+    )
+    page = paginator.paginate(hits)
+    return paginator.get_paginated_response(MessageSearchSerializer(page, many=True).data)
 
 
 class MessageViewSet(viewsets.ModelViewSet):
+    # mensagens são imutáveis, como no webhook: edições e remoções não são
+    # eventos do log e se perderiam em um replay_event_log --from-scratch
+    http_method_names = ["get", "post", "head", "options"]
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
 
+    def list(self, request, *args, **kwargs):
+        # caminho rápido: tuplas do banco serializadas sem instanciar modelos,
+        # com as mensagens seladas (ver message/partitions.py) intercaladas
+        using = read_database()
+        rows = (
+            self.filter_queryset(self.get_queryset()).using(using)
+            .order_by("timestamp", "id").values_list(*MESSAGE_COLUMNS)
+        )
+        sealed = SealedMessageEntry.objects.using(using).order_by("timestamp", "message_id")
+        return Response(message_rows(merge_rows(
+            rows.iterator(chunk_size=LIST_CHUNK_SIZE), sealed_rows(sealed, LIST_CHUNK_SIZE)
+        )))
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            # mensagens seladas saem da tabela quente, mas continuam legíveis
+            try:
+                message = sealed_message(Message._meta.pk.to_python(kwargs[self.lookup_field]), read_database())
+            except ValidationError:
+                message = None
+            if message is None:
+                raise
+            return Response(message_rows([message])[0])
+
     @extend_schema(
         summary="Criar nova mensagem",
         description=(
@@ -32,8 +100,35 @@ class MessageViewSet(viewsets.ModelViewSet):
             return Response({"detail": "This conversation is closed."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        # Atualiza a última mensagem
-        conversation.last_message_at = timezone.now()
-        conversation.save(update_fields=["last_message_at"])
-
         return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        # mensagem e contadores da conversa na mesma transação, na fila da conversa
+        def save():
+            message = serializer.save()
+            Conversation.objects.filter(id=message.conversation_id).update(
+                **message_stats_update(message.id, message.direction, message.content, message.timestamp)
+            )
+            log.append(log.message_created(
+                message.id, message.conversation_id, message.direction, message.content, message.timestamp
+            ))
+            invalidate_conversation(message.conversation_id)
+
+        write_queue.run(serializer.validated_data["conversation"].id, save)
+
+    @extend_schema(
+        summary="Buscar mensagens",
+        description=(
+            "Busca textual no conteúdo das mensagens (índice FTS5), ordenada por relevância, "
+            "com o trecho encontrado destacado em `<mark>` e paginação por cursor."
+        ),
+        parameters=[
+            OpenApiParameter("conversation", str, description="Restringe a busca a uma conversa (UUID)."),
+            *SEARCH_PARAMETERS,
+        ],
+        responses=MessageSearchSerializer(many=True),
+        tags=["Mensagens"]
+    )
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        return search_response(request)
@@ -0,0 +1,19 @@
+from django.apps import AppConfig
+
+class WebhookConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'realmate_challenge.apps.webhook'
+    label= 'webhook'
+
+    def ready(self):
+        from realmate_challenge.metrics import REGISTRY
+
+        from .inbox import collect_inbox_metrics
+
+        REGISTRY.register("realmate_webhook_inbox_pending", "gauge", "Eventos no inbox do webhook.")
+        REGISTRY.register("realmate_webhook_inbox_ready", "gauge", "Eventos do inbox prontos para os workers.")
+        REGISTRY.register(
+            "realmate_webhook_inbox_lag_seconds", "gauge", "Idade do evento mais antigo ainda no inbox."
+        )
+        REGISTRY.register("realmate_webhook_dead_letters", "gauge", "Eventos do inbox no dead-letter.")
+        REGISTRY.add_collector(collect_inbox_metrics)
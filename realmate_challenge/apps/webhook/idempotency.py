@@ -0,0 +1,223 @@
+"""
+Idempotência das entregas do webhook.
+
+Cada evento processado com sucesso tem a resposta guardada sob a chave
+"<tipo>:<id>" (ex.: "NEW_MESSAGE:<id da mensagem>"):
+
+- um LRU limitado em memória responde às reentregas sem tocar no banco;
+- a tabela WebhookDelivery é a fonte de verdade entre processos, gravada com
+  INSERT OR IGNORE na mesma transação do evento;
+- a unicidade dos eventos continua garantida pelas chaves primárias: o
+  handler tenta o insert direto e, se ele falhar por duplicidade, devolve a
+  resposta original guardada (em vez de exists() seguido de insert).
+
+Só respostas 2xx são guardadas: um evento recusado (ex.: conversa ainda não
+existe) pode dar certo na próxima tentativa.
+
+As chaves expiram depois de WEBHOOK_IDEMPOTENCY_TTL segundos; a limpeza roda
+no próprio processo a cada WEBHOOK_IDEMPOTENCY_PURGE_INTERVAL segundos e pode
+ser agendada com o comando purge_webhook_deliveries.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import WebhookDelivery
+
+
+Delivery = namedtuple("Delivery", ["status", "body"])
+
+
+def delivery_key(event_type, data):
+    """Chave de idempotência do evento, ou None se o id for inválido."""
+    try:
+        event_id = uuid.UUID(str(data.get("id")))
+    except (AttributeError, ValueError):
+        return None
+    return f"{event_type}:{event_id}"
+
+
+def _ttl():
+    return getattr(settings, "WEBHOOK_IDEMPOTENCY_TTL", 86400)
+
+
+class DeliveryCache:
+    """LRU limitado, com expiração, seguro entre threads."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            delivery, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return delivery
+
+    def put(self, key, delivery, age=0):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (delivery, time.monotonic() + self.ttl - age)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+cache = DeliveryCache(
+    max_size=getattr(settings, "WEBHOOK_IDEMPOTENCY_CACHE_SIZE", 10000),
+    ttl=_ttl(),
+)
+
+
+def lookup(key):
+    """Resposta guardada em memória (não consulta o banco)."""
+    if key is None:
+        return None
+    return cache.get(key)
+
+
+def _from_row(row):
+    delivery = Delivery(row.status_code, row.response)
+    age = (timezone.now() - row.created_at).total_seconds()
+    if age >= _ttl():
+        return None
+    cache.put(row.key, delivery, age=age)
+    return delivery
+
+
+def fetch(key):
+    """Resposta original de um evento repetido: memória e depois banco."""
+    if key is None:
+        return None
+    delivery = cache.get(key)
+    if delivery is not None:
+        return delivery
+    row = WebhookDelivery.objects.filter(key=key).first()
+    return _from_row(row) if row is not None else None
+
+
+async def afetch(key):
+    if key is None:
+        return None
+    delivery = cache.get(key)
+    if delivery is not None:
+        return delivery
+    row = await WebhookDelivery.objects.filter(key=key).afirst()
+    return _from_row(row) if row is not None else None
+
+
+def fetch_many(keys):
+    """Como fetch(), para vários eventos com uma única consulta."""
+    found = {}
+    missing = []
+    for key in keys:
+        delivery = cache.get(key)
+        if delivery is not None:
+            found[key] = delivery
+        else:
+            missing.append(key)
+    if missing:
+        for row in WebhookDelivery.objects.filter(key__in=missing):
+            delivery = _from_row(row)
+            if delivery is not None:
+                found[row.key] = delivery
+    return found
+
+
+def _rows(deliveries):
+    now = timezone.now()
+    return [
+        WebhookDelivery(key=key, status_code=delivery.status, response=delivery.body, created_at=now)
+        for key, delivery in deliveries.items()
+        if key is not None
+    ]
+
+
+def _cache_all(deliveries):
+    for key, delivery in deliveries.items():
+        if key is not None:
+            cache.put(key, delivery)
+
+
+def remember(key, status, body):
+    """Guarda a resposta de um evento; chamar dentro da transação do evento."""
+    remember_many({key: Delivery(status, body)})
+
+
+def remember_many(deliveries):
+    """
+    Grava as respostas com INSERT OR IGNORE. A memória só é atualizada
+    depois do commit, para não guardar eventos desfeitos por rollback.
+    """
+    rows = _rows(deliveries)
+    if not rows:
+        return
+    WebhookDelivery.objects.bulk_create(rows, ignore_conflicts=True)
+    transaction.on_commit(lambda: _cache_all(deliveries))
+    maybe_purge()
+
+
+async def aremember(key, status, body):
+    deliveries = {key: Delivery(status, body)}
+    rows = _rows(deliveries)
+    if not rows:
+        return
+    await WebhookDelivery.objects.abulk_create(rows, ignore_conflicts=True)
+    _cache_all(deliveries)
+    if _purge_due():
+        await WebhookDelivery.objects.filter(created_at__lt=_cutoff()).adelete()
+
+
+def _cutoff(now=None):
+    return (now or timezone.now()) - timedelta(seconds=_ttl())
+
+
+def purge_expired(now=None):
+    """Apaga as chaves mais antigas que o TTL. Retorna quantas foram apagadas."""
+    deleted, _ = WebhookDelivery.objects.filter(created_at__lt=_cutoff(now)).delete()
+    return deleted
+
+
+_last_purge = time.monotonic()
+_purge_lock = threading.Lock()
+
+
+def _purge_due():
+    """Verdadeiro (uma vez por intervalo, por processo) quando é hora de limpar."""
+    global _last_purge
+    interval = getattr(settings, "WEBHOOK_IDEMPOTENCY_PURGE_INTERVAL", 300)
+    if interval <= 0:
+        return False
+    with _purge_lock:
+        now = time.monotonic()
+        if now - _last_purge < interval:
+            return False
+        _last_purge = now
+        return True
+
+
+def maybe_purge():
+    if _purge_due():
+        purge_expired()
@@ -0,0 +1,187 @@
+"""
+Inbox do webhook: recebe rápido e processa em segundo plano.
+
+O webhook/inbox/ só valida a forma de cada evento (parse_event, sem tocar
+no banco), grava o evento cru em InboxEvent e responde 202. Reentregas já
+conhecidas pela idempotência recebem a resposta original na hora. Assim
+uma lentidão no processamento não faz o provedor estourar o timeout e
+reenviar, multiplicando a carga.
+
+Os workers (comando process_webhook_inbox) pegam lotes com claim(): o
+UPDATE que marca o lote empurra available_at para o fim do arrendamento
+(WEBHOOK_INBOX_LEASE), então vários workers e processos nunca pegam o mesmo
+evento, e um worker que morrer devolve os seus quando o prazo vence. Cada
+lote passa por process_batch, o mesmo caminho do webhook em lote (ordem de
+timestamp, idempotência, uma transação, fan-out depois do commit). Depois:
+
+- 2xx e 409 (já aplicado): o evento sai do inbox;
+- RETRY_STATUSES (ex.: 404, mensagem que chegou antes da conversa) ou
+  exceção: nova tentativa com espera exponencial (WEBHOOK_INBOX_RETRY_BASE
+  dobrando até WEBHOOK_INBOX_RETRY_MAX) até WEBHOOK_INBOX_MAX_ATTEMPTS;
+- qualquer outro status, ou tentativas esgotadas: DeadLetterEvent.
+
+Se o lote inteiro falhar, os eventos são refeitos um a um, para que um
+evento com problema não arraste os demais para o dead-letter.
+
+O fan-out sai do processo dos workers, não do servidor: só chega aos
+WebSockets com um channel layer compartilhado (CHANNEL_LAYER_HOSTS). Com o
+InMemoryChannelLayer padrão os eventos são aplicados, mas os clientes ao
+vivo só os veem ao recarregar; por isso o comando se recusa a rodar assim
+sem --allow-in-memory-layer.
+
+inbox_lag() alimenta as métricas de atraso em /metrics/.
+"""
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from realmate_challenge.webhooks.messages.batch import parse_event, process_batch
+
+from . import idempotency
+from .models import DeadLetterEvent, InboxEvent
+
+
+# status que podem dar certo mais tarde
+RETRY_STATUSES = {404}
+
+Totals = namedtuple("Totals", ["done", "retried", "dead"])
+Lag = namedtuple("Lag", ["pending", "ready", "oldest_seconds", "dead"])
+
+
+def accept(events):
+    """
+    Valida a forma dos eventos e grava os válidos no inbox.
+    Retorna um resultado por evento (202, resposta original ou erro).
+    """
+    results, rows = [], []
+    for index, event in enumerate(events):
+        normalized, error = parse_event(index, event)
+        if error:
+            results.append(error)
+            continue
+        delivery = idempotency.lookup(normalized["key"])
+        if delivery is not None:
+            results.append({"index": index, "status": delivery.status, "detail": delivery.body.get("detail")})
+            continue
+        results.append({"index": index, "status": 202, "detail": "Evento recebido."})
+        rows.append(InboxEvent(payload=event))
+    if rows:
+        InboxEvent.objects.bulk_create(rows)
+    return results
+
+
+def claim(batch_size, now=None):
+    """Pega até batch_size eventos prontos, por WEBHOOK_INBOX_LEASE segundos."""
+    now = now or timezone.now()
+    ids = list(
+        InboxEvent.objects.filter(available_at__lte=now)
+        .order_by("available_at", "id")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4()
+    lease = timedelta(seconds=getattr(settings, "WEBHOOK_INBOX_LEASE", 60))
+    # o available_at__lte repetido no UPDATE descarta o que outro worker pegou no meio tempo
+    InboxEvent.objects.filter(id__in=ids, available_at__lte=now).update(
+        available_at=now + lease, claimed_by=token
+    )
+    return list(InboxEvent.objects.filter(id__in=ids, claimed_by=token).order_by("id"))
+
+
+def _backoff(attempts):
+    base = getattr(settings, "WEBHOOK_INBOX_RETRY_BASE", 1)
+    return min(base * 2 ** (attempts - 1), getattr(settings, "WEBHOOK_INBOX_RETRY_MAX", 300))
+
+
+def _apply(events):
+    """Passa os eventos por process_batch; devolve [(evento, status, detalhe)]."""
+    try:
+        results = process_batch([event.payload for event in events])
+    except Exception as error:
+        if len(events) > 1:
+            outcomes = []
+            for event in events:
+                outcomes.extend(_apply([event]))
+            return outcomes
+        return [(events[0], None, f"{type(error).__name__}: {error}")]
+    return [(event, result["status"], result["detail"]) for event, result in zip(events, results)]
+
+
+def process(events, now=None):
+    """Aplica eventos já pegos com claim() e dá o destino de cada um. Retorna Totals."""
+    if not events:
+        return Totals(0, 0, 0)
+    max_attempts = getattr(settings, "WEBHOOK_INBOX_MAX_ATTEMPTS", 8)
+    done, retried, dead = [], [], []
+    for event, status, detail in _apply(events):
+        event.attempts += 1
+        if status is not None and (200 <= status < 300 or status == 409):
+            done.append(event.id)
+            continue
+        event.last_error = f"{status}: {detail}" if status is not None else detail
+        if (status is None or status in RETRY_STATUSES) and event.attempts < max_attempts:
+            retried.append(event)
+        else:
+            dead.append((event, status))
+
+    now = now or timezone.now()
+    for event in retried:
+        event.available_at = now + timedelta(seconds=_backoff(event.attempts))
+        event.claimed_by = None
+    with transaction.atomic():
+        DeadLetterEvent.objects.bulk_create([
+            DeadLetterEvent(
+                payload=event.payload,
+                received_at=event.received_at,
+                failed_at=now,
+                attempts=event.attempts,
+                status_code=status,
+                error=event.last_error,
+            )
+            for event, status in dead
+        ])
+        InboxEvent.objects.filter(id__in=done + [event.id for event, _ in dead]).delete()
+        InboxEvent.objects.bulk_update(retried, ["attempts", "available_at", "claimed_by", "last_error"])
+    return Totals(len(done), len(retried), len(dead))
+
+
+def drain(batch_size=None):
+    """Processa um lote. Retorna Totals (tudo zero se não havia evento pronto)."""
+    batch_size = batch_size or getattr(settings, "WEBHOOK_INBOX_BATCH_SIZE", 200)
+    return process(claim(batch_size))
+
+
+def requeue_dead(ids=None):
+    """Devolve eventos do dead-letter ao inbox (todos, ou os ids informados). Retorna quantos."""
+    dead = DeadLetterEvent.objects.all()
+    if ids is not None:
+        dead = dead.filter(id__in=ids)
+    with transaction.atomic():
+        rows = [InboxEvent(payload=event.payload, received_at=event.received_at) for event in dead]
+        InboxEvent.objects.bulk_create(rows)
+        dead.delete()
+    return len(rows)
+
+
+def inbox_lag(now=None):
+    """Eventos pendentes, prontos, idade do mais antigo (segundos) e dead-letters."""
+    now = now or timezone.now()
+    totals = InboxEvent.objects.aggregate(pending=Count("id"), oldest=Min("received_at"))
+    ready = InboxEvent.objects.filter(available_at__lte=now).count()
+    oldest = (now - totals["oldest"]).total_seconds() if totals["oldest"] else 0.0
+    return Lag(totals["pending"], ready, oldest, DeadLetterEvent.objects.count())
+
+
+def collect_inbox_metrics(registry):
+    """Coletor do /metrics/ (ver WebhookConfig.ready)."""
+    lag = inbox_lag()
+    registry.set("realmate_webhook_inbox_pending", (), lag.pending)
+    registry.set("realmate_webhook_inbox_ready", (), lag.ready)
+    registry.set("realmate_webhook_inbox_lag_seconds", (), lag.oldest_seconds)
+    registry.set("realmate_webhook_dead_letters", (), lag.dead)
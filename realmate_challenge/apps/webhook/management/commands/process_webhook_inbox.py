@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+
+from realmate_challenge.apps.webhook.inbox import Totals, drain, inbox_lag, requeue_dead
+from realmate_challenge.channel_layers import is_in_memory
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Processa o inbox do webhook (webhook/inbox/) com um pool de workers: '
+        'lotes pelo mesmo caminho do webhook em lote, novas tentativas com espera '
+        'exponencial e dead-letter'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.WEBHOOK_INBOX_WORKERS)
+        parser.add_argument('--batch-size', type=int, default=settings.WEBHOOK_INBOX_BATCH_SIZE)
+        parser.add_argument('--once', action='store_true', help='Sai quando não houver mais eventos prontos.')
+        parser.add_argument('--stats', action='store_true', help='Só mostra o atraso do inbox e o dead-letter.')
+        parser.add_argument(
+            '--requeue-dead', action='store_true',
+            help='Devolve os eventos do dead-letter ao inbox antes de processar.',
+        )
+        parser.add_argument(
+            '--allow-in-memory-layer', action='store_true',
+            help='Processa mesmo com o channel layer em memória (o fan-out não chega ao servidor).',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers e --batch-size devem ser positivos.')
+
+        if options['stats']:
+            lag = inbox_lag()
+            self.stdout.write(
+                f'{lag.pending} eventos no inbox ({lag.ready} prontos), mais antigo há '
+                f'{lag.oldest_seconds:.1f}s; {lag.dead} no dead-letter.'
+            )
+            return
+
+        # os consumers rodam no processo do servidor ASGI: com o layer em
+        # memória, o fan-out publicado aqui não sai deste processo
+        if is_in_memory(settings.CHANNEL_LAYERS):
+            if not options['allow_in_memory_layer']:
+                raise CommandError(
+                    'O channel layer está em memória (sem CHANNEL_LAYER_HOSTS): as mensagens '
+                    'aplicadas pelos workers não chegariam aos WebSockets. Configure '
+                    'CHANNEL_LAYER_HOSTS ou use --allow-in-memory-layer.'
+                )
+            self.stderr.write(self.style.WARNING(
+                'Channel layer em memória: o fan-out dos eventos aplicados não chega aos WebSockets.'
+            ))
+        if options['requeue_dead']:
+            self.stdout.write(f'{requeue_dead()} eventos devolvidos do dead-letter ao inbox.')
+
+        self.totals = Totals(0, 0, 0)
+        self.lock = threading.Lock()
+        stop = threading.Event()
+        workers = [
+            threading.Thread(target=self.work, args=(stop, options), name=f'webhook-inbox-{index}')
+            for index in range(options['workers'])
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(timeout=1)
+        except KeyboardInterrupt:
+            # termina os lotes em andamento; o resto fica para a próxima execução
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+        done, retried, dead = self.totals
+        self.stdout.write(self.style.SUCCESS(
+            f'{done} eventos aplicados, {retried} reagendados e {dead} no dead-letter '
+            f'em {time.perf_counter() - start:.2f}s.'
+        ))
+
+    def work(self, stop, options):
+        poll = getattr(settings, 'WEBHOOK_INBOX_POLL_INTERVAL', 0.5)
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                try:
+                    totals = drain(options['batch_size'])
+                except Exception:
+                    logger.exception('Falha ao processar um lote do inbox do webhook')
+                    stop.wait(poll)
+                    continue
+                if any(totals):
+                    with self.lock:
+                        self.totals = Totals(*(a + b for a, b in zip(self.totals, totals)))
+                    continue
+                if options['once']:
+                    return
+                stop.wait(poll)
+        finally:
+            connections.close_all()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from realmate_challenge.apps.webhook.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = (
+        'Apaga as chaves de idempotência do webhook mais antigas que '
+        'WEBHOOK_IDEMPOTENCY_TTL (para agendar no cron)'
+    )
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'{deleted} chaves expiradas apagadas.'))
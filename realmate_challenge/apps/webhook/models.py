@@ -0,0 +1,69 @@
+from django.utils import timezone
+from django.db import models
+
+
+class WebhookDelivery(models.Model):
+    """
+    Resposta dada a um evento do webhook já processado, para que as
+    reentregas do provedor recebam a mesma resposta (ver webhook/idempotency.py).
+    """
+    # "<tipo do evento>:<id do evento>"
+    key = models.CharField(max_length=64, primary_key=True)
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code})"
+
+    class Meta:
+        indexes = [
+            # expiração das chaves antigas
+            models.Index(fields=['created_at'], name='webhook_delivery_created_idx'),
+        ]
+
+
+class InboxEvent(models.Model):
+    """
+    Evento recebido pelo webhook/inbox/ e ainda não processado (ver
+    webhook/inbox.py). A linha sai da tabela quando o evento é aplicado ou
+    vai para DeadLetterEvent.
+    """
+    id = models.BigAutoField(primary_key=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(default=timezone.now)
+    # próxima vez em que o evento pode ser pego: recebimento, fim do
+    # arrendamento de um worker ou próxima tentativa depois de uma falha
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_by = models.UUIDField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+
+    def __str__(self):
+        return f"{self.payload.get('type', '?')} #{self.id} ({self.attempts} tentativas)"
+
+    class Meta:
+        indexes = [
+            # eventos prontos para os workers, na ordem de chegada
+            models.Index(fields=['available_at', 'id'], name='webhook_inbox_available_idx'),
+        ]
+
+
+class DeadLetterEvent(models.Model):
+    """Evento do inbox recusado de vez ou que esgotou as tentativas."""
+    id = models.BigAutoField(primary_key=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField()
+    failed_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField()
+    # status da última tentativa (vazio se ela terminou em exceção)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    error = models.TextField()
+
+    def __str__(self):
+        return f"{self.payload.get('type', '?')} #{self.id} ({self.error})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['failed_at'], name='webhook_dead_letter_failed_idx'),
+        ]
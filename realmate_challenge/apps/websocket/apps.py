@@ -0,0 +1,6 @@
+from django.apps import AppConfig
+
+class WebsocketConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'realmate_challenge.apps.websocket'
+    label= 'websocket'
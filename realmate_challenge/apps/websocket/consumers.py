@@ -1,42 +1,441 @@
+import asyncio
+import heapq
 import json
+import logging
+import uuid
+from itertools import islice
+from urllib.parse import parse_qs
 
+from django.conf import settings
+from django.db.models import OuterRef, Q, Subquery
+from django.utils.dateparse import parse_datetime
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
-class ChatConsumer(AsyncWebsocketConsumer):
+from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.apps.eventlog.models import LoggedEvent
+from realmate_challenge.apps.message.models import Message, SealedMessageEntry
+from realmate_challenge.apps.message.partitions import load_sealed
+from realmate_challenge.database import read_database
+from realmate_challenge.metrics import MetricsConsumerMixin, timed
+
+from . import deltas
+from .groups import INBOX_FEED_GROUP, conversation_group_name, inbox_group_name
+
+logger = logging.getLogger(__name__)
+
+# estado enviado ao InboxConsumer na inscrição
+SNAPSHOT_FIELDS = (
+    "id",
+    "status",
+    "timestamp",
+    "last_message_at",
+    "message_count",
+    "unread_received_count",
+    "last_message_id",
+    "last_message_direction",
+    "last_message_preview",
+)
+
+
+class ChatConsumer(MetricsConsumerMixin, AsyncWebsocketConsumer):
+    """
+    Envia ao frontend as mensagens novas de uma conversa.
+
+    Modo em lote (opcional, `?batch=1` na URL): os eventos são acumulados por
+    até CHAT_BATCH_WINDOW_MS milissegundos ou CHAT_BATCH_MAX_MESSAGES mensagens
+    e enviados em um único frame com um array JSON.
+
+    Retomada (`?last_id=<uuid>` ou `?since=<ISO 8601>` na URL): ao reconectar,
+    as mensagens perdidas são lidas do banco em blocos e enviadas antes dos
+    eventos ao vivo. Se faltarem mais de CHAT_RESUME_MAX_MESSAGES, o cliente
+    recebe {"type": "resync_required"} e deve recarregar a conversa.
+
+    Cada evento (conexão, pedido do cliente, mensagem do grupo) é medido
+    por MetricsConsumerMixin (ver realmate_challenge/metrics.py).
+    """
+
     async def connect(self):
         self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
-        self.room_group_name = f"conversation_{self.conversation_id}"
+        self.room_group_name = conversation_group_name(self.conversation_id)
+
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.batching = query.get('batch', ['0'])[0] in ('1', 'true')
+        self.batch_window = getattr(settings, 'CHAT_BATCH_WINDOW_MS', 20) / 1000
+        self.batch_max_messages = getattr(settings, 'CHAT_BATCH_MAX_MESSAGES', 50)
+        self._buffer = []
+        self._flush_task = None
+        self._replayed_ids = set()
 
+        # entra no grupo antes de ler o banco: nada publicado durante a
+        # retomada se perde (eventos repetidos são descartados em send_message)
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
         await self.accept()
 
-        print(f"✅ Cliente conectado à conversa {self.conversation_id}")
+        logger.info("Cliente conectado à conversa %s (lote: %s)", self.conversation_id, self.batching)
+
+        last_id = query.get('last_id', [None])[0]
+        since = query.get('since', [None])[0]
+        if last_id or since:
+            await self.resume(last_id=last_id, since=since)
 
     async def disconnect(self, close_code):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._buffer = []
+
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
-        print(f"❌ Cliente desconectado da conversa {self.conversation_id} (código: {close_code})")
+        logger.info("Cliente desconectado da conversa %s (código: %s)", self.conversation_id, close_code)
 
     async def receive(self, text_data):
-        # Não se espera mensagens do front, mas se vier, sera logado
-        print(f"⚠️ Mensagem inesperada recebida do cliente: {text_data}")
+        # O front só envia pedidos de retomada; qualquer outra coisa é logada
+        try:
+            payload = json.loads(text_data)
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict) and payload.get("type") == "resume":
+            await self.resume(last_id=payload.get("last_id"), since=payload.get("since"))
+            return
+        logger.warning("Mensagem inesperada recebida do cliente: %s", text_data)
+
+    async def resume(self, last_id=None, since=None):
+        """Envia, em blocos, as mensagens posteriores à última vista pelo cliente."""
+        cursor = await self._resume_cursor(last_id, since)
+        if cursor is None:
+            await self._send_json({"type": "resync_required"})
+            return
+
+        chunk_size = getattr(settings, 'CHAT_RESUME_CHUNK_SIZE', 200)
+        max_messages = getattr(settings, 'CHAT_RESUME_MAX_MESSAGES', 5000)
+        # mede a lacuna antes de enviar: um resync depois de milhares de
+        # mensagens já enviadas faria o cliente descartá-las
+        if await self._missed_count(cursor, max_messages + 1) > max_messages:
+            await self._send_json({"type": "resync_required"})
+            return
+
+        sent = 0
+        while True:
+            chunk = await self._missed_messages(cursor, chunk_size)
+            if not chunk:
+                break
+            sent += len(chunk)
+
+            self._replayed_ids.update(message["id"] for message in chunk)
+            if self.batching:
+                await self._send_json(chunk)
+            else:
+                for message in chunk:
+                    await self._send_json(message)
+
+            last = chunk[-1]
+            cursor = (parse_datetime(last["timestamp"]), uuid.UUID(last["id"]))
+            if len(chunk) < chunk_size:
+                break
+
+        logger.info("Retomada da conversa %s: %d mensagem(ns) reenviada(s)", self.conversation_id, sent)
+
+    @database_sync_to_async
+    def _resume_cursor(self, last_id, since):
+        """
+        Converte o ponto de retomada em um cursor (timestamp, id).
+        Retorna None se o ponto não existir nesta conversa.
+        """
+        try:
+            conversation_id = uuid.UUID(str(self.conversation_id))
+            if last_id:
+                message_id = uuid.UUID(str(last_id))
+                return (
+                    Message.objects.filter(id=message_id, conversation_id=conversation_id)
+                    .values_list("timestamp", "id").first()
+                    # a última vista pode já ter sido selada
+                    or SealedMessageEntry.objects.filter(message_id=message_id, conversation_id=conversation_id)
+                    .values_list("timestamp", "message_id").first()
+                )
+            timestamp = parse_datetime(str(since))
+        except ValueError:
+            return None
+        if timestamp is None:
+            return None
+        return timestamp, None
+
+    def _missed_queryset(self, cursor, model=Message, id_field="id"):
+        """
+        Posteriores ao cursor na conversa, em ordem (timestamp, id): as
+        mensagens quentes ou, com model=SealedMessageEntry, as seladas.
+        """
+        timestamp, message_id = cursor
+        after = Q(timestamp__gt=timestamp)
+        if message_id is not None:
+            after |= Q(timestamp=timestamp, **{f"{id_field}__gt": message_id})
+        return (
+            model.objects
+            .filter(after, conversation_id=uuid.UUID(str(self.conversation_id)))
+            .order_by("timestamp", id_field)
+        )
+
+    def _sealed_queryset(self, cursor):
+        return self._missed_queryset(cursor, SealedMessageEntry, "message_id")
+
+    @database_sync_to_async
+    def _missed_count(self, cursor, limit):
+        """Mensagens posteriores ao cursor, quentes e seladas, contadas até `limit` cada."""
+        return self._missed_queryset(cursor)[:limit].count() + self._sealed_queryset(cursor)[:limit].count()
+
+    @database_sync_to_async
+    def _missed_messages(self, cursor, limit):
+        rows = self._missed_queryset(cursor).values("id", "direction", "content", "timestamp")[:limit]
+        sealed = load_sealed(self._sealed_queryset(cursor).values_list("message_id", "bucket")[:limit])
+        merged = heapq.merge(
+            rows,
+            (message._asdict() for message in sealed),
+            key=lambda row: (row["timestamp"], row["id"]),
+        )
+        return [
+            {
+                "id": str(row["id"]),
+                "direction": row["direction"],
+                "content": row["content"],
+                "timestamp": row["timestamp"].isoformat(),
+            }
+            for row in islice(merged, limit)
+        ]
 
     async def send_message(self, event):
         """
         Recebe um evento com uma mensagem do webhook
         e envia via WebSocket para o frontend.
         """
+        message = event.get("message", {})
+        if not message:
+            logger.warning("Evento recebido sem conteúdo de mensagem válido: %s", event)
+            return
+        if message.get("id") in self._replayed_ids:
+            # já enviada durante a retomada
+            return
+
+        if not self.batching:
+            await self._send_json(message)
+            return
+
+        self._buffer.append(message)
+        if len(self._buffer) >= self.batch_max_messages:
+            await self._flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.batch_window)
+        self._flush_task = None
+        await self._flush()
+
+    async def _flush(self):
+        """Envia todo o buffer em um único frame."""
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+        self._flush_task = None
+
+        batch, self._buffer = self._buffer, []
+        if batch:
+            await self._send_json(batch)
+
+    async def _send_json(self, payload):
         try:
-            message = event.get("message", {})
-            if message:
-                await self.send(text_data=json.dumps(message))
-                print(f"📤 Mensagem enviada via WebSocket na conversa {self.conversation_id}")
-            else:
-                print(f"🚫 Evento recebido sem conteúdo de mensagem válido: {event}")
-        except Exception as e:
-            print(f"❌ Erro ao enviar mensagem para WebSocket: {e}")
+            with timed("serialization"):
+                text = json.dumps(payload)
+            await self.send(text_data=text)
+        except Exception:
+            logger.exception("Erro ao enviar mensagem para WebSocket na conversa %s", self.conversation_id)
+            return
+        if logger.isEnabledFor(logging.DEBUG):
+            count = len(payload) if isinstance(payload, list) else 1
+            logger.debug("%d mensagem(ns) enviada(s) via WebSocket na conversa %s", count, self.conversation_id)
+
+
+def _json_value(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if value is not None and hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+class InboxConsumer(MetricsConsumerMixin, AsyncWebsocketConsumer):
+    """
+    Caixa de entrada multiplexada: uma única conexão acompanha várias
+    conversas, em vez de um ChatConsumer por conversa.
+
+    - `?conversations=<uuid>,<uuid>,...` na URL, ou {"type": "subscribe",
+      "conversations": [...]} / {"type": "unsubscribe", ...} a qualquer momento
+      (até INBOX_MAX_SUBSCRIPTIONS conversas). Cada inscrição responde com
+      {"type": "snapshot", "conversations": [...], "missing": [...]}, o estado
+      atual das conversas, sobre o qual os deltas seguintes se aplicam. Os
+      deltas já contidos no snapshot (posição no log até a dele) são
+      descartados, mesmo os publicados entre a inscrição e a leitura;
+    - `?feed=open` na URL: deltas de todas as conversas (novas, mensagens e
+      fechamentos), para a lista de conversas abertas.
+
+    Os deltas (ver websocket/deltas.py) são combinados por conversa durante
+    INBOX_DELTA_WINDOW_MS milissegundos (ou até INBOX_DELTA_MAX_PENDING
+    conversas) e enviados em um único frame {"type": "deltas",
+    "conversations": [...]}: uma conversa com cem mensagens na janela gera
+    um só delta.
+    """
+
+    async def connect(self):
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.feed = query.get('feed', [''])[0] == 'open'
+        self.subscriptions = set()
+        self.delta_window = getattr(settings, 'INBOX_DELTA_WINDOW_MS', 100) / 1000
+        self.max_pending = getattr(settings, 'INBOX_DELTA_MAX_PENDING', 500)
+        self._pending = {}
+        # posição no log de cada conversa no snapshot enviado
+        self._positions = {}
+        self._flush_task = None
+
+        await self.accept()
+        if self.feed:
+            await self.channel_layer.group_add(INBOX_FEED_GROUP, self.channel_name)
+        conversations = [value for value in query.get('conversations', [''])[0].split(',') if value]
+        if conversations:
+            await self.subscribe(conversations)
+        logger.info("Caixa de entrada conectada (feed: %s, conversas: %d)", self.feed, len(self.subscriptions))
+
+    async def disconnect(self, close_code):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._pending = {}
+        self._positions = {}
+
+        if self.feed:
+            await self.channel_layer.group_discard(INBOX_FEED_GROUP, self.channel_name)
+        else:
+            for conversation_id in self.subscriptions:
+                await self.channel_layer.group_discard(inbox_group_name(conversation_id), self.channel_name)
+
+    async def receive(self, text_data):
+        try:
+            payload = json.loads(text_data)
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict) and isinstance(payload.get("conversations"), list):
+            if payload.get("type") == "subscribe":
+                await self.subscribe(payload["conversations"])
+                return
+            if payload.get("type") == "unsubscribe":
+                await self.unsubscribe(payload["conversations"])
+                return
+        logger.warning("Mensagem inesperada recebida do cliente da caixa de entrada: %s", text_data)
+
+    def _parse_ids(self, values):
+        ids, invalid = [], []
+        for value in values:
+            try:
+                ids.append(str(uuid.UUID(str(value))))
+            except ValueError:
+                invalid.append(value)
+        return ids, invalid
+
+    async def subscribe(self, values):
+        ids, invalid = self._parse_ids(values)
+        new = [conversation_id for conversation_id in dict.fromkeys(ids) if conversation_id not in self.subscriptions]
+        room = max(getattr(settings, 'INBOX_MAX_SUBSCRIPTIONS', 1000) - len(self.subscriptions), 0)
+        if invalid or len(new) > room:
+            await self._send_json({
+                "type": "error",
+                "detail": f"{len(invalid)} ID(s) inválido(s) e {max(len(new) - room, 0)} acima do limite ignorado(s).",
+            })
+        new = new[:room]
+        if not new:
+            return
+
+        # entra nos grupos antes de ler o estado: nenhum delta se perde entre os
+        # dois, e os que o snapshot já contém são descartados pela posição
+        if not self.feed:
+            for conversation_id in new:
+                await self.channel_layer.group_add(inbox_group_name(conversation_id), self.channel_name)
+        self.subscriptions.update(new)
+        conversations = await self._snapshot(new)
+        # conversa ausente: qualquer delta é posterior
+        self._positions.update(dict.fromkeys(new, 0))
+        self._positions.update((conversation["id"], conversation["position"]) for conversation in conversations)
+        # no feed, deltas destas conversas podem ter chegado antes da leitura
+        for conversation_id in new:
+            if conversation_id in self._pending and deltas.covered(self._pending[conversation_id], self._positions):
+                del self._pending[conversation_id]
+        found = {conversation["id"] for conversation in conversations}
+        await self._send_json({
+            "type": "snapshot",
+            "conversations": conversations,
+            "missing": [conversation_id for conversation_id in new if conversation_id not in found],
+        })
+
+    async def unsubscribe(self, values):
+        ids, _ = self._parse_ids(values)
+        for conversation_id in ids:
+            if conversation_id not in self.subscriptions:
+                continue
+            self.subscriptions.discard(conversation_id)
+            self._positions.pop(conversation_id, None)
+            if not self.feed:
+                self._pending.pop(conversation_id, None)
+                await self.channel_layer.group_discard(inbox_group_name(conversation_id), self.channel_name)
+
+    @database_sync_to_async
+    def _snapshot(self, ids):
+        using = read_database()
+        # a posição sai na mesma consulta que o estado: os dois são do mesmo instante
+        position = (
+            LoggedEvent.objects.using(using).filter(conversation_id=OuterRef("id")).order_by("-seq").values("seq")[:1]
+        )
+        fields = (*SNAPSHOT_FIELDS, "position")
+        rows = (
+            Conversation.objects.using(using).filter(id__in=ids)
+            .annotate(position=Subquery(position)).values_list(*fields)
+        )
+        return [
+            {field: _json_value(value) for field, value in zip(fields, row)} | {"position": row[-1] or 0}
+            for row in rows
+        ]
+
+    async def inbox_deltas(self, event):
+        """Recebe deltas publicados pelo webhook e os combina até o próximo envio."""
+        for delta in event.get("deltas", []):
+            if deltas.covered(delta, self._positions):
+                continue
+            if self.feed or delta["id"] in self.subscriptions:
+                deltas.coalesce(self._pending, delta)
+        if len(self._pending) >= self.max_pending:
+            await self._flush()
+        elif self._pending and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delta_window)
+        self._flush_task = None
+        await self._flush()
+
+    async def _flush(self):
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+        self._flush_task = None
+
+        pending, self._pending = self._pending, {}
+        if pending:
+            await self._send_json({"type": "deltas", "conversations": list(pending.values())})
+
+    async def _send_json(self, payload):
+        try:
+            with timed("serialization"):
+                text = json.dumps(payload)
+            await self.send(text_data=text)
+        except Exception:
+            logger.exception("Erro ao enviar deltas da caixa de entrada via WebSocket")
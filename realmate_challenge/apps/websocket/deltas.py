@@ -0,0 +1,111 @@
+"""
+Deltas da caixa de entrada, para o InboxConsumer (ws/inbox/).
+
+Um delta descreve, em JSON compacto, o que mudou em uma conversa:
+
+- conversa criada: {"id", "status": "OPEN", "timestamp"};
+- mensagens novas: {"id", "new_messages", "replied", "received_since_sent",
+  "last_message_at", "last_message": {"id", "direction", "preview"}};
+- fechamento: {"id", "status": "CLOSED"}.
+
+Todo delta traz também "position", a posição no log de eventos
+(eventlog/log.py) do último evento que ele cobre. O snapshot do
+InboxConsumer traz a posição da conversa na mesma leitura, e o consumer
+descarta os deltas com posição até ela: já estão no snapshot.
+
+Deltas da mesma conversa se combinam com merge() (quem escreve junta os de
+um lote; o consumer junta os que chegam dentro da sua janela), e o cliente
+aplica o resultado sobre o que já tem: message_count += new_messages; o
+contador de não lidas vira received_since_sent se houve resposta (replied)
+ou soma received_since_sent se não houve, como em conversation/stats.py.
+
+Os emissores (webhook avulso, assíncrono e em lote) publicam, depois do
+commit, um evento "inbox.deltas" no grupo de cada conversa e um único
+evento com todos os deltas no grupo do feed de conversas abertas.
+"""
+from django.utils.dateparse import parse_datetime
+
+from realmate_challenge.apps.conversation.models import PREVIEW_LENGTH
+
+from .groups import INBOX_FEED_GROUP, inbox_group_name
+
+
+def conversation_opened(conversation_id, timestamp, position):
+    return {"id": str(conversation_id), "position": position, "status": "OPEN", "timestamp": timestamp.isoformat()}
+
+
+def conversation_closed(conversation_id, position):
+    return {"id": str(conversation_id), "position": position, "status": "CLOSED"}
+
+
+def message_added(conversation_id, message_id, direction, content, timestamp, position):
+    return {
+        "id": str(conversation_id),
+        "position": position,
+        "new_messages": 1,
+        "replied": direction == "SENT",
+        "received_since_sent": int(direction == "RECEIVED"),
+        "last_message_at": timestamp.isoformat(),
+        "last_message": {"id": str(message_id), "direction": direction, "preview": content[:PREVIEW_LENGTH]},
+    }
+
+
+def _instant(value):
+    # timestamps sem timezone são comparados como UTC, como no webhook em lote
+    timestamp = parse_datetime(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.replace(tzinfo=None) - timestamp.utcoffset()
+    return timestamp
+
+
+# campos de mensagens, que se acumulam em vez de serem substituídos
+_COMBINED = {"new_messages", "replied", "received_since_sent", "last_message_at", "last_message"}
+
+
+def merge(current, delta):
+    """Combina dois deltas da mesma conversa, o segundo posterior ao primeiro."""
+    if current is None:
+        return dict(delta)
+    merged = {**current, **{key: value for key, value in delta.items() if key not in _COMBINED}}
+    merged["position"] = max(current.get("position", 0), delta.get("position", 0))
+    if "new_messages" in delta:
+        merged["new_messages"] = current.get("new_messages", 0) + delta["new_messages"]
+        if delta["replied"]:
+            merged["replied"] = True
+            merged["received_since_sent"] = delta["received_since_sent"]
+        else:
+            merged["replied"] = current.get("replied", False)
+            merged["received_since_sent"] = current.get("received_since_sent", 0) + delta["received_since_sent"]
+        # o snapshot fica com a mensagem mais recente; no empate, a que veio depois
+        if "last_message_at" not in current or _instant(current["last_message_at"]) <= _instant(delta["last_message_at"]):
+            merged["last_message_at"] = delta["last_message_at"]
+            merged["last_message"] = delta["last_message"]
+    return merged
+
+
+def covered(delta, positions):
+    """Se o delta já está no snapshot enviado ({id da conversa: posição})."""
+    known = positions.get(delta["id"])
+    return known is not None and delta.get("position", 0) <= known
+
+
+def coalesce(pending, delta):
+    """Junta o delta aos pendentes ({id da conversa: delta}), na ordem de chegada."""
+    pending[delta["id"]] = merge(pending.get(delta["id"]), delta)
+
+
+def group_events(deltas):
+    """
+    Eventos do channel layer para uma lista de deltas (uma conversa por
+    delta): [(grupo, evento)], um por conversa e um para o feed.
+    """
+    if not deltas:
+        return []
+    events = [(inbox_group_name(delta["id"]), {"type": "inbox.deltas", "deltas": [delta]}) for delta in deltas]
+    events.append((INBOX_FEED_GROUP, {"type": "inbox.deltas", "deltas": list(deltas)}))
+    return events
+
+
+async def publish(channel_layer, deltas):
+    for group, event in group_events(deltas):
+        await channel_layer.group_send(group, event)
@@ -0,0 +1,17 @@
+def conversation_group_name(conversation_id):
+    """
+    Nome do grupo do channel layer de uma conversa.
+
+    Com o channels_redis o nome do grupo também define o shard (hash
+    consistente), então todos os emissores devem usar esta função.
+    """
+    return f"conversation_{conversation_id}"
+
+
+# feed de todas as conversas (ver InboxConsumer)
+INBOX_FEED_GROUP = "inbox_open"
+
+
+def inbox_group_name(conversation_id):
+    """Grupo dos deltas de uma conversa para o InboxConsumer (ver websocket/deltas.py)."""
+    return f"inbox_{conversation_id}"
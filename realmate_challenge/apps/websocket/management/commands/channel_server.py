@@ -0,0 +1,32 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from realmate_challenge.apps.websocket.standin import StandInRedisServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Sobe o servidor pub/sub substituto do Redis para testar o channel layer '
+        'entre vários processos daphne sem serviços externos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=6379)
+
+    def handle(self, *args, **options):
+        server = StandInRedisServer(options['host'], options['port'])
+
+        async def run():
+            await server.start()
+            self.stdout.write(self.style.SUCCESS(
+                f'Servidor pub/sub ouvindo em {server.url}\n'
+                f'Use CHANNEL_LAYER_HOSTS={server.url} nos workers daphne.'
+            ))
+            await server.serve_forever()
+
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            self.stdout.write('Servidor encerrado.')
@@ -0,0 +1,213 @@
+"""
+Servidor substituto do Redis, embutido, para o channel layer de pub/sub.
+
+Implementa apenas o subconjunto do protocolo Redis (RESP2 e RESP3) usado
+pelo channels_redis.pubsub.RedisPubSubChannelLayer (PUBLISH, SUBSCRIBE,
+UNSUBSCRIBE e o handshake do redis-py), o que basta para testar o fan-out
+entre vários processos daphne em uma única máquina, sem serviços externos.
+Não persiste nada e não substitui um Redis de verdade em produção.
+"""
+import asyncio
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+def _bulk(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, str):
+        value = value.encode()
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _array(*items):
+    return b"*%d\r\n" % len(items) + b"".join(items)
+
+
+def _push(client, *items):
+    # no RESP3 as mensagens de pub/sub são do tipo push (">")
+    marker = b">" if client.protocol == 3 else b"*"
+    return marker + b"%d\r\n" % len(items) + b"".join(items)
+
+
+def _integer(value):
+    return b":%d\r\n" % value
+
+
+class _Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.channels = set()
+        self.protocol = 2
+
+    async def read_command(self):
+        """Lê um comando (array RESP ou comando inline). Retorna None no EOF."""
+        line = await self.reader.readline()
+        if not line:
+            return None
+        line = line.rstrip(b"\r\n")
+        if not line.startswith(b"*"):
+            return line.split()
+
+        args = []
+        for _ in range(int(line[1:])):
+            header = await self.reader.readline()
+            if not header.startswith(b"$"):
+                raise ValueError(f"Esperado bulk string, recebido {header!r}")
+            length = int(header[1:])
+            data = await self.reader.readexactly(length + 2)
+            args.append(data[:-2])
+        return args
+
+
+class StandInRedisServer:
+    """
+    Servidor pub/sub compatível com Redis.
+
+    Uso em processo (ex.: testes):
+        server = StandInRedisServer(port=0)
+        server.start_in_thread()
+        ... hosts = [server.url] ...
+        server.stop()
+    """
+
+    def __init__(self, host="127.0.0.1", port=6379):
+        self.host = host
+        self.port = port
+        self._subscribers = {}
+        self._server = None
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self):
+        return f"redis://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        # porta 0 = porta livre escolhida pelo sistema
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start_in_thread(self):
+        """Sobe o servidor em uma thread daemon com seu próprio event loop."""
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start())
+            self._ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._shutdown())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="standin-redis", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    async def _shutdown(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle_client(self, reader, writer):
+        client = _Client(reader, writer)
+        try:
+            while True:
+                command = await client.read_command()
+                if command is None:
+                    break
+                if not command:
+                    continue
+                reply = self._dispatch(client, command)
+                if reply is None:
+                    break
+                writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.debug("Conexão encerrada: %s", e)
+        finally:
+            self._unsubscribe(client, list(client.channels))
+            writer.close()
+
+    def _dispatch(self, client, command):
+        name = command[0].decode().upper()
+        args = command[1:]
+
+        match name:
+            case "HELLO":
+                if args:
+                    client.protocol = int(args[0])
+                info = [
+                    _bulk("server"), _bulk("redis"),
+                    _bulk("version"), _bulk("7.0.0"),
+                    _bulk("proto"), _integer(client.protocol),
+                    _bulk("mode"), _bulk("standalone"),
+                    _bulk("role"), _bulk("master"),
+                ]
+                if client.protocol == 3:
+                    return b"%%%d\r\n" % (len(info) // 2) + b"".join(info)
+                return _array(*info)
+            case "PING":
+                if client.channels and client.protocol == 2:
+                    return _array(_bulk("pong"), _bulk(args[0] if args else b""))
+                return _bulk(args[0]) if args else b"+PONG\r\n"
+            case "ECHO":
+                return _bulk(args[0])
+            case "CLIENT" | "SELECT":
+                return b"+OK\r\n"
+            case "QUIT":
+                client.writer.write(b"+OK\r\n")
+                return None
+            case "PUBLISH":
+                return _integer(self._publish(args[0], args[1]))
+            case "SUBSCRIBE":
+                return b"".join(self._subscribe(client, args))
+            case "UNSUBSCRIBE":
+                return b"".join(self._unsubscribe(client, args or list(client.channels)))
+            case _:
+                return f"-ERR unknown command '{name}'\r\n".encode()
+
+    def _publish(self, channel, payload):
+        subscribers = self._subscribers.get(channel, ())
+        for subscriber in subscribers:
+            subscriber.writer.write(_push(subscriber, _bulk("message"), _bulk(channel), _bulk(payload)))
+        return len(subscribers)
+
+    def _subscribe(self, client, channels):
+        replies = []
+        for channel in channels:
+            self._subscribers.setdefault(channel, set()).add(client)
+            client.channels.add(channel)
+            replies.append(_push(client, _bulk("subscribe"), _bulk(channel), _integer(len(client.channels))))
+        return replies
+
+    def _unsubscribe(self, client, channels):
+        if not channels:
+            return [_push(client, _bulk("unsubscribe"), _bulk(None), _integer(0))]
+        replies = []
+        for channel in channels:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self._subscribers[channel]
+            client.channels.discard(channel)
+            replies.append(_push(client, _bulk("unsubscribe"), _bulk(channel), _integer(len(client.channels))))
+        return replies
@@ -0,0 +1,30 @@
+"""
+Medições compartilhadas pelos comandos de benchmark e replay.
+
+percentiles() resume latências por requisição/consulta (benchmark_webhook,
+replay_webhook_events, benchmark_message_search); best_of() mede etapas
+inteiras, ficando com a melhor de várias execuções
+(benchmark_message_serialization).
+"""
+import statistics
+import time
+
+
+def percentiles(latencies):
+    """Retorna (p50, p99, máximo) em milissegundos."""
+    if len(latencies) < 2:
+        value = latencies[0] * 1000 if latencies else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return cuts[49] * 1000, cuts[98] * 1000, max(latencies) * 1000
+
+
+def best_of(repeat, function):
+    """Executa a função `repeat` vezes e devolve (melhor tempo em segundos, último resultado)."""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
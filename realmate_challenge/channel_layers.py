@@ -0,0 +1,61 @@
+"""
+Configuração do channel layer.
+
+Sem hosts configurados, usa o InMemoryChannelLayer (um único processo).
+Com hosts, usa o channels_redis (extra opcional: `poetry install --extras
+redis`). Os grupos `conversation_{id}` são distribuídos entre os hosts por
+hash consistente do nome do grupo, então cada conversa fica sempre no mesmo
+shard.
+
+- flavor "pubsub": RedisPubSubChannelLayer; também funciona com o servidor
+  substituto embutido (`python manage.py channel_server`).
+- flavor "core": RedisChannelLayer, com capacity/expiry aplicados no Redis.
+"""
+
+IN_MEMORY_BACKEND = "channels.layers.InMemoryChannelLayer"
+
+CHANNEL_LAYER_BACKENDS = {
+    "pubsub": "channels_redis.pubsub.RedisPubSubChannelLayer",
+    "core": "channels_redis.core.RedisChannelLayer",
+}
+
+
+def channel_layers(hosts=None, flavor="pubsub", prefix="realmate", capacity=100, expiry=60, group_expiry=86400):
+    """Monta o dicionário CHANNEL_LAYERS a partir da lista de hosts (URLs redis://)."""
+    if not hosts:
+        return {
+            "default": {
+                "BACKEND": IN_MEMORY_BACKEND,
+                "CONFIG": {
+                    "capacity": capacity,
+                    "expiry": expiry,
+                    "group_expiry": group_expiry,
+                },
+            }
+        }
+
+    if flavor not in CHANNEL_LAYER_BACKENDS:
+        raise ValueError(f"Channel layer desconhecido: {flavor!r} (opções: {', '.join(CHANNEL_LAYER_BACKENDS)})")
+
+    config = {"hosts": list(hosts), "prefix": prefix}
+    if flavor == "core":
+        # o pub/sub entrega direto aos inscritos e não tem filas para limitar/expirar
+        config.update({
+            "capacity": capacity,
+            "expiry": expiry,
+            "group_expiry": group_expiry,
+        })
+    return {
+        "default": {
+            "BACKEND": CHANNEL_LAYER_BACKENDS[flavor],
+            "CONFIG": config,
+        }
+    }
+
+
+def is_in_memory(layers, alias="default"):
+    """
+    Se o layer fica na memória do processo: o que for publicado nele só
+    chega aos consumers do mesmo processo.
+    """
+    return layers[alias]["BACKEND"] == IN_MEMORY_BACKEND
@@ -0,0 +1,177 @@
+"""
+Perfis de configuração do SQLite.
+
+O perfil "production" liga WAL, synchronous=NORMAL, mmap e cache maiores,
+busy timeout e conexões persistentes. Os PRAGMAs são aplicados a cada nova
+conexão pelo hook de connection_created (ver ConversationConfig.ready).
+
+Além do banco "default", é declarado o alias somente leitura READ_ONLY_ALIAS,
+que aponta para o mesmo arquivo com PRAGMA query_only. As leituras das views
+de listagem/detalhe são direcionadas a ele com read_database().
+
+temporary_database() cria um banco descartável em arquivo para os comandos
+de benchmark e replay, com os dois aliases apontando para ele.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+READ_ONLY_ALIAS = "readonly"
+
+SQLITE_PROFILES = {
+    "default": {
+        "CONN_MAX_AGE": 0,
+        "OPTIONS": {},
+        "PRAGMAS": {},
+    },
+    "production": {
+        "CONN_MAX_AGE": 60,
+        "OPTIONS": {
+            # busy timeout (segundos) do driver sqlite3
+            "timeout": 20,
+            # pega o lock de escrita no BEGIN e evita "database is locked" no upgrade da transação
+            "transaction_mode": "IMMEDIATE",
+        },
+        "PRAGMAS": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 20000,
+            "mmap_size": 256 * 1024 * 1024,
+            # valor negativo = tamanho em KiB
+            "cache_size": -64 * 1024,
+            "temp_store": "MEMORY",
+        },
+    },
+}
+
+
+def sqlite_databases(name, profile="default", mmap_size=None, cache_size=None, conn_max_age=None):
+    """
+    Monta o dicionário DATABASES com o alias padrão e o alias somente leitura
+    para o arquivo `name`, usando o perfil informado.
+    """
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Perfil de banco desconhecido: {profile!r} (opções: {', '.join(SQLITE_PROFILES)})")
+
+    config = SQLITE_PROFILES[profile]
+    pragmas = dict(config["PRAGMAS"])
+    if mmap_size is not None:
+        pragmas["mmap_size"] = mmap_size
+    if cache_size is not None:
+        pragmas["cache_size"] = cache_size
+
+    default = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": name,
+        "CONN_MAX_AGE": config["CONN_MAX_AGE"] if conn_max_age is None else conn_max_age,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": dict(config["OPTIONS"]),
+        "PRAGMAS": pragmas,
+    }
+    read_only = {
+        **default,
+        "OPTIONS": {key: value for key, value in default["OPTIONS"].items() if key != "transaction_mode"},
+        "PRAGMAS": {**pragmas, "query_only": "ON"},
+        "TEST": {"MIRROR": "default"},
+    }
+    return {"default": default, READ_ONLY_ALIAS: read_only}
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """Hook de connection_created: aplica os PRAGMAs configurados para o alias."""
+    if connection.vendor != "sqlite":
+        return
+    pragmas = connection.settings_dict.get("PRAGMAS") or {}
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+
+
+def read_database():
+    """Alias a ser usado nas leituras das views (somente leitura, se configurado)."""
+    from django.db import connections, DEFAULT_DB_ALIAS
+
+    if READ_ONLY_ALIAS not in connections:
+        return DEFAULT_DB_ALIAS
+    # Banco em memória (ex.: testes, onde o alias é espelho do default) não é
+    # compartilhável entre conexões: uma segunda conexão não enxergaria a
+    # transação em andamento, então a leitura fica na conexão principal.
+    default = connections[DEFAULT_DB_ALIAS]
+    if default.vendor == "sqlite" and default.is_in_memory_db():
+        return DEFAULT_DB_ALIAS
+    return READ_ONLY_ALIAS
+
+
+@contextmanager
+def temporary_database(prefix):
+    """
+    Cria um banco de teste em arquivo (e não em memória), com as migrações
+    aplicadas, para que várias threads compartilhem os mesmos dados como no
+    servidor real. O alias somente leitura passa a ler o mesmo arquivo, como
+    o espelho dos testes. O banco é apagado na saída.
+    """
+    from django.db import connections, DEFAULT_DB_ALIAS
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    connection = connections[DEFAULT_DB_ALIAS]
+    old_name = connection.settings_dict["NAME"]
+    fd, test_name = tempfile.mkstemp(suffix=".sqlite3", prefix=prefix)
+    os.close(fd)
+    connection.settings_dict.setdefault("TEST", {})["NAME"] = test_name
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    mirror = connections[READ_ONLY_ALIAS] if READ_ONLY_ALIAS in connections else None
+    if mirror is not None:
+        mirror.close()
+        mirror_name = mirror.settings_dict["NAME"]
+        mirror.settings_dict["NAME"] = test_name
+    try:
+        yield test_name
+    finally:
+        if mirror is not None:
+            mirror.close()
+            mirror.settings_dict["NAME"] = mirror_name
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        if os.path.exists(test_name):
+            os.remove(test_name)
+
+
+def estimated_row_count(model, using="default", windows=8, window=256):
+    """
+    Estimativa barata do número de linhas da tabela do modelo, no SQLite: a
+    distância entre o menor e o maior rowid (lidos nas pontas da B-tree, sem
+    percorrer a tabela) vezes a densidade de linhas em `windows` faixas de
+    `window` rowids espalhadas pelo intervalo. Assim os buracos deixados pelo
+    arquivamento e pelas partições, que apagam linhas no meio do intervalo,
+    descontam a estimativa em vez de virar páginas vazias; cada faixa é uma
+    leitura limitada pela chave primária. Devolve None fora do SQLite.
+    """
+    from django.db import connections
+
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return None
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        # subconsultas separadas: o SQLite só otimiza MIN/MAX isolados
+        cursor.execute(f"SELECT (SELECT MIN(rowid) FROM {table}), (SELECT MAX(rowid) FROM {table})")
+        low, high = cursor.fetchone()
+        if low is None:
+            return 0
+        span = high - low + 1
+        if span <= windows * window:
+            return span
+        step = (span - window) // (windows - 1)
+        starts = [low + index * step for index in range(windows)]
+        cursor.execute(
+            "SELECT " + " + ".join(
+                f"(SELECT COUNT(*) FROM {table} WHERE rowid BETWEEN %s AND %s)" for _ in starts
+            ),
+            [bound for start in starts for bound in (start, start + window - 1)],
+        )
+        (sampled,) = cursor.fetchone()
+    return round(span * sampled / (windows * window))
@@ -0,0 +1,355 @@
+"""
+Métricas de desempenho por rota HTTP e por evento de WebSocket.
+
+MetricsMiddleware (HTTP) e MetricsConsumerMixin (consumers do Channels)
+abrem um RequestStats no início de cada requisição/evento e, no fim,
+registram no REGISTRY:
+
+- a latência total (realmate_request_duration_seconds);
+- quantas consultas SQL foram feitas e o tempo gasto nelas
+  (realmate_db_queries / realmate_db_query_seconds), medidos pelo
+  execute_wrapper instalado em cada conexão (ver record_query);
+- o tempo de serialização (realmate_serialization_seconds), medido com
+  timed("serialization") no FastJSONRenderer e no envio do ChatConsumer;
+- o tempo de envio ao channel layer (realmate_channel_send_seconds),
+  medido com timed("channel_send") em volta dos group_send.
+
+Os rótulos são transport ("http" ou "websocket") e route (a rota do
+resolver, ex. "conversations/<pk>/", ou "Consumer:tipo.do.evento").
+
+Requisições cujo número de consultas sugere N+1 (a mesma consulta repetida
+METRICS_N_PLUS_ONE_REPEATS vezes ou mais, ou mais de METRICS_QUERY_BUDGET
+consultas no total) incrementam realmate_n_plus_one_total e geram um
+aviso no log com a consulta repetida.
+
+Os apps podem registrar métricas próprias com REGISTRY.register e
+gauges calculados na hora da coleta com REGISTRY.add_collector (ex.: atraso
+do inbox do webhook, ver apps/webhook/apps.py).
+
+O endpoint /metrics/ (metrics_view) expõe tudo no formato texto do
+Prometheus, só para os IPs de METRICS_ALLOWED_IPS ou com o bearer token
+METRICS_TOKEN: as séries revelam as rotas e o atraso do inbox, e os
+coletores consultam o banco a cada coleta. O registro é por processo: com
+vários workers, cada um expõe as próprias séries e o Prometheus as agrega
+pelo rótulo instance.
+"""
+import hmac
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+# limites dos histogramas de tempo (segundos) e de contagem de consultas
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LABELS = ("transport", "route")
+
+METRICS = {
+    # nome: (tipo, ajuda, limites do histograma, rótulos)
+    "realmate_request_duration_seconds": (
+        "histogram", "Latência das requisições HTTP e dos eventos de WebSocket.", TIME_BUCKETS, LABELS),
+    "realmate_db_queries": (
+        "histogram", "Consultas SQL por requisição ou evento.", QUERY_BUCKETS, LABELS),
+    "realmate_db_query_seconds": (
+        "histogram", "Tempo total em consultas SQL por requisição ou evento.", TIME_BUCKETS, LABELS),
+    "realmate_serialization_seconds": (
+        "histogram", "Tempo de serialização (JSON) por requisição ou evento.", TIME_BUCKETS, LABELS),
+    "realmate_channel_send_seconds": (
+        "histogram", "Tempo de cada envio ao channel layer.", TIME_BUCKETS, LABELS),
+    "realmate_requests_total": (
+        "counter", "Requisições HTTP por status.", None, LABELS + ("status",)),
+    "realmate_n_plus_one_total": (
+        "counter", "Requisições ou eventos com indício de N+1.", None, LABELS),
+}
+
+
+class Registry:
+    """Histogramas, contadores e gauges em memória, protegidos por um lock."""
+
+    def __init__(self, metrics):
+        self.metrics = dict(metrics)
+        self.collectors = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def register(self, name, kind, help_text, buckets=None, labels=()):
+        self.metrics[name] = (kind, help_text, buckets, labels)
+
+    def add_collector(self, collector):
+        """collector(registry) é chamado antes de cada render() para atualizar gauges."""
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def reset(self):
+        with self._lock:
+            # histogramas: {(nome, rótulos): [contagens por limite..., soma, total]}
+            self._series = {}
+
+    def observe(self, name, labels, value):
+        kind, _, buckets, _ = self.metrics[name]
+        key = (name, labels)
+        with self._lock:
+            if kind == "counter":
+                self._series[key] = self._series.get(key, 0) + value
+                return
+            if kind == "gauge":
+                self._series[key] = value
+                return
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(buckets) + [0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def inc(self, name, labels, amount=1):
+        self.observe(name, labels, amount)
+
+    def set(self, name, labels, value):
+        self.observe(name, labels, value)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(value) if isinstance(value, list) else value for key, value in self._series.items()}
+
+    def render(self):
+        """Todas as séries no formato texto de exposição do Prometheus."""
+        for collector in self.collectors:
+            try:
+                collector(self)
+            except Exception:
+                logger.exception("Falha ao coletar métricas em %r", collector)
+        series = self.snapshot()
+        lines = []
+        for name, (kind, help_text, buckets, label_names) in self.metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (series_name, labels), value in sorted(series.items(), key=lambda item: item[0]):
+                if series_name != name:
+                    continue
+                pairs = [f'{label}="{_escape(text)}"' for label, text in zip(label_names, labels)]
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+                    continue
+                for bound, count in zip(buckets, value):
+                    lines.append(f"{name}_bucket{_labels(pairs, _number(bound))} {count}")
+                lines.append(f"{name}_bucket{_labels(pairs, '+Inf')} {value[-1]}")
+                lines.append(f"{name}_sum{_labels(pairs)} {_number(value[-2])}")
+                lines.append(f"{name}_count{_labels(pairs)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(pairs, le=None):
+    if le is not None:
+        pairs = pairs + [f'le="{le}"']
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = Registry(METRICS)
+
+
+class RequestStats:
+    """Medições de uma requisição HTTP ou de um evento de WebSocket."""
+
+    __slots__ = ("labels", "started", "queries", "query_time", "statements", "timings")
+
+    def __init__(self, transport, route):
+        self.labels = (transport, route)
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.statements = Counter()
+        self.timings = {}
+
+    def finish(self):
+        """Registra as medições no REGISTRY e verifica o indício de N+1."""
+        REGISTRY.observe("realmate_request_duration_seconds", self.labels, time.perf_counter() - self.started)
+        REGISTRY.observe("realmate_db_queries", self.labels, self.queries)
+        REGISTRY.observe("realmate_db_query_seconds", self.labels, self.query_time)
+        REGISTRY.observe("realmate_serialization_seconds", self.labels, self.timings.get("serialization", 0.0))
+        self.check_n_plus_one()
+
+    def check_n_plus_one(self):
+        if not self.statements:
+            return False
+        sql, repeats = self.statements.most_common(1)[0]
+        min_repeats = getattr(settings, "METRICS_N_PLUS_ONE_REPEATS", 10)
+        budget = getattr(settings, "METRICS_QUERY_BUDGET", 50)
+        if repeats < min_repeats and self.queries <= budget:
+            return False
+        REGISTRY.inc("realmate_n_plus_one_total", self.labels)
+        logger.warning(
+            "Possível N+1 em %s %s: %d consultas, a mais repetida %d vezes: %s",
+            *self.labels, self.queries, repeats, sql,
+        )
+        return True
+
+
+_current = ContextVar("realmate_request_stats", default=None)
+
+
+def current_stats():
+    return _current.get()
+
+
+@contextmanager
+def collect(transport, route):
+    """Abre um RequestStats para o bloco e o registra ao sair."""
+    stats = RequestStats(transport, route)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        stats.finish()
+
+
+@contextmanager
+def timed(kind):
+    """
+    Soma o tempo do bloco a `kind` na requisição/evento corrente.
+    channel_send é registrado a cada envio (o fan-out em segundo plano
+    termina depois da resposta); fora de uma requisição não mede nada.
+    """
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.timings[kind] = stats.timings.get(kind, 0.0) + elapsed
+        if kind == "channel_send":
+            REGISTRY.observe("realmate_channel_send_seconds", stats.labels, elapsed)
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper que conta e cronometra as consultas da requisição corrente."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.query_time += time.perf_counter() - start
+        stats.queries += 1
+        # o SQL do ORM já vem com placeholders: consultas iguais com ids diferentes se agrupam
+        stats.statements[sql] += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """Hook de connection_created: instala record_query na conexão (uma vez por wrapper)."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+_REGEX_GROUP = re.compile(r"\(\?P<(\w+)>[^)]*\)")
+
+
+def route_label(request):
+    """
+    Rota do resolver, sem o valor dos parâmetros. As rotas em regex do
+    DefaultRouter viram o mesmo formato das de path():
+    "^conversations/(?P<pk>[^/.]+)/$" -> "conversations/<pk>/".
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return _REGEX_GROUP.sub(r"<\1>", match.route).lstrip("^").rstrip("$").replace("\\.", ".")
+
+
+class MetricsMiddleware:
+    """Mede cada requisição HTTP por rota (síncrono e assíncrono)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with collect("http", "unmatched") as stats:
+            response = self.get_response(request)
+            self._label(stats, request, response)
+        return response
+
+    async def __acall__(self, request):
+        with collect("http", "unmatched") as stats:
+            response = await self.get_response(request)
+            self._label(stats, request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # a rota só é conhecida depois da resolução da URL; rotular aqui vale
+        # também para o que for medido durante a view (ex.: channel_send)
+        stats = _current.get()
+        if stats is not None:
+            stats.labels = ("http", route_label(request))
+
+    def _label(self, stats, request, response):
+        stats.labels = ("http", route_label(request))
+        REGISTRY.inc("realmate_requests_total", stats.labels + (str(response.status_code),))
+
+
+class MetricsConsumerMixin:
+    """
+    Mede cada evento tratado por um consumer do Channels (conexão,
+    mensagens do cliente, eventos do grupo), rotulado como
+    "NomeDoConsumer:tipo.do.evento".
+    """
+
+    async def dispatch(self, message):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            return await super().dispatch(message)
+        with collect("websocket", f"{type(self).__name__}:{message.get('type', '')}"):
+            return await super().dispatch(message)
+
+
+def metrics_allowed(request):
+    """Se a requisição vem de um IP liberado ou traz o bearer token das métricas."""
+    if request.META.get("REMOTE_ADDR") in getattr(settings, "METRICS_ALLOWED_IPS", ()):
+        return True
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+
+
+def metrics_view(request):
+    """Exposição das métricas no formato texto do Prometheus."""
+    # recusado antes de coletar: os coletores consultam o banco
+    if not metrics_allowed(request):
+        return HttpResponseForbidden("Acesso às métricas não permitido.")
+    return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
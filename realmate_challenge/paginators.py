@@ -0,0 +1,52 @@
+"""
+Paginação das listagens do admin sem COUNT(*) completo.
+
+O ChangeList do admin conta o queryset a cada página. Nas tabelas grandes
+(mensagens, conversas) isso percorre a tabela inteira; EstimatedCountPaginator
+troca a contagem por:
+
+- sem filtros nem busca: a estimativa de database.estimated_row_count (ou a
+  contagem exata, se a tabela for pequena). Ela desconta os buracos por
+  amostragem, mas ainda pode passar do total: uma página além da última
+  linha sai vazia, e aí o paginador conta de verdade (só nesse caso) e
+  mostra a última página real;
+- com filtros: a contagem limitada a ADMIN_COUNT_LIMIT linhas; acima disso a
+  paginação mostra ADMIN_COUNT_LIMIT + 1 e o usuário refina o filtro.
+
+Usado junto com show_full_result_count = False, que elimina o segundo COUNT
+do total sem filtros.
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+from .database import estimated_row_count
+
+
+class EstimatedCountPaginator(Paginator):
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        limit = settings.ADMIN_COUNT_LIMIT
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                self.estimated = True
+                return estimate
+            return queryset.count()
+        return queryset.order_by()[:limit + 1].count()
+
+    def page(self, number):
+        page = super().page(number)
+        if self.estimated and page.number > 1 and not page.object_list:
+            # a estimativa passou do fim: troca pelo total exato
+            self.estimated = False
+            self.__dict__['count'] = self.object_list.count()
+            self.__dict__.pop('num_pages', None)
+            page = super().page(min(page.number, self.num_pages))
+        return page
@@ -0,0 +1,47 @@
+"""
+Renderer JSON das leituras quentes (listagem de mensagens e detalhe da conversa).
+
+Produz exatamente os mesmos bytes do JSONRenderer do DRF (compacto, UTF-8,
+U+2028/U+2029 escapados), mas com um codificador montado uma única vez por
+processo (o DRF cria um renderer por requisição) em vez de um por resposta.
+O JSONEncoder não guarda estado entre chamadas de encode(), então é
+compartilhado entre threads. Com os serializadores de tuplas (ver
+message/serializers.py) os valores já chegam como str/int/None e o
+codificador em C do json não precisa chamar o default() do DRF.
+Respostas indentadas (?indent= / API navegável) seguem pelo JSONRenderer.
+"""
+from functools import cache
+
+from rest_framework.compat import LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import JSONRenderer
+
+from realmate_challenge.metrics import timed
+
+
+@cache
+def _encoder(encoder_class, ensure_ascii, allow_nan, separators):
+    return encoder_class(ensure_ascii=ensure_ascii, allow_nan=allow_nan, separators=separators)
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    @property
+    def encoder(self):
+        return _encoder(
+            self.encoder_class,
+            self.ensure_ascii,
+            not self.strict,
+            SHORT_SEPARATORS if self.compact else LONG_SEPARATORS,
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with timed('serialization'):
+            if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+                return super().render(data, accepted_media_type, renderer_context)
+
+            ret = self.encoder.encode(data)
+            if '\u2028' in ret or '\u2029' in ret:
+                ret = ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+            return ret.encode()
@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from realmate_challenge.channel_layers import channel_layers
+from realmate_challenge.database import sqlite_databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -29,6 +33,11 @@ ALLOWED_HOSTS = []
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # mesmo JSON do JSONRenderer, com o codificador montado uma vez (ver renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'realmate_challenge.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 # Application definition
 
@@ -44,9 +53,15 @@ INSTALLED_APPS = [
     'rest_framework',
     'realmate_challenge.apps.conversation',
     'realmate_challenge.apps.message',
+    'realmate_challenge.apps.websocket',
+    'realmate_challenge.apps.webhook',
+    'realmate_challenge.apps.archive',
+    'realmate_challenge.apps.eventlog',
 ]
 
 MIDDLEWARE = [
+    # primeiro da lista: a latência medida inclui os demais middlewares
+    'realmate_challenge.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,8 +77,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / "realmate_challenge" / "templates"],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # templates compilados uma vez por processo e reaproveitados (os
+            # fragmentos da rolagem infinita são renderizados a cada página)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -79,21 +101,140 @@ STATICFILES_DIRS = [
 WSGI_APPLICATION = 'realmate_challenge.wsgi.application'
 ASGI_APPLICATION = "realmate_challenge.asgi.application"
 
-# alterar em caso de aplicação real
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+# Sem CHANNEL_LAYER_HOSTS o layer fica em memória (um único processo).
+# Para vários workers daphne, informe URLs redis:// separadas por vírgula
+# (ver realmate_challenge/channel_layers.py e o comando channel_server).
+CHANNEL_LAYERS = channel_layers(
+    hosts=[host for host in os.environ.get('CHANNEL_LAYER_HOSTS', '').split(',') if host],
+    flavor=os.environ.get('CHANNEL_LAYER_FLAVOR', 'pubsub'),
+    capacity=int(os.environ.get('CHANNEL_LAYER_CAPACITY', 100)),
+    expiry=int(os.environ.get('CHANNEL_LAYER_EXPIRY', 60)),
+    group_expiry=int(os.environ.get('CHANNEL_LAYER_GROUP_EXPIRY', 86400)),
+)
+
+# Entrega em lote no ChatConsumer (opcional, ?batch=1 no WebSocket):
+# janela de acúmulo em milissegundos e tamanho máximo do lote
+CHAT_BATCH_WINDOW_MS = 20
+CHAT_BATCH_MAX_MESSAGES = 50
+
+# Retomada após reconexão (?last_id= ou ?since= no WebSocket): tamanho de cada
+# bloco lido do banco e máximo de mensagens antes de pedir recarga completa
+CHAT_RESUME_CHUNK_SIZE = 200
+CHAT_RESUME_MAX_MESSAGES = 5000
+
+# Caixa de entrada multiplexada (ws/inbox/, ver InboxConsumer): janela em que
+# os deltas de cada conversa são combinados, conversas pendentes que forçam o
+# envio antes do fim da janela e limite de conversas por conexão
+INBOX_DELTA_WINDOW_MS = 100
+INBOX_DELTA_MAX_PENDING = 500
+INBOX_MAX_SUBSCRIPTIONS = 1000
+
+# Quantidade máxima de eventos aceitos em uma única chamada em lote do webhook
+WEBHOOK_BATCH_MAX_EVENTS = 5000
+
+# Idempotência das reentregas do webhook (ver apps/webhook/idempotency.py):
+# validade das chaves em segundos, tamanho do LRU em memória e intervalo
+# da limpeza automática das chaves expiradas
+WEBHOOK_IDEMPOTENCY_TTL = 86400
+WEBHOOK_IDEMPOTENCY_CACHE_SIZE = 10000
+WEBHOOK_IDEMPOTENCY_PURGE_INTERVAL = 300
+
+# Inbox do webhook/inbox/ (ver apps/webhook/inbox.py e o comando
+# process_webhook_inbox): workers e eventos por lote, arrendamento de um lote
+# em segundos, espera entre consultas com o inbox vazio, e novas tentativas
+# (espera exponencial de RETRY_BASE até RETRY_MAX segundos) antes do dead-letter
+WEBHOOK_INBOX_WORKERS = 2
+WEBHOOK_INBOX_BATCH_SIZE = 200
+WEBHOOK_INBOX_LEASE = 60
+WEBHOOK_INBOX_POLL_INTERVAL = 0.5
+WEBHOOK_INBOX_MAX_ATTEMPTS = 8
+WEBHOOK_INBOX_RETRY_BASE = 1
+WEBHOOK_INBOX_RETRY_MAX = 300
+
+# Fila de escrita por conversa (ver apps/conversation/write_queue.py): com
+# CONVERSATION_WRITE_SHARDS > 0 as escritas de cada conversa são aplicadas
+# em ordem por uma thread do shard, até CONVERSATION_WRITE_GROUP_SIZE por
+# transação (esperando até CONVERSATION_WRITE_GROUP_WAIT_MS por mais
+# escritas); 0 escreve na thread da requisição. O SQLite tem um único
+# escritor, então com ele um shard basta (é o padrão do perfil production)
+CONVERSATION_WRITE_SHARDS = int(os.environ.get(
+    'CONVERSATION_WRITE_SHARDS', 1 if os.environ.get('DATABASE_PROFILE') == 'production' else 0
+))
+CONVERSATION_WRITE_GROUP_SIZE = 32
+CONVERSATION_WRITE_GROUP_WAIT_MS = 0
+CONVERSATION_WRITE_QUEUE_SIZE = 1000
+
+# Cache do Django: em memória por processo; com CACHE_REDIS_URL é
+# compartilhado entre os workers (e as invalidações valem para todos)
+if os.environ.get('CACHE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_REDIS_URL'],
+        }
     }
-}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'realmate',
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000))},
+        }
+    }
+
+# Cache das leituras de conversa (ver apps/conversation/cache.py): alias em
+# CACHES e validade das entradas em segundos (conversas fechadas não mudam)
+CONVERSATION_CACHE_ALIAS = 'default'
+CONVERSATION_CACHE_TTL = 300
+CONVERSATION_CACHE_CLOSED_TTL = 7 * 24 * 3600
+
+# Arquivamento (ver apps/archive/storage.py): conversas CLOSED sem mensagens
+# há mais de ARCHIVE_AFTER_DAYS dias saem das tabelas quentes com o comando
+# archive_conversations; nível de compressão do zlib (1 a 9) dos blobs
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_COMPRESSION_LEVEL = 6
+
+# Partições mensais das mensagens (ver apps/message/partitions.py): diretório
+# dos arquivos selados e quantos meses (incluindo o atual) ficam na tabela
+# quente quando o comando seal_message_partitions roda
+MESSAGE_PARTITION_DIR = os.environ.get('MESSAGE_PARTITION_DIR', str(BASE_DIR / 'partitions'))
+MESSAGE_PARTITION_KEEP_MONTHS = 1
+
+# Listagens do admin (ver realmate_challenge/paginators.py): acima de
+# ADMIN_COUNT_LIMIT linhas o total das páginas é estimado (sem filtros) ou
+# truncado (com filtros) em vez de contado com COUNT(*) completo
+ADMIN_COUNT_LIMIT = 10_000
+
+# Mensagens por página no inline da página de uma conversa no admin
+ADMIN_MESSAGE_INLINE_PER_PAGE = 50
+
+# Métricas de desempenho (ver realmate_challenge/metrics.py), expostas em
+# /metrics/: uma requisição ou evento de WebSocket é marcado como possível
+# N+1 quando a mesma consulta se repete METRICS_N_PLUS_ONE_REPEATS vezes ou
+# quando faz mais de METRICS_QUERY_BUDGET consultas no total
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+METRICS_N_PLUS_ONE_REPEATS = 10
+METRICS_QUERY_BUDGET = 50
+# Quem pode ler /metrics/: os IPs de METRICS_ALLOWED_IPS (REMOTE_ADDR; atrás
+# de um proxy, o do proxy) ou quem enviar "Authorization: Bearer
+# <METRICS_TOKEN>". Sem token, só os IPs
+METRICS_ALLOWED_IPS = [
+    ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip
+]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# DATABASE_PROFILE=production liga WAL, synchronous=NORMAL, mmap, busy timeout
+# e conexões persistentes (ver realmate_challenge/database.py)
+DATABASES = sqlite_databases(
+    BASE_DIR / 'db.sqlite3',
+    profile=os.environ.get('DATABASE_PROFILE', 'default'),
+    mmap_size=int(os.environ['SQLITE_MMAP_SIZE']) if 'SQLITE_MMAP_SIZE' in os.environ else None,
+    cache_size=int(os.environ['SQLITE_CACHE_SIZE']) if 'SQLITE_CACHE_SIZE' in os.environ else None,
+    conn_max_age=int(os.environ['DB_CONN_MAX_AGE']) if 'DB_CONN_MAX_AGE' in os.environ else None,
+)
 
 
 # Password validation
@@ -126,4 +267,20 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'realmate_challenge': {
+            'handlers': ['console'],
+            'level': os.environ.get('LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -11,7 +11,10 @@ from realmate_challenge.apps.conversation.views import (
 )
 
 from realmate_challenge.apps.message.views import MessageViewSet
+from realmate_challenge.metrics import metrics_view
 from realmate_challenge.webhooks.messages.views import WebhookView
+from realmate_challenge.webhooks.messages.async_views import AsyncWebhookView
+from realmate_challenge.webhooks.messages.inbox_views import WebhookInboxView
 
 
 # Router REST
@@ -27,6 +30,10 @@ urlpatterns = [
     # API REST
     path("", include(router.urls)),
     path("webhook/", WebhookView.as_view(), name="webhook"),
+    # mesmo contrato do webhook/, com ORM assíncrono e fan-out em segundo plano (ASGI)
+    path("webhook/async/", AsyncWebhookView.as_view(), name="webhook_async"),
+    # responde 202 na hora e aplica em segundo plano (comando process_webhook_inbox)
+    path("webhook/inbox/", WebhookInboxView.as_view(), name="webhook_inbox"),
 
     # Frontend com Django Templates
     path("conversas/", conversation_list_view, name="conversation_list"),
@@ -39,6 +46,8 @@ urlpatterns = [
 ]
 
 urlpatterns += [
+    # métricas de desempenho no formato do Prometheus (ver realmate_challenge/metrics.py)
+    path("metrics/", metrics_view, name="metrics"),
     path("schema/", SpectacularAPIView.as_view(), name="schema"),
     path("docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
 ]
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+from functools import partial
+
+from channels.layers import get_channel_layer
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from realmate_challenge.apps.conversation import write_queue
+from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.apps.webhook import idempotency
+from realmate_challenge.apps.websocket import deltas
+from realmate_challenge.apps.websocket.groups import conversation_group_name
+from realmate_challenge.metrics import timed
+
+from . import writes
+from .batch import parse_event, process_batch
+
+
+logger = logging.getLogger(__name__)
+
+# referências às tarefas de fan-out em andamento (evita coleta pelo GC antes do fim)
+_background_tasks = set()
+
+
+def _schedule_fanout(group, event):
+    """
+    Agenda o envio ao channel layer sem bloquear a resposta HTTP.
+    Só é chamado depois que as escritas no banco já foram confirmadas.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    async def send():
+        try:
+            with timed("channel_send"):
+                await channel_layer.group_send(group, event)
+        except Exception:
+            logger.exception("Falha no fan-out para o grupo %s", group)
+
+    task = asyncio.create_task(send())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _schedule_delta(delta):
+    """Agenda a publicação do delta da caixa de entrada (ver websocket/deltas.py)."""
+    for group, event in deltas.group_events([delta]):
+        _schedule_fanout(group, event)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncWebhookView(View):
+    """
+    Versão assíncrona do WebhookView, para rodar nativamente sob o ASGI.
+
+    As escritas passam pela fila da conversa (write_queue.arun, as mesmas
+    de webhooks/messages/writes.py) sem bloquear o event loop, e o fan-out
+    para os WebSockets segue em segundo plano, depois das escritas, de modo
+    que um grupo lento nunca atrasa a resposta do webhook.
+    """
+    http_method_names = ["post"]
+
+    async def post(self, request):
+        try:
+            payload = json.loads(request.body)
+        except (ValueError, UnicodeDecodeError):
+            return JsonResponse({"detail": "JSON inválido."}, status=400)
+
+        if isinstance(payload, list):
+            return await self._handle_batch(payload)
+
+        event, error = parse_event(0, payload)
+        if error:
+            return JsonResponse({"detail": error["detail"]}, status=error["status"])
+
+        delivery = idempotency.lookup(event["key"])
+        if delivery is not None:
+            # reentrega do provedor: mesma resposta, sem tocar no banco
+            return JsonResponse(delivery.body, status=delivery.status)
+
+        try:
+            match event["type"]:
+                case "NEW_CONVERSATION":
+                    return await self._handle_new_conversation(event)
+                case "NEW_MESSAGE":
+                    return await self._handle_new_message(event)
+                case "CLOSE_CONVERSATION":
+                    return await self._handle_close_conversation(event)
+        except Exception as e:
+            return JsonResponse({"detail": f"Erro ao processar o evento: {str(e)}"}, status=400)
+
+    async def _handle_batch(self, events):
+        max_events = getattr(settings, "WEBHOOK_BATCH_MAX_EVENTS", 5000)
+        if not events:
+            return JsonResponse({"detail": "Lote de eventos vazio."}, status=400)
+        if len(events) > max_events:
+            return JsonResponse({"detail": f"Lote excede o limite de {max_events} eventos."}, status=413)
+
+        try:
+            # o lote depende de uma transação, que o ORM assíncrono ainda não suporta
+            results = await sync_to_async(process_batch)(events)
+        except Exception as e:
+            return JsonResponse({"detail": f"Erro ao processar o lote: {str(e)}"}, status=400)
+        return JsonResponse({"results": results}, status=200)
+
+    async def _original_response(self, event, detail, status_code=409):
+        """Evento repetido: devolve a resposta original, se ainda guardada."""
+        delivery = await idempotency.afetch(event["key"])
+        if delivery is not None:
+            return JsonResponse(delivery.body, status=delivery.status)
+        return JsonResponse({"detail": detail}, status=status_code)
+
+    async def _handle_new_conversation(self, event):
+        conv_id = event["conversation_id"]
+        try:
+            written = await write_queue.arun(
+                conv_id, partial(writes.create_conversation, conv_id, event["timestamp"], event["key"])
+            )
+        except IntegrityError:
+            return await self._original_response(event, "Conversa já existe (ID duplicado).")
+        _schedule_delta(deltas.conversation_opened(conv_id, event["timestamp"], written.position))
+        return JsonResponse(written.body, status=201)
+
+    async def _handle_new_message(self, event):
+        conv_id = event["conversation_id"]
+        timestamp = event["timestamp"]
+        data = event["data"]
+
+        try:
+            written = await write_queue.arun(conv_id, partial(
+                writes.create_message,
+                event["message_id"], conv_id, data["direction"], data["content"], timestamp, event["key"],
+            ))
+        except Conversation.DoesNotExist:
+            return JsonResponse({"detail": "Conversation not found."}, status=404)
+        except IntegrityError:
+            return await self._original_response(event, "Mensagem já existe (ID duplicado).")
+
+        if written is None:
+            # pode ser a reentrega de uma mensagem aceita antes do fechamento
+            return await self._original_response(event, "Conversation is closed.", status_code=400)
+
+        _schedule_fanout(
+            conversation_group_name(conv_id),
+            {
+                "type": "send_message",
+                "message": {
+                    "id": str(event["message_id"]),
+                    "direction": data["direction"],
+                    "content": data["content"],
+                    "timestamp": timestamp.isoformat(),
+                }
+            }
+        )
+        _schedule_delta(deltas.message_added(
+            conv_id, event["message_id"], data["direction"], data["content"], timestamp, written.position
+        ))
+        return JsonResponse(written.body, status=201)
+
+    async def _handle_close_conversation(self, event):
+        conv_id = event["conversation_id"]
+        written = await write_queue.arun(
+            conv_id, partial(writes.close_conversation, conv_id, event["timestamp"], event["key"])
+        )
+        if written is None:
+            return JsonResponse({"detail": "Conversation not found."}, status=404)
+        _schedule_delta(deltas.conversation_closed(conv_id, written.position))
+        return JsonResponse(written.body, status=200)
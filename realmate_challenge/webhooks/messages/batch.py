@@ -0,0 +1,250 @@
+import uuid
+
+from channels.layers import get_channel_layer
+from asgiref.sync import async_to_sync
+
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from realmate_challenge.apps.conversation.cache import invalidate_conversations
+from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.apps.conversation.stats import STATS_FIELDS, apply_messages
+from realmate_challenge.apps.eventlog import log
+from realmate_challenge.apps.message.models import Message
+from realmate_challenge.apps.message.partitions import sealed_ids
+from realmate_challenge.apps.webhook import idempotency
+from realmate_challenge.apps.websocket import deltas
+from realmate_challenge.apps.websocket.groups import conversation_group_name
+from realmate_challenge.metrics import timed
+
+
+EVENT_TYPES = {"NEW_CONVERSATION", "NEW_MESSAGE", "CLOSE_CONVERSATION"}
+
+
+def _result(index, status, detail):
+    return {"index": index, "status": status, "detail": detail}
+
+
+def parse_event(index, event):
+    """
+    Valida a estrutura de um evento do lote.
+    Retorna (evento normalizado, None) ou (None, resultado de erro).
+    """
+    if not isinstance(event, dict):
+        return None, _result(index, 400, "Evento deve ser um objeto JSON.")
+
+    event_type = event.get("type")
+    timestamp_str = event.get("timestamp")
+    data = event.get("data")
+
+    if not event_type or not timestamp_str or not isinstance(data, dict):
+        return None, _result(index, 400, "Campos obrigatórios faltando: 'type', 'timestamp' e 'data'.")
+    if event_type not in EVENT_TYPES:
+        return None, _result(index, 400, f"Tipo de evento '{event_type}' não suportado.")
+
+    timestamp = parse_datetime(timestamp_str) if isinstance(timestamp_str, str) else None
+    if not timestamp:
+        return None, _result(index, 400, "Formato de timestamp inválido. Use ISO 8601.")
+
+    try:
+        if event_type == "NEW_MESSAGE":
+            message_id = uuid.UUID(data.get("id"))
+            conv_id = uuid.UUID(data.get("conversation_id"))
+        else:
+            message_id = None
+            conv_id = uuid.UUID(data.get("id"))
+    except Exception:
+        return None, _result(index, 400, "IDs inválidos. Certifique-se de que são UUIDs válidos.")
+
+    if event_type == "NEW_MESSAGE":
+        if data.get("direction") not in {"SENT", "RECEIVED"} or not data.get("content"):
+            return None, _result(index, 400, "Direção deve ser 'SENT' ou 'RECEIVED' e conteúdo não pode ser vazio.")
+
+    return {
+        "index": index,
+        "type": event_type,
+        "timestamp": timestamp,
+        "conversation_id": conv_id,
+        "message_id": message_id,
+        "data": data,
+        "key": idempotency.delivery_key(event_type, data),
+    }, None
+
+
+def _delivery_result(index, delivery):
+    return _result(index, delivery.status, delivery.body.get("detail"))
+
+
+def _sort_key(event):
+    # Eventos com e sem timezone não são comparáveis; ordena pelo valor "de parede"
+    timestamp = event["timestamp"]
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.replace(tzinfo=None) - timestamp.utcoffset()
+    return (timestamp, event["index"])
+
+
+def process_batch(events):
+    """
+    Processa um lote de eventos do webhook.
+
+    Os eventos são aplicados em ordem de timestamp; as conversas referenciadas
+    e os IDs de mensagens já existentes são resolvidos com uma consulta cada,
+    e todas as escritas acontecem em uma única transação com bulk_create.
+    Reentregas de eventos já aceitos recebem o resultado original (ver
+    apps/webhook/idempotency.py) e os aceitos entram no log de eventos
+    (apps/eventlog/log.py) na ordem em que foram aplicados.
+    Retorna um resultado por evento, na ordem em que foram enviados.
+    """
+    results = [None] * len(events)
+    parsed = []
+    for index, event in enumerate(events):
+        normalized, error = parse_event(index, event)
+        if error:
+            results[index] = error
+            continue
+        delivery = idempotency.lookup(normalized["key"])
+        if delivery is not None:
+            results[index] = _delivery_result(index, delivery)
+        else:
+            parsed.append(normalized)
+    parsed.sort(key=_sort_key)
+
+    conversation_ids = {event["conversation_id"] for event in parsed}
+    message_ids = {event["message_id"] for event in parsed if event["message_id"]}
+
+    conversations = Conversation.objects.order_by().in_bulk(conversation_ids)
+    known_message_ids = set(
+        Message.objects.filter(id__in=message_ids).order_by().values_list("id", flat=True)
+    ) | sealed_ids(message_ids)
+
+    new_conversations = {}
+    dirty_conversations = {}
+    new_messages = []
+    messages_by_conversation = {}
+    # respostas 2xx a guardar e eventos recusados que podem ser reentregas
+    accepted = {}
+    repeated = []
+    logged = []
+    # deltas da caixa de entrada, um por conversa (ver websocket/deltas.py)
+    changes = {}
+
+    for event in parsed:
+        index = event["index"]
+        conv_id = event["conversation_id"]
+        conversation = conversations.get(conv_id)
+
+        match event["type"]:
+            case "NEW_CONVERSATION":
+                if conversation is not None:
+                    results[index] = _result(index, 409, "Conversa já existe (ID duplicado).")
+                    repeated.append(event)
+                    continue
+                conversation = Conversation(id=conv_id, status="OPEN", timestamp=event["timestamp"])
+                conversations[conv_id] = conversation
+                new_conversations[conv_id] = conversation
+                logged.append(log.conversation_created(conv_id, event["timestamp"]))
+                deltas.coalesce(changes, deltas.conversation_opened(conv_id, event["timestamp"], 0))
+                results[index] = _result(index, 201, "Conversation created.")
+                accepted[event["key"]] = idempotency.Delivery(201, {"detail": "Conversation created."})
+
+            case "NEW_MESSAGE":
+                if conversation is None:
+                    results[index] = _result(index, 404, "Conversation not found.")
+                    continue
+                if conversation.status == "CLOSED":
+                    results[index] = _result(index, 400, "Conversation is closed.")
+                    repeated.append(event)
+                    continue
+                if event["message_id"] in known_message_ids:
+                    results[index] = _result(index, 409, "Mensagem já existe (ID duplicado).")
+                    repeated.append(event)
+                    continue
+                known_message_ids.add(event["message_id"])
+                message = Message(
+                    id=event["message_id"],
+                    conversation=conversation,
+                    direction=event["data"]["direction"],
+                    content=event["data"]["content"],
+                    timestamp=event["timestamp"],
+                )
+                new_messages.append(message)
+                messages_by_conversation.setdefault(conv_id, []).append(message)
+                if conv_id not in new_conversations:
+                    dirty_conversations[conv_id] = conversation
+                logged.append(log.message_created(
+                    message.id, conv_id, message.direction, message.content, message.timestamp
+                ))
+                deltas.coalesce(changes, deltas.message_added(
+                    conv_id, message.id, message.direction, message.content, message.timestamp, 0
+                ))
+                results[index] = _result(index, 201, "Message created.")
+                accepted[event["key"]] = idempotency.Delivery(201, {"detail": "Message created."})
+
+            case "CLOSE_CONVERSATION":
+                if conversation is None:
+                    results[index] = _result(index, 404, "Conversation not found.")
+                    continue
+                conversation.status = "CLOSED"
+                if conv_id not in new_conversations:
+                    dirty_conversations[conv_id] = conversation
+                logged.append(log.conversation_closed(conv_id, event["timestamp"]))
+                deltas.coalesce(changes, deltas.conversation_closed(conv_id, 0))
+                results[index] = _result(index, 200, "Conversation closed.")
+                accepted[event["key"]] = idempotency.Delivery(200, {"detail": "Conversation closed."})
+
+    # uma única consulta para as reentregas que não estavam na memória
+    stored = idempotency.fetch_many({event["key"] for event in repeated} - accepted.keys())
+    for event in repeated:
+        delivery = accepted.get(event["key"]) or stored.get(event["key"])
+        if delivery is not None:
+            results[event["index"]] = _delivery_result(event["index"], delivery)
+
+    for conv_id, messages in messages_by_conversation.items():
+        apply_messages(conversations[conv_id], messages, created=conv_id in new_conversations)
+
+    with transaction.atomic():
+        Conversation.objects.bulk_create(new_conversations.values())
+        Message.objects.bulk_create(new_messages)
+        # contadores só de quem recebeu mensagens; status só das fechadas no lote,
+        # para o valor lido antes não desfazer um fechamento feito no meio tempo
+        with_messages = [c for conv_id, c in dirty_conversations.items() if conv_id in messages_by_conversation]
+        closed = [c for c in dirty_conversations.values() if c.status == "CLOSED"]
+        Conversation.objects.bulk_update(with_messages, STATS_FIELDS)
+        Conversation.objects.bulk_update(closed, ["status"])
+        idempotency.remember_many(accepted)
+        # a posição de cada delta é a do último evento da conversa no lote
+        for event in log.append(*logged):
+            changes[str(event.conversation_id)]["position"] = event.seq
+        invalidate_conversations(dirty_conversations)
+        transaction.on_commit(lambda: _broadcast(new_messages, list(changes.values())))
+
+    return results
+
+
+def _broadcast(messages, inbox_deltas):
+    """
+    Envia as mensagens criadas para os grupos de WebSocket das conversas e os
+    deltas (já combinados por conversa) para a caixa de entrada.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not (messages or inbox_deltas):
+        return
+
+    async def send_all():
+        for message in messages:
+            await channel_layer.group_send(
+                conversation_group_name(message.conversation_id),
+                {
+                    "type": "send_message",
+                    "message": {
+                        "id": str(message.id),
+                        "direction": message.direction,
+                        "content": message.content,
+                        "timestamp": message.timestamp.isoformat(),
+                    }
+                }
+            )
+        await deltas.publish(channel_layer, inbox_deltas)
+
+    with timed("channel_send"):
+        async_to_sync(send_all)()
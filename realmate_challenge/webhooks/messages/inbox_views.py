@@ -0,0 +1,61 @@
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiResponse
+
+from django.conf import settings
+
+from rest_framework.views import APIView
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+
+from realmate_challenge.apps.webhook import inbox
+
+
+@extend_schema(
+    summary="Receber eventos de atendimento (inbox)",
+    description=(
+        "Mesmo contrato do `webhook/`, com resposta imediata: cada evento é validado "
+        "(sem consultar o banco), gravado no inbox e respondido com **202**. Os workers "
+        "do comando `process_webhook_inbox` aplicam os eventos em segundo plano, com "
+        "novas tentativas e dead-letter.\n"
+        "As atualizações ao vivo (WebSocket) desses eventos partem dos workers e exigem "
+        "um channel layer compartilhado (`CHANNEL_LAYER_HOSTS`); com o layer em memória "
+        "padrão elas não chegam aos clientes conectados.\n"
+        "Reentregas de eventos já aplicados recebem a resposta original. Em uma lista "
+        "de eventos, a resposta traz um resultado por evento."
+    ),
+    request=OpenApiTypes.OBJECT,
+    examples=[OpenApiExample(
+        name="Exemplo de NEW_MESSAGE",
+        value={
+            "type": "NEW_MESSAGE",
+            "timestamp": "2025-02-21T10:20:44.349308",
+            "data": {
+                "id": "16b63b04-60de-4257-b1a1-20a5154abc6d",
+                "direction": "SENT",
+                "content": "Tudo ótimo e você?",
+                "conversation_id": "6a41b347-8d80-4ce9-84ba-7af66f369f6a"
+            }
+        },
+        request_only=True
+    )],
+    tags=["Webhook"],
+    responses={
+        202: OpenApiResponse(OpenApiTypes.OBJECT, description="Evento gravado no inbox."),
+        400: OpenApiResponse(OpenApiTypes.OBJECT, description="Payload inválido."),
+        413: OpenApiResponse(OpenApiTypes.OBJECT, description="Lote acima de WEBHOOK_BATCH_MAX_EVENTS."),
+    }
+)
+class WebhookInboxView(APIView):
+    parser_classes = [JSONParser]
+
+    def post(self, request):
+        if isinstance(request.data, list):
+            max_events = getattr(settings, "WEBHOOK_BATCH_MAX_EVENTS", 5000)
+            if not request.data:
+                return Response({"detail": "Lote de eventos vazio."}, status=400)
+            if len(request.data) > max_events:
+                return Response({"detail": f"Lote excede o limite de {max_events} eventos."}, status=413)
+            return Response({"results": inbox.accept(request.data)}, status=202)
+
+        result, = inbox.accept([request.data])
+        return Response({"detail": result["detail"]}, status=result["status"])
@@ -1,9 +1,13 @@
+import logging
 import uuid
+from functools import partial
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
 from drf_spectacular.utils import extend_schema, OpenApiExample
 
+from django.conf import settings
+from django.db import IntegrityError
 from django.utils.dateparse import parse_datetime
 
 from rest_framework.views import APIView
@@ -12,8 +16,38 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
 
+from realmate_challenge.apps.conversation import write_queue
 from realmate_challenge.apps.conversation.models import Conversation
-from realmate_challenge.apps.message.models import Message
+from realmate_challenge.apps.webhook import idempotency
+from realmate_challenge.apps.websocket import deltas
+from realmate_challenge.apps.websocket.groups import conversation_group_name
+from realmate_challenge.metrics import timed
+
+from . import writes
+from .batch import process_batch
+
+
+logger = logging.getLogger(__name__)
+
+
+def _fanout(conversation_id, events):
+    """
+    Envia [(grupo, evento)] ao channel layer com uma única passagem pelo event
+    loop. A escrita já foi confirmada: falhas só são logadas.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    async def send_all():
+        for group, event in events:
+            await channel_layer.group_send(group, event)
+
+    try:
+        with timed("channel_send"):
+            async_to_sync(send_all)()
+    except Exception:
+        logger.exception("Falha no fan-out para a conversa %s", conversation_id)
 
 
 @extend_schema(
@@ -25,6 +59,9 @@ from realmate_challenge.apps.message.models import Message
         "- `NEW_MESSAGE`\n"
         "- `CLOSE_CONVERSATION`\n\n"
         "Cria ou atualiza os registros no banco e retorna status apropriado.\n"
+        "Também aceita uma lista de eventos (modo lote): os eventos são aplicados "
+        "em ordem de timestamp em uma única transação e a resposta traz um "
+        "resultado por evento.\n"
         "Evita qualquer erro 500 com tratamento completo de exceções."
     ),
     request=OpenApiExample(
@@ -53,6 +90,9 @@ class WebhookView(APIView):
     parser_classes = [JSONParser]
 
     def post(self, request):
+        if isinstance(request.data, list):
+            return self._handle_batch(request.data)
+
         event_type = request.data.get("type")
         timestamp_str = request.data.get("timestamp")
         data = request.data.get("data")
@@ -64,40 +104,58 @@ class WebhookView(APIView):
         if not timestamp:
             return Response({"detail": "Formato de timestamp inválido. Use ISO 8601."}, status=400)
 
+        key = idempotency.delivery_key(event_type, data)
+        delivery = idempotency.lookup(key)
+        if delivery is not None:
+            # reentrega do provedor: mesma resposta, sem tocar no banco
+            return Response(delivery.body, status=delivery.status)
+
         match event_type:
             case "NEW_CONVERSATION":
-                return self._handle_new_conversation(data, timestamp)
+                return self._handle_new_conversation(data, timestamp, key)
             case "NEW_MESSAGE":
-                return self._handle_new_message(data, timestamp)
+                return self._handle_new_message(data, timestamp, key)
             case "CLOSE_CONVERSATION":
-                return self._handle_close_conversation(data)
+                return self._handle_close_conversation(data, timestamp, key)
             case _:
                 return Response({"detail": f"Tipo de evento '{event_type}' não suportado."}, status=400)
 
-    def _handle_new_conversation(self, data, timestamp):
+    def _handle_batch(self, events):
+        max_events = getattr(settings, "WEBHOOK_BATCH_MAX_EVENTS", 5000)
+        if not events:
+            return Response({"detail": "Lote de eventos vazio."}, status=400)
+        if len(events) > max_events:
+            return Response({"detail": f"Lote excede o limite de {max_events} eventos."}, status=413)
+
+        try:
+            results = process_batch(events)
+        except Exception as e:
+            return Response({"detail": f"Erro ao processar o lote: {str(e)}"}, status=400)
+        return Response({"results": results}, status=200)
+
+    def _original_response(self, key, detail, status_code=409):
+        """Evento repetido: devolve a resposta original, se ainda guardada."""
+        delivery = idempotency.fetch(key)
+        if delivery is not None:
+            return Response(delivery.body, status=delivery.status)
+        return Response({"detail": detail}, status=status_code)
+
+    def _handle_new_conversation(self, data, timestamp, key):
         try:
             conv_id = uuid.UUID(data.get("id"))
         except Exception:
             return Response({"detail": "ID da conversa inválido (UUID malformado)."}, status=400)
 
         try:
-            if Conversation.objects.filter(id=conv_id).exists():
-                return Response({"detail": "Conversa já existe (ID duplicado)."}, status=409)
-            
-            conversation, created = Conversation.objects.get_or_create(
-                id=conv_id,
-                defaults={
-                    "status": "OPEN",
-                    "timestamp": timestamp,
-                }
-            )
-            if not created:
-                return Response({"detail": "Conversation already exists."}, status=200)
-            return Response({"detail": "Conversation created."}, status=201)
+            written = write_queue.run(conv_id, partial(writes.create_conversation, conv_id, timestamp, key))
+        except IntegrityError:
+            return self._original_response(key, "Conversa já existe (ID duplicado).")
         except Exception as e:
             return Response({"detail": f"Erro ao criar a conversa: {str(e)}"}, status=400)
+        _fanout(conv_id, deltas.group_events([deltas.conversation_opened(conv_id, timestamp, written.position)]))
+        return Response(written.body, status=201)
 
-    def _handle_new_message(self, data, timestamp):
+    def _handle_new_message(self, data, timestamp, key):
         try:
             message_id = uuid.UUID(data.get("id"))
             conv_id = uuid.UUID(data.get("conversation_id"))
@@ -110,58 +168,47 @@ class WebhookView(APIView):
             return Response({"detail": "Direção deve ser 'SENT' ou 'RECEIVED' e conteúdo não pode ser vazio."}, status=400)
 
         try:
-            conversation = Conversation.objects.get(id=conv_id)
+            written = write_queue.run(
+                conv_id,
+                partial(writes.create_message, message_id, conv_id, direction, content, timestamp, key),
+            )
         except Conversation.DoesNotExist:
             return Response({"detail": "Conversation not found."}, status=404)
-
-        if conversation.status == "CLOSED":
-            return Response({"detail": "Conversation is closed."}, status=400)
-        if Message.objects.filter(id=message_id).exists():
-            return Response({"detail": "Mensagem já existe (ID duplicado)."}, status=409)
-
-        try:
-            Message.objects.create(
-                id=message_id,
-                conversation=conversation,
-                direction=direction,
-                content=content,
-                timestamp=timestamp,
-            )
-
-            conversation.last_message_at = timestamp
-            conversation.save(update_fields=["last_message_at"])
-
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                f"conversation_{conversation.id}",
-                {
-                    "type": "send_message",
-                    "message": {
-                        "id": str(message_id),
-                        "direction": direction,
-                        "content": content,
-                        "timestamp": timestamp.isoformat(),
-                    }
-                }
-            )
-
-            return Response({"detail": "Message created."}, status=201)
-
+        except IntegrityError:
+            return self._original_response(key, "Mensagem já existe (ID duplicado).")
         except Exception as e:
             return Response({"detail": f"Erro ao salvar mensagem: {str(e)}"}, status=400)
 
-    def _handle_close_conversation(self, data):
+        if written is None:
+            # pode ser a reentrega de uma mensagem aceita antes do fechamento
+            return self._original_response(key, "Conversation is closed.", status_code=400)
+
+        # a mensagem já foi gravada: falha no fan-out não muda a resposta
+        message = {
+            "type": "send_message",
+            "message": {
+                "id": str(message_id),
+                "direction": direction,
+                "content": content,
+                "timestamp": timestamp.isoformat(),
+            }
+        }
+        delta = deltas.message_added(conv_id, message_id, direction, content, timestamp, written.position)
+        _fanout(conv_id, [(conversation_group_name(conv_id), message), *deltas.group_events([delta])])
+
+        return Response(written.body, status=201)
+
+    def _handle_close_conversation(self, data, timestamp, key):
         try:
             conv_id = uuid.UUID(data.get("id"))
         except Exception:
             return Response({"detail": "ID inválido (UUID malformado)."}, status=400)
 
         try:
-            conversation = Conversation.objects.get(id=conv_id)
-            conversation.status = "CLOSED"
-            conversation.save(update_fields=["status"])
-            return Response({"detail": "Conversation closed."}, status=200)
-        except Conversation.DoesNotExist:
-            return Response({"detail": "Conversation not found."}, status=404)
+            written = write_queue.run(conv_id, partial(writes.close_conversation, conv_id, timestamp, key))
         except Exception as e:
             return Response({"detail": f"Erro ao fechar a conversa: {str(e)}"}, status=400)
+        if written is None:
+            return Response({"detail": "Conversation not found."}, status=404)
+        _fanout(conv_id, deltas.group_events([deltas.conversation_closed(conv_id, written.position)]))
+        return Response(written.body, status=200)
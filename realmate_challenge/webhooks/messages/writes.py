@@ -0,0 +1,84 @@
+"""
+Escritas de um evento avulso do webhook (views síncrona e assíncrona).
+
+Rodam dentro da fila de escrita da conversa (ver
+apps/conversation/write_queue.py), já em transação: a leitura do status, a
+gravação, os contadores, a chave de idempotência e a entrada no log de
+eventos (apps/eventlog/log.py) ficam na mesma unidade, na ordem em que os
+eventos da conversa chegaram.
+
+Cada escrita aplicada retorna um Written: o corpo da resposta e a posição
+do evento no log, que versiona o delta da caixa de entrada (ver
+websocket/deltas.py).
+"""
+from collections import namedtuple
+
+from django.db import IntegrityError
+
+from realmate_challenge.apps.conversation.cache import invalidate_conversation
+from realmate_challenge.apps.conversation.models import Conversation
+from realmate_challenge.apps.conversation.stats import message_stats_update
+from realmate_challenge.apps.eventlog import log
+from realmate_challenge.apps.message.models import Message
+from realmate_challenge.apps.message.partitions import sealed_ids
+from realmate_challenge.apps.webhook import idempotency
+
+
+CONVERSATION_CREATED = {"detail": "Conversation created."}
+MESSAGE_CREATED = {"detail": "Message created."}
+CONVERSATION_CLOSED = {"detail": "Conversation closed."}
+
+Written = namedtuple("Written", ["body", "position"])
+
+
+def _append(event):
+    logged, = log.append(event)
+    return logged.seq
+
+
+def create_conversation(conversation_id, timestamp, key):
+    """Cria a conversa. IntegrityError se o id já existir."""
+    # a chave primária garante a unicidade: sem exists() antes do insert
+    Conversation.objects.create(id=conversation_id, status="OPEN", timestamp=timestamp)
+    position = _append(log.conversation_created(conversation_id, timestamp))
+    idempotency.remember(key, 201, CONVERSATION_CREATED)
+    return Written(CONVERSATION_CREATED, position)
+
+
+def create_message(message_id, conversation_id, direction, content, timestamp, key):
+    """
+    Grava a mensagem e atualiza os contadores da conversa. Retorna None se a
+    conversa estiver CLOSED; Conversation.DoesNotExist se ela não existir e
+    IntegrityError se a mensagem já existir.
+    """
+    status = Conversation.objects.filter(id=conversation_id).values_list("status", flat=True).get()
+    if status == "CLOSED":
+        return None
+    # a chave primária só cobre a tabela quente; ids selados ficam no índice das partições
+    if sealed_ids([message_id]):
+        raise IntegrityError("Mensagem já selada.")
+    Message.objects.create(
+        id=message_id,
+        conversation_id=conversation_id,
+        direction=direction,
+        content=content,
+        timestamp=timestamp,
+    )
+    # contadores e snapshot em um único UPDATE; last_message_at só avança
+    Conversation.objects.filter(id=conversation_id).update(
+        **message_stats_update(message_id, direction, content, timestamp)
+    )
+    position = _append(log.message_created(message_id, conversation_id, direction, content, timestamp))
+    idempotency.remember(key, 201, MESSAGE_CREATED)
+    invalidate_conversation(conversation_id)
+    return Written(MESSAGE_CREATED, position)
+
+
+def close_conversation(conversation_id, timestamp, key):
+    """Fecha a conversa. Retorna None se ela não existir."""
+    if not Conversation.objects.filter(id=conversation_id).update(status="CLOSED"):
+        return None
+    position = _append(log.conversation_closed(conversation_id, timestamp))
+    idempotency.remember(key, 200, CONVERSATION_CLOSED)
+    invalidate_conversation(conversation_id)
+    return Written(CONVERSATION_CLOSED, position)